@@ -106,6 +106,7 @@ CREATE TABLE stations_qc_details (
     sp_percentage numeric(5,2),
     bw_percentage numeric(5,2),
     lp_percentage numeric(5,2),
+    hourly_metrics real[],
     PRIMARY KEY (id)
 );
 
@@ -124,6 +125,7 @@ COMMENT ON COLUMN stations_qc_details.gsn_dead_channel IS 'GSN dead channel dete
 COMMENT ON COLUMN stations_qc_details.sp_percentage IS 'PSD percentage in short period range (0.05-5 Hz)';
 COMMENT ON COLUMN stations_qc_details.bw_percentage IS 'PSD percentage in broadband range (5-20 Hz)';
 COMMENT ON COLUMN stations_qc_details.lp_percentage IS 'PSD percentage in long period range (20-100 Hz)';
+COMMENT ON COLUMN stations_qc_details.hourly_metrics IS 'Hourly bins [4][24]: availability, rms, num_gap, num_spikes (NULL = no data)';
 
 
 --
@@ -1,7 +1,8 @@
 import logging
-from typing import Optional
+from typing import List, Optional
 from obspy import Stream, UTCDateTime
 from obspy.clients.filesystem.sds import Client as SDSClient
+from obspy.core.compatibility import round_away
 import warnings
 
 logger = logging.getLogger(__name__)
@@ -58,4 +59,77 @@ def get_waveforms(client: SDSClient, net: str, sta: str, loc: str,
             continue
 
     logger.debug(f"All SDS prefixes failed for {net}.{sta}.{loc_id}.*{c} on {time0.date}")
-    return None
\ No newline at end of file
+    return None
+
+
+def _clip_segment(start: UTCDateTime, end: UTCDateTime, sampling_rate: float,
+                  time0: UTCDateTime, time1: UTCDateTime):
+    """
+    (Internal) Clips a segment to [time0, time1] on its own sample grid,
+    the same way Stream.trim(time0, time1) does for decoded data.
+    Returns (start, end) or None if nothing is left.
+    """
+    if not sampling_rate:
+        return (start, end) if time0 <= start <= time1 else None
+    delta_t = 1.0 / sampling_rate
+    if time0 > start:
+        shift = int(round_away((time0 - start) * sampling_rate))
+        start = start + shift * delta_t
+    if time1 < end:
+        shift = int(round_away((end - time1) * sampling_rate))
+        end = end - shift * delta_t
+    if start > end:
+        return None
+    return start, end
+
+
+def get_segments(client: SDSClient, net: str, sta: str, loc: str,
+                 channel_prefixes: list, time0: UTCDateTime,
+                 time1: UTCDateTime, c: str) -> Optional[List[tuple]]:
+    """
+    Header-only counterpart of get_waveforms() for availability checks.
+
+    Reads only the MiniSEED fixed headers of the SDS day files (no Steim
+    payload is decoded) and returns the contiguous segments of the first
+    channel prefix with data, clipped to [time0, time1], as
+    (network, station, location, channel, starttime, endtime, sampling_rate)
+    tuples ready for basic_metrics.GapSummary.from_segments().
+    """
+    loc_id = loc if loc else ""
+
+    for prefix in channel_prefixes:
+        cha = f"{prefix}{c}"
+
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                # headonly: libmseed parses record headers only;
+                # _no_trim_or_merge: trimming would need the samples
+                st = client.get_waveforms(
+                        network=net,
+                        station=sta,
+                        location=loc_id,
+                        channel=cha,
+                        starttime=time0,
+                        endtime=time1,
+                        headonly=True,
+                        _no_trim_or_merge=True
+                )
+        except Exception as e:
+            logger.debug(f"No headers found in SDS for {net}.{sta}.{loc_id}.{cha}: {e}")
+            continue
+
+        segments = []
+        for tr in st:
+            s = tr.stats
+            clipped = _clip_segment(s.starttime, s.endtime, s.sampling_rate, time0, time1)
+            if clipped is None:
+                continue
+            segments.append((s.network, s.station, s.location, s.channel) + clipped + (s.sampling_rate,))
+
+        if segments:
+            logger.debug(f"Success: Scanned {len(segments)} segments of {net}.{sta}.{loc_id}.{cha} from SDS headers")
+            return segments
+
+    logger.debug(f"All SDS prefixes failed (header scan) for {net}.{sta}.{loc_id}.*{c} on {time0.date}")
+    return None
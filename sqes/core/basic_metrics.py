@@ -1,12 +1,624 @@
 import numpy as np
 import pandas as pd
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
 from obspy import Stream, UTCDateTime
+from obspy.core.compatibility import round_away
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 import logging
 
+from .quantile_sketch import QuantileSketch, merge_sketches
+
 logger = logging.getLogger(__name__)
 
-# TO DO : Examine memory efficient spike calculation method
-def _calculate_spikes(st: Stream, wn: int, sigma: int, method: str = 'fast'):
+# Number of samples converted to Python floats at a time by the streaming engine
+STREAMING_BLOCK_SIZE = 65536
+
+# Samples per block of the fused single-pass statistics kernel
+TRACE_STATS_BLOCK_SIZE = 65536
+INT64_MAX = int(np.iinfo(np.int64).max)
+
+# Working-set cap (MB) of one 'chunked' spike block, see `spike_max_block_mb`
+DEFAULT_SPIKE_MAX_BLOCK_MB = 256.0
+
+# Peak bytes allocated by the vectorized engine per window sample
+# (median partition copy + absolute deviation matrix, float64)
+SPIKE_BYTES_PER_CELL = 16
+
+# Bytes per sample of the blocked 'trace' MAD reference selection (block
+# copy, weights, bin indices) and its number of value bins per pass, see
+# `_window_matrix_median`
+MAD_CENTER_BYTES_PER_SAMPLE = 48
+MAD_CENTER_BINS = 1024
+
+# Working precision of the spike engines and the statistics kernel,
+# see `metrics_dtype`
+DEFAULT_METRICS_DTYPE = 'float64'
+METRICS_DTYPES = {'float64': np.float64, 'float32': np.float32}
+
+# 'auto' spike engine: share of the memory budget a single trace may use,
+# and the smallest block worth running the 'chunked' engine with
+SPIKE_AUTO_BUDGET_FRACTION = 0.8
+SPIKE_AUTO_MIN_BLOCK_MB = 1.0
+
+# 'approx' spike engine: exact median/MAD every APPROX_SPIKE_HOP windows,
+# linearly interpolated in between; samples beyond APPROX_SPIKE_MARGIN of
+# the interpolated threshold are re-checked with their exact window.
+# APPROX_BYTES_PER_WINDOW is the O(windows) working set (interpolated
+# median/threshold, centre deviation, candidate and NaN masks) per window.
+APPROX_SPIKE_HOP = 20
+APPROX_SPIKE_MARGIN = 0.5
+APPROX_BYTES_PER_WINDOW = 56
+
+# Reference of the spike MAD, see `spike_mad`: 'trace' = deviations around the
+# median of all the trace's windows together (the original 'fast' engine),
+# 'window' = deviations around each window's own median (rolling MAD)
+DEFAULT_SPIKE_MAD = 'trace'
+SPIKE_MADS = ('trace', 'window')
+
+# Sub-daily bins of the hourly metrics, and the metrics kept per bin
+HOURLY_BIN_SECONDS = 3600
+HOURLY_METRICS = ('availability', 'rms', 'ngap', 'num_spikes')
+
+def _as_float64(data: np.ndarray) -> np.ndarray:
+    """(Internal) float64 copy of trace data, with masked samples set to NaN."""
+    return _as_float(data, np.float64)
+
+def _as_float(data: np.ndarray, dtype=np.float64) -> np.ndarray:
+    """(Internal) `dtype` copy of trace data, with masked samples set to NaN."""
+    if np.ma.isMaskedArray(data):
+        return np.ma.filled(data.astype(dtype), np.nan)
+    return np.asarray(data, dtype=dtype)
+
+def _thread_map(func, items: list, threads: int = 1) -> list:
+    """
+    (Internal) list(map(func, items)), run on a thread pool when threads > 1.
+
+    NumPy releases the GIL in its sorting, partition and reduction kernels,
+    so per-trace metric work overlaps on several cores.
+    """
+    threads = min(int(threads or 1), len(items))
+    if threads <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(func, items))
+
+def _metrics_dtype(name: str):
+    """(Internal) numpy dtype for a `metrics_dtype` setting ('float64' or 'float32')."""
+    try:
+        return METRICS_DTYPES[(name or DEFAULT_METRICS_DTYPE).lower()]
+    except KeyError:
+        logger.warning(f"Unknown metrics_dtype '{name}', using {DEFAULT_METRICS_DTYPE}.")
+        return METRICS_DTYPES[DEFAULT_METRICS_DTYPE]
+
+def _is_native_int(data: np.ndarray) -> bool:
+    """
+    (Internal) True for unmasked integer data of at most 32 bits (e.g. Steim
+    decoded int32), whose differences and squares fit int64 accumulators.
+    """
+    return (not np.ma.isMaskedArray(data)
+            and np.issubdtype(data.dtype, np.integer)
+            and data.dtype.itemsize <= 4)
+
+def _spike_input(data: np.ndarray, dtype=np.float64) -> np.ndarray:
+    """
+    (Internal) Data as the vectorized spike engine reads it: in float64 mode,
+    native integer data is used as is (medians of integer windows are exact);
+    anything else becomes `dtype` with masked samples as NaN.
+    """
+    if dtype == np.float64 and _is_native_int(data):
+        return data
+    return _as_float(data, dtype)
+
+def _spike_bytes_per_cell(dtype=np.float64) -> float:
+    """(Internal) SPIKE_BYTES_PER_CELL scaled to the working precision."""
+    return SPIKE_BYTES_PER_CELL * np.dtype(dtype).itemsize / 8
+
+def _n_bins(day_start_time: UTCDateTime, day_end_time: UTCDateTime,
+            bin_seconds: float = HOURLY_BIN_SECONDS) -> int:
+    """(Internal) Number of `bin_seconds` bins covering the day window."""
+    return max(1, int(np.ceil(round((day_end_time - day_start_time) / bin_seconds, 6))))
+
+def _bin_edges(tr, day_start_time: UTCDateTime, n_bins: int,
+               bin_seconds: float = HOURLY_BIN_SECONDS) -> np.ndarray:
+    """
+    (Internal) Sample index at which each bin of the day starts in `tr`
+    (n_bins + 1 entries). A sample on a bin boundary belongs to the later
+    bin; samples before or after the day go to the first or last bin.
+    """
+    npts = len(tr.data)
+    offsets = (day_start_time - tr.stats.starttime) + np.arange(n_bins + 1) * bin_seconds
+    edges = np.ceil(np.round(offsets * tr.stats.sampling_rate, 6))
+    edges = np.clip(edges, 0, npts).astype(np.int64)
+    edges[0] = 0
+    edges[-1] = npts
+    return edges
+
+def _bin_positions(positions, edges: np.ndarray) -> np.ndarray:
+    """(Internal) Number of sorted sample `positions` falling in each bin of `edges`."""
+    return np.diff(np.searchsorted(np.asarray(positions, dtype=np.int64), edges)).astype(np.int64)
+
+def _bin_counts(mask: np.ndarray, offset: int, edges: np.ndarray) -> np.ndarray:
+    """
+    (Internal) Per-bin number of True entries of `mask` along the last axis,
+    entry j being sample j + offset. 2-D masks give one row per component.
+    """
+    if mask.ndim > 1:
+        return np.stack([_bin_counts(row, offset, edges) for row in mask])
+    return _bin_positions(np.flatnonzero(mask) + offset, edges)
+
+def _no_spikes(edges: Optional[np.ndarray] = None):
+    """(Internal) A zero spike count, binned like `edges` if given."""
+    if edges is None:
+        return 0
+    return np.zeros(len(edges) - 1, dtype=np.int64)
+
+def _spike_mad(name: str) -> str:
+    """(Internal) Validated `spike_mad` reference."""
+    name = (name or DEFAULT_SPIKE_MAD).lower()
+    if name not in SPIKE_MADS:
+        logger.warning(f"Unknown spike_mad '{name}', using {DEFAULT_SPIKE_MAD}.")
+        return DEFAULT_SPIKE_MAD
+    return name
+
+def _window_matrix_median(data: np.ndarray, wn: int, block_size: Optional[int] = None) -> float:
+    """
+    (Internal) Median of every (wn + 1)-sample window of `data` taken
+    together, i.e. np.median of the 'fast' engine's whole window matrix,
+    without building it. Sample i lies in min(i, windows - 1) - max(0, i - wn) + 1
+    windows, so this is a weighted median of the samples. NaN (masked)
+    samples are left out; NaN if no sample is left. With `block_size`, a
+    longer trace is never sorted whole: the median is selected exactly by
+    narrowing value bins over blocks of that many samples.
+    """
+    n_windows = len(data) - wn
+    if n_windows <= 0:
+        return np.nan
+    if block_size is not None and len(data) > block_size:
+        total = sum(w.sum() for _, w in _weighted_blocks(data, wn, block_size))
+        if total == 0:
+            return np.nan
+        lo = _weighted_select(data, wn, (total - 1) // 2, block_size)
+        hi = _weighted_select(data, wn, total // 2, block_size)
+        return float((lo + hi) / 2)
+    x = _as_float64(data)
+    i = np.arange(len(x))
+    weight = np.minimum(i, n_windows - 1) - np.maximum(0, i - wn) + 1
+    finite = ~np.isnan(x)
+    x, weight = x[finite], weight[finite]
+    if len(x) == 0:
+        return np.nan
+    order = np.argsort(x, kind='stable')
+    x, cum = x[order], np.cumsum(weight[order])
+    # 0-based ranks of the middle element(s) of the weighted multiset
+    total = int(cum[-1])
+    lo = x[np.searchsorted(cum, (total - 1) // 2, side='right')]
+    hi = x[np.searchsorted(cum, total // 2, side='right')]
+    return float((lo + hi) / 2)
+
+def _weighted_blocks(data: np.ndarray, wn: int, block_size: int):
+    """(Internal) Finite float64 samples of `data` and their window counts, per block."""
+    n_windows = len(data) - wn
+    for start in range(0, len(data), block_size):
+        x = _as_float64(data[start : start + block_size])
+        i = np.arange(start, start + len(x))
+        weight = np.minimum(i, n_windows - 1) - np.maximum(0, i - wn) + 1
+        finite = ~np.isnan(x)
+        yield x[finite], weight[finite]
+
+def _weighted_select(data: np.ndarray, wn: int, rank: int, block_size: int) -> float:
+    """
+    (Internal) Value of 0-based `rank` in the window-weighted samples of
+    `data` (see `_window_matrix_median`), in O(block_size) memory. Each pass
+    keeps the value bin holding `rank` until at most `block_size` candidates
+    are left, which are then sorted.
+    """
+    lo, hi, below = -np.inf, np.inf, 0
+    while True:
+        count, v_min, v_max = 0, np.inf, -np.inf
+        for x, _ in _weighted_blocks(data, wn, block_size):
+            x = x[(x >= lo) & (x < hi)]
+            if len(x):
+                count += len(x)
+                v_min, v_max = min(v_min, x.min()), max(v_max, x.max())
+        if v_min == v_max:
+            return float(v_min)
+        if count <= block_size:
+            values, weights = [], []
+            for x, w in _weighted_blocks(data, wn, block_size):
+                keep = (x >= lo) & (x < hi)
+                values.append(x[keep])
+                weights.append(w[keep])
+            values, weights = np.concatenate(values), np.concatenate(weights)
+            order = np.argsort(values, kind='stable')
+            cum = below + np.cumsum(weights[order])
+            return float(values[order][np.searchsorted(cum, rank, side='right')])
+
+        # bin j holds edges[j] <= x < edges[j + 1]; the last one x == v_max
+        edges = np.unique(np.linspace(v_min, v_max, MAD_CENTER_BINS + 1))
+        hist = np.zeros(len(edges), dtype=np.int64)
+        for x, w in _weighted_blocks(data, wn, block_size):
+            keep = (x >= lo) & (x < hi)
+            hist += np.bincount(np.searchsorted(edges, x[keep], side='right') - 1, weights=w[keep],
+                                minlength=len(edges)).astype(np.int64)
+        cum = below + np.cumsum(hist)
+        b = int(np.searchsorted(cum, rank, side='right'))
+        if b == len(edges) - 1:
+            return float(v_max)
+        below = int(cum[b - 1]) if b else below
+        lo, hi = edges[b], edges[b + 1]
+
+def _spike_mad_center(data: np.ndarray, wn: int, spike_mad: str,
+                      block_size: Optional[int] = None) -> Optional[float]:
+    """(Internal) Fixed MAD reference of a trace for `spike_mad` ('window': None)."""
+    return _window_matrix_median(data, wn, block_size) if spike_mad == 'trace' else None
+
+def _mad_center_block_size(max_block_mb: float) -> int:
+    """(Internal) Samples per block of the 'trace' MAD reference within `max_block_mb`."""
+    return max(1024, int(max_block_mb * 1024 * 1024 // MAD_CENTER_BYTES_PER_SAMPLE))
+
+def _kth_smallest_deviation(s: list, h: int, m: float, k: int) -> float:
+    """
+    (Internal) Returns the k-th smallest (0-indexed) value of |s[j] - m|.
+
+    `s` is sorted and `m` is its median, so the deviations form two ascending
+    runs: m - s[h-1], m - s[h-2], ... (left half) and s[h] - m, s[h+1] - m, ...
+    (right half). The k-th element of the merged runs is found by binary
+    search in O(log W) without materialising the deviations.
+    """
+    la = h
+    lb = len(s) - h
+    lo = max(0, k + 1 - lb)
+    hi = min(k + 1, la)
+    while lo < hi:
+        i = (lo + hi) // 2
+        j = k + 1 - i
+        if (m - s[h - 1 - i]) < (s[h + j - 1] - m):
+            lo = i + 1
+        else:
+            hi = i
+    i = lo
+    j = k + 1 - i
+    if i == 0:
+        return s[h + j - 1] - m
+    if j == 0:
+        return m - s[h - i]
+    return max(m - s[h - i], s[h + j - 1] - m)
+
+def _sorted_median(s: list) -> float:
+    """(Internal) Median of a sorted list, matching np.median semantics."""
+    h = len(s) // 2
+    return s[h] if len(s) % 2 else (s[h - 1] + s[h]) / 2
+
+def _sorted_median_mad(s: list):
+    """(Internal) Median and MAD of a sorted list, matching np.median semantics."""
+    n = len(s)
+    h = n // 2
+    if n % 2:
+        m = s[h]
+        mad = _kth_smallest_deviation(s, h, m, h)
+    else:
+        m = (s[h - 1] + s[h]) / 2
+        mad = (_kth_smallest_deviation(s, h, m, h - 1) + _kth_smallest_deviation(s, h, m, h)) / 2
+    return m, mad
+
+def _spikes_streaming(data: np.ndarray, wn: int, sigma, block_size: int = STREAMING_BLOCK_SIZE,
+                      edges: Optional[np.ndarray] = None, mad_center: Optional[float] = None):
+    """
+    (Internal) Counts spikes with a sliding sorted window.
+
+    Produces the same windows, centre samples and thresholds as the 'fast'
+    engine, but keeps only the (wn + 1)-sample window in memory: each step
+    removes the oldest sample and inserts the newest with bisection, then
+    reads the median and MAD from the sorted window. Windows containing NaN
+    (or masked) samples never count as spikes, as in the 'fast' engine.
+    With sample `edges`, the counts per bin are returned instead. A fixed
+    `mad_center` keeps a second sorted window of |x - mad_center| for the MAD.
+    """
+    N = len(data)
+    window_size = wn + 1
+    start_index = int(window_size / 2)
+    if N - wn <= 0:
+        return _no_spikes(edges)
+
+    k = 1.4826 * sigma
+    c = None if mad_center is None else float(mad_center)
+    ring = [0.0] * window_size
+    pos = 0
+    filled = 0
+    nan_in_window = 0
+    window = []
+    deviations = []
+    num_spikes = 0
+    positions = []
+
+    for b0 in range(0, N, block_size):
+        for j, x in enumerate(_as_float64(data[b0:b0 + block_size]).tolist()):
+            if filled == window_size:
+                old = ring[pos]
+                if old != old:
+                    nan_in_window -= 1
+                else:
+                    del window[bisect_left(window, old)]
+                    if c is not None:
+                        del deviations[bisect_left(deviations, abs(old - c))]
+            else:
+                filled += 1
+
+            ring[pos] = x
+            if x != x:
+                nan_in_window += 1
+            else:
+                insort(window, x)
+                if c is not None:
+                    insort(deviations, abs(x - c))
+            pos += 1
+            if pos == window_size:
+                pos = 0
+
+            if filled == window_size and nan_in_window == 0:
+                # `pos` now points at the oldest sample of the window
+                center = ring[(pos + start_index) % window_size]
+                if c is None:
+                    median, mad = _sorted_median_mad(window)
+                else:
+                    median, mad = _sorted_median(window), _sorted_median(deviations)
+                if abs(center - median) > k * mad + 1e-9:
+                    num_spikes += 1
+                    if edges is not None:
+                        positions.append(b0 + j - wn + start_index)
+
+    if edges is not None:
+        return _bin_positions(positions, edges)
+    return num_spikes
+
+def _spikes_vectorized(data: np.ndarray, wn: int, sigma, edges: Optional[np.ndarray] = None,
+                       mad_center: Optional[float] = None):
+    """
+    (Internal) Vectorized spike count over every (wn + 1)-sample window of `data`.
+
+    Windows are a strided view of `data`; the median and MAD passes allocate
+    about SPIKE_BYTES_PER_CELL bytes per window sample (half that for float32
+    data, which is then processed in single precision). With sample `edges`,
+    the counts per bin are returned instead.
+    """
+    if len(data) - wn <= 0:
+        return _no_spikes(edges)
+    if edges is not None:
+        return _spike_counts(data, wn, sigma, edges, mad_center)
+    return int(_spike_counts(data, wn, sigma, mad_center=mad_center))
+
+def _spike_counts(data: np.ndarray, wn: int, sigma, edges: Optional[np.ndarray] = None,
+                  mad_center=None) -> np.ndarray:
+    """
+    (Internal) Spike counts along the last axis of `data`.
+
+    A 1-D trace gives a scalar count; a stacked (components, samples) array
+    gives one count per component from a single vectorized median/MAD pass.
+    With sample `edges` a (..., bins) array of per-bin counts is returned.
+    The MAD is taken around each window's median, or around the fixed
+    `mad_center` (a scalar, or one value per component) if given.
+    """
+    window_size = wn + 1
+    start_index = int(window_size / 2)
+    n_windows = data.shape[-1] - wn
+
+    x_array = np.lib.stride_tricks.sliding_window_view(data, window_size, axis=-1)
+    x_median = np.median(x_array, axis=-1)
+    if mad_center is None:
+        deviation = x_array - x_median[..., None]
+    else:
+        # integer (int32-native) input is taken around the float reference,
+        # an x.5 median must not be truncated; float32 keeps its precision
+        center_dtype = x_array.dtype if x_array.dtype.kind == 'f' else np.result_type(x_array.dtype, np.float64)
+        deviation = x_array - np.asarray(mad_center, dtype=center_dtype)[..., None, None]
+    np.abs(deviation, out=deviation)
+    mad = np.median(deviation, axis=-1, overwrite_input=True)
+    del deviation
+
+    data_centered = data[..., start_index : start_index + n_windows]
+    difference = np.abs(data_centered - x_median)
+    threshold = 1.4826 * sigma * mad + 1e-9
+
+    outlier_idx = (threshold > 0) & (difference > threshold)
+    if edges is not None:
+        return _bin_counts(outlier_idx, start_index, edges)
+    return np.sum(outlier_idx, axis=-1)
+
+def _spikes_chunked(data: np.ndarray, wn: int, sigma, max_block_mb: float = DEFAULT_SPIKE_MAX_BLOCK_MB,
+                    dtype=np.float64, edges: Optional[np.ndarray] = None, mad_center: Optional[float] = None):
+    """
+    (Internal) The 'fast' engine run over consecutive blocks of windows.
+
+    Each block covers `rows` windows and reads `rows + wn` samples, so the
+    wn-sample halo shared with the next block keeps boundary windows exact.
+    The window working set per block stays below `max_block_mb`.
+    """
+    N = len(data)
+    n_windows = N - wn
+    if n_windows <= 0:
+        return _no_spikes(edges)
+
+    window_size = wn + 1
+    bytes_per_row = window_size * _spike_bytes_per_cell(dtype)
+    rows = max(1, int(max_block_mb * 1024 * 1024 // bytes_per_row))
+
+    num_spikes = _no_spikes(edges)
+    for w0 in range(0, n_windows, rows):
+        w1 = min(w0 + rows, n_windows)
+        block = _spike_input(data[w0 : w1 + wn], dtype)
+        num_spikes += _spikes_vectorized(block, wn, sigma, None if edges is None else edges - w0, mad_center)
+    return num_spikes
+
+def _spikes_approx(data: np.ndarray, wn: int, sigma, max_block_mb: float = DEFAULT_SPIKE_MAX_BLOCK_MB,
+                   dtype=np.float64, hop: int = APPROX_SPIKE_HOP, edges: Optional[np.ndarray] = None,
+                   mad_center: Optional[float] = None):
+    """
+    (Internal) Approximate spike count from a decimated median/MAD grid.
+
+    The median and MAD are computed exactly for every `hop`-th window only
+    and interpolated for the windows in between. Samples whose deviation
+    exceeds APPROX_SPIKE_MARGIN times the interpolated threshold are
+    candidates, and only those are re-tested against their exact window,
+    so every reported spike is one the 'fast' engine also reports. Spikes
+    are missed only where the interpolated threshold overshoots the exact
+    one by more than 1 / APPROX_SPIKE_MARGIN. Grid windows containing NaN
+    (gaps) are left out of the interpolation, and the NaN-free windows
+    between such a grid point and its neighbours are all tested exactly.
+    Work is blocked so that the grid and per-window arrays stay below
+    `max_block_mb`.
+    """
+    N = len(data)
+    n_windows = N - wn
+    if n_windows <= 0:
+        return _no_spikes(edges)
+
+    window_size = wn + 1
+    start_index = int(window_size / 2)
+    k = 1.4826 * sigma
+    bytes_per_row = window_size * _spike_bytes_per_cell(dtype)
+    grid_rows = max(2, int(max_block_mb * 1024 * 1024 // (bytes_per_row + hop * APPROX_BYTES_PER_WINDOW)))
+    span = (grid_rows - 1) * hop
+
+    num_spikes = 0
+    positions = []
+    for w0 in range(0, n_windows, span):
+        w1 = min(w0 + span, n_windows)
+        x = _spike_input(data[w0 : w1 + wn], dtype)
+        windows = np.lib.stride_tricks.sliding_window_view(x, window_size)
+
+        # exact median/MAD on the grid, including the block's last window
+        grid = np.unique(np.r_[np.arange(0, w1 - w0, hop), w1 - w0 - 1])
+        grid_windows = windows[grid]
+        grid_median = np.median(grid_windows, axis=-1)
+        grid_mad = np.median(np.abs(grid_windows - _mad_reference(grid_median, mad_center)), axis=-1)
+        del grid_windows
+
+        w = np.arange(w1 - w0)
+        finite = ~(np.isnan(grid_median) | np.isnan(grid_mad))
+        nan_count = np.r_[0, np.cumsum(np.isnan(x))]
+        has_nan = nan_count[window_size:window_size + len(w)] > nan_count[:len(w)]
+        if finite.any():
+            median = np.interp(w, grid[finite], grid_median[finite])
+            threshold = k * np.interp(w, grid[finite], grid_mad[finite]) + 1e-9
+            center = x[start_index : start_index + len(w)]
+            suspect = np.abs(center - median) > APPROX_SPIKE_MARGIN * threshold
+            del median, threshold
+            if not finite.all():
+                # next to a NaN grid window the interpolation is unreliable: test exactly
+                suspect |= np.interp(w, grid, (~finite).astype(np.float64)) > 0
+        else:
+            suspect = np.ones(len(w), dtype=bool)
+        candidates = np.flatnonzero(suspect & ~has_nan)
+        del suspect, has_nan
+
+        # exact test of the candidate windows only, in grid-sized batches
+        for c0 in range(0, len(candidates), grid_rows):
+            cand = candidates[c0:c0 + grid_rows]
+            cand_windows = windows[cand]
+            cand_median = np.median(cand_windows, axis=-1)
+            cand_mad = np.median(np.abs(cand_windows - _mad_reference(cand_median, mad_center)), axis=-1)
+            cand_threshold = k * cand_mad + 1e-9
+            difference = np.abs(x[cand + start_index] - cand_median)
+            hits = cand[(cand_threshold > 0) & (difference > cand_threshold)]
+            num_spikes += len(hits)
+            if edges is not None:
+                positions.append(hits + w0 + start_index)
+
+    if edges is not None:
+        return _bin_positions(np.concatenate(positions) if positions else [], edges)
+    return num_spikes
+
+def _mad_reference(window_median: np.ndarray, mad_center: Optional[float] = None):
+    """(Internal) Per-window MAD reference (column), or the fixed `mad_center`."""
+    if mad_center is None:
+        return window_median[:, None]
+    return mad_center
+
+def _estimate_spike_memory(npts: int, wn: int, method: str, max_block_mb: float = DEFAULT_SPIKE_MAX_BLOCK_MB,
+                           dtype=np.float64) -> float:
+    """(Internal) Approximate peak bytes a spike engine needs for one trace."""
+    window_size = wn + 1
+    n_windows = max(0, npts - wn)
+    itemsize = np.dtype(dtype).itemsize
+    bytes_per_cell = _spike_bytes_per_cell(dtype)
+    if method == 'fast':
+        return npts * itemsize + n_windows * window_size * bytes_per_cell
+    if method == 'chunked':
+        block_bytes = min(max_block_mb * 1024 * 1024, n_windows * window_size * bytes_per_cell)
+        rows = max(1, int(block_bytes // (window_size * bytes_per_cell)))
+        return block_bytes + (rows + wn) * itemsize
+    # 'streaming': one block of Python floats plus the window
+    return STREAMING_BLOCK_SIZE * 32 + window_size * 64
+
+def _available_memory_bytes() -> float:
+    """(Internal) Memory currently available to the system."""
+    import psutil
+    return float(psutil.virtual_memory().available)
+
+def _select_spike_engine(npts: int, wn: int, max_block_mb: float, memory_budget_bytes: float,
+                         dtype=np.float64):
+    """
+    (Internal) Picks the fastest spike engine whose footprint fits the budget.
+
+    Returns
+    -------
+    Tuple[str, float]
+        The engine ('fast', 'chunked' or 'streaming') and the block cap in MB
+        to use if it is 'chunked'.
+    """
+    usable = memory_budget_bytes * SPIKE_AUTO_BUDGET_FRACTION
+    if _estimate_spike_memory(npts, wn, 'fast', dtype=dtype) <= usable:
+        return 'fast', max_block_mb
+
+    block_mb = min(max_block_mb, usable / (1024 * 1024))
+    if block_mb >= SPIKE_AUTO_MIN_BLOCK_MB:
+        return 'chunked', block_mb
+
+    return 'streaming', max_block_mb
+
+def _spikes_auto(data: np.ndarray, wn: int, sigma, max_block_mb: float = DEFAULT_SPIKE_MAX_BLOCK_MB,
+                 memory_budget_bytes: Optional[float] = None, trace_id: str = '',
+                 dtype=np.float64, edges: Optional[np.ndarray] = None, mad_center: Optional[float] = None):
+    """
+    (Internal) Counts spikes with the engine chosen by `_select_spike_engine`.
+
+    If the chosen engine still runs out of memory, the next cheaper engine
+    is tried ('fast' -> 'chunked' -> 'streaming') instead of dropping the
+    trace, so a MemoryError never turns into a stored count of 0.
+    """
+    if memory_budget_bytes is None:
+        memory_budget_bytes = _available_memory_bytes()
+
+    engine, block_mb = _select_spike_engine(len(data), wn, max_block_mb, memory_budget_bytes, dtype)
+    logger.debug(
+        f"{trace_id} auto spike engine: '{engine}' "
+        f"(npts={len(data)}, budget={memory_budget_bytes / 1024**2:.0f} MB)"
+    )
+
+    if engine == 'fast':
+        try:
+            return _spikes_vectorized(_spike_input(data, dtype), wn, sigma, edges, mad_center)
+        except MemoryError:
+            logger.warning(f"{trace_id} MemoryError in 'fast' spike engine, retrying with 'chunked'.")
+            engine = 'chunked'
+            block_mb = SPIKE_AUTO_MIN_BLOCK_MB
+
+    if engine == 'chunked':
+        try:
+            return _spikes_chunked(data, wn, sigma, block_mb, dtype, edges, mad_center)
+        except MemoryError:
+            logger.warning(f"{trace_id} MemoryError in 'chunked' spike engine, retrying with 'streaming'.")
+
+    return _spikes_streaming(data, wn, sigma, edges=edges, mad_center=mad_center)
+
+def _calculate_spikes(st: Stream, wn: int, sigma: int, method: str = 'fast',
+                      max_block_mb: float = DEFAULT_SPIKE_MAX_BLOCK_MB,
+                      memory_budget_bytes: Optional[float] = None,
+                      dtype=np.float64, threads: int = 1,
+                      edges: Optional[List[np.ndarray]] = None,
+                      spike_mad: str = DEFAULT_SPIKE_MAD):
     """
     Calculates the total number of spikes across all traces in a Stream.
 
@@ -19,28 +631,65 @@ def _calculate_spikes(st: Stream, wn: int, sigma: int, method: str = 'fast'):
     sigma : int or float
         Threshold multiplier for spike detection.
     method : str, optional
-        Either 'fast' (high-memory, fast) or 'efficient' (low-memory, slower).
+        'fast' (high-memory, fast), 'efficient' (low-memory, slower),
+        'streaming' (window-sized memory, same counts as 'fast'),
+        'chunked' ('fast' over blocks of at most `max_block_mb`),
+        'auto' (fast, chunked or streaming per trace, whichever fits the
+        memory budget) or 'approx' (median/MAD on a decimated grid,
+        exact re-test near candidates; may undercount slightly).
+    max_block_mb : float, optional
+        Working-set cap of one block for the 'chunked' and 'approx' methods.
+    memory_budget_bytes : float, optional
+        Memory the 'auto' method may plan for. Defaults to the memory
+        currently available to the system.
+    dtype : numpy dtype, optional
+        Working precision of the 'fast', 'chunked' and 'auto' engines
+        (np.float64 or np.float32).
+    threads : int, optional
+        Traces counted in parallel (thread pool). Each running trace holds
+        its own engine working set; the 'auto' budget is split between them.
+    edges : list of numpy.ndarray, optional
+        Per-trace sample index of each bin start (see `_bin_edges`). If
+        given, the spikes are counted per bin.
+    spike_mad : str, optional
+        Reference of the MAD: 'trace' (deviations around the median of all
+        of the trace's windows, as the original 'fast' engine) or 'window'
+        (around each window's own median). Applies to every method.
 
     Returns
     -------
-    int
-        Total number of spikes across all traces.
+    int or numpy.ndarray
+        Total number of spikes across all traces (per bin if `edges` is given).
     """
 
-    num_spikes_total = 0
     logger.debug(f"Using {method} spike calculation method.")
 
-    for tr in st:
-        data = tr.data.astype(np.float64)
-        num_spike_trace = 0
+    threads = max(1, min(int(threads or 1), len(st)))
+    if method == 'auto' and threads > 1:
+        if memory_budget_bytes is None:
+            memory_budget_bytes = _available_memory_bytes()
+        memory_budget_bytes = memory_budget_bytes / threads
+
+    def count_trace(item):
+        tr, tr_edges = item
+        num_spike_trace = _no_spikes(tr_edges)
 
         try:
             # Skip too-short traces
-            if len(data) < wn * 2:
-                continue
+            if len(tr.data) < wn * 2:
+                return num_spike_trace
+            # the block-capped engines never sort the whole trace for it
+            mad_block = STREAMING_BLOCK_SIZE if method == 'streaming' else _mad_center_block_size(max_block_mb)
+            mad_center = _spike_mad_center(tr.data, wn, spike_mad,
+                                           None if method in ('fast', 'efficient') else mad_block)
 
-            # --- Engine 1: 'efficient' (Low-Memory, Slow but consistent) ---
-            if method == 'efficient':
+            # --- Engine 1: 'streaming' (Window-Sized Memory, same counts as 'fast') ---
+            if method == 'streaming':
+                num_spike_trace = _spikes_streaming(tr.data, wn, sigma, edges=tr_edges, mad_center=mad_center)
+
+            # --- Engine 2: 'efficient' (Low-Memory, Slow but consistent) ---
+            elif method == 'efficient':
+                data = tr.data.astype(np.float64)
                 # Ensure odd window size for symmetry
                 wn_odd = wn + 1 if wn % 2 == 0 else wn
                 half_window = wn_odd // 2
@@ -57,7 +706,7 @@ def _calculate_spikes(st: Stream, wn: int, sigma: int, method: str = 'fast'):
                     x = x[~np.isnan(x)]  # remove NaNs
                     if len(x) == 0:
                         return np.nan
-                    med = np.median(x)
+                    med = np.median(x) if mad_center is None else mad_center
                     return np.median(np.abs(x - med))
 
                 x_mad = (
@@ -76,165 +725,471 @@ def _calculate_spikes(st: Stream, wn: int, sigma: int, method: str = 'fast'):
 
                 # Compare (both NaN-safe)
                 mask = (diff_valid > thr_valid) & (~diff_valid.isna()) & (~thr_valid.isna())
-                num_spike_trace = int(mask.sum())
+                if tr_edges is not None:
+                    num_spike_trace = _bin_positions(mask.index[mask.to_numpy()], tr_edges)
+                else:
+                    num_spike_trace = int(mask.sum())
+
+            # --- Engine 3: 'auto' (Per-Trace Choice by Memory Budget) ---
+            elif method == 'auto':
+                num_spike_trace = _spikes_auto(tr.data, wn, sigma, max_block_mb, memory_budget_bytes, tr.id, dtype,
+                                               tr_edges, mad_center)
+
+            # --- Engine 4: 'approx' (Decimated Median/MAD Grid, Fastest) ---
+            elif method == 'approx':
+                num_spike_trace = _spikes_approx(tr.data, wn, sigma, max_block_mb, dtype, edges=tr_edges,
+                                                 mad_center=mad_center)
+
+            # --- Engine 5: 'chunked' (Bounded-Memory, Fast) ---
+            elif method == 'chunked':
+                num_spike_trace = _spikes_chunked(tr.data, wn, sigma, max_block_mb, dtype, tr_edges, mad_center)
 
-            # --- Engine 2: 'fast' (High-Memory, Fast) ---
+            # --- Engine 6: 'fast' (High-Memory, Fast) ---
             else:
-                mad_array = lambda x: np.median(np.abs(x - np.median(x)), axis=1)
-                diff_array = lambda x: np.median(x, axis=1)
-                
-                N = len(data)
-                window_size = wn + 1
-                start_index = int(window_size / 2)
-                vert_idx_list = np.arange(0, N - wn, 1)
-                
-                if len(vert_idx_list) == 0:
-                    continue
-                    
-                hori_idx_list = np.arange(window_size)
-                A, B = np.meshgrid(hori_idx_list, vert_idx_list)
-                idx_array = A + B
-                x_array = data[idx_array]
-                
-                mad = mad_array(x_array)
-                x_mean = diff_array(x_array)
-                
-                data_centered = data[start_index : start_index + len(vert_idx_list)]
-                difference = np.abs(data_centered - x_mean)
-                threshold = 1.4826 * sigma * mad + 1e-9
-                
-                outlier_idx = np.full(difference.shape, False)
-                mask = threshold > 0
-                outlier_idx[mask] = difference[mask] > threshold[mask]
-                
-                num_spike_trace = np.sum(outlier_idx)
+                num_spike_trace = _spikes_vectorized(_spike_input(tr.data, dtype), wn, sigma, tr_edges, mad_center)
         
         except MemoryError:
             logger.error(
                 f"MemoryError processing spikes for {tr.id} with '{method}' method. "
                 f"Trace length: {len(tr.data)}. Skipping spike calculation for this trace."
             )
-            continue
+            return _no_spikes(tr_edges)
         except Exception as e:
             logger.warning(
                 f"Spike calculation failed for {tr.id}: {e}"
             )
-            continue
+            return _no_spikes(tr_edges)
             
-        num_spikes_total += num_spike_trace
-        
-    return num_spikes_total
+        return num_spike_trace
+
+    trace_edges = edges if edges is not None else [None] * len(st)
+    return sum(_thread_map(count_trace, list(zip(st, trace_edges)), threads))
+
+@dataclass
+class TraceStats:
+    """
+    Single-pass summary of one trace's samples.
+
+    `sum` and `sumsq` are taken over (x - shift) for the finite samples,
+    where `shift` is the first finite sample; shifting keeps the variance
+    free of cancellation for traces with a large DC offset. For native
+    integer traces both are exact Python ints.
+    """
+    npts: int = 0
+    nan_count: int = 0
+    shift: float = 0.0
+    sum: float = 0.0
+    sumsq: float = 0.0
+    min: float = np.nan
+    max: float = np.nan
 
-def _calculate_rms(st: Stream):
+    @property
+    def count(self) -> int:
+        """Number of finite (non-NaN, unmasked) samples."""
+        return self.npts - self.nan_count
+
+    @property
+    def rms(self) -> float:
+        """RMS about the mean (population standard deviation), NaN if no samples."""
+        if self.count == 0:
+            return np.nan
+        if isinstance(self.sum, int) and isinstance(self.sumsq, int):
+            # exact integer variance: (n * sum(d^2) - sum(d)^2) / n^2
+            var_num = self.count * self.sumsq - self.sum * self.sum
+            return float(np.sqrt(float(var_num))) / self.count
+        mean_dev = self.sum / self.count
+        return float(np.sqrt(max(0.0, self.sumsq / self.count - mean_dev * mean_dev)))
+
+@dataclass
+class HourlyStats:
+    """
+    Per-bin count, sum and sum of squares of (x - shift) for the finite
+    samples, the binned counterpart of TraceStats. The statistics kernels
+    add each block they read; `edges` are the sample indices at which the
+    trace's bins start (see `_bin_edges`).
+    """
+    count: np.ndarray
+    sum: np.ndarray
+    sumsq: np.ndarray
+    shift: float = np.nan
+    edges: Optional[np.ndarray] = None
+
+    @classmethod
+    def empty(cls, n_bins: int, edges: Optional[np.ndarray] = None) -> 'HourlyStats':
+        return cls(count=np.zeros(n_bins, dtype=np.int64), sum=np.zeros(n_bins),
+                   sumsq=np.zeros(n_bins), edges=edges)
+
+    def add(self, block: np.ndarray, b0: int):
+        """Adds samples [b0, b0 + len(block)) of the trace (NaN samples are skipped)."""
+        d = np.asarray(block, dtype=np.float64)
+        finite = None if np.issubdtype(np.asarray(block).dtype, np.integer) else ~np.isnan(d)
+        if np.isnan(self.shift):
+            first = 0 if finite is None else int(np.argmax(finite))
+            if finite is not None and not finite[first]:
+                return
+            self.shift = float(d[first])
+        d = d - self.shift
+        if finite is not None:
+            d[~finite] = 0.0
+
+        local = np.clip(self.edges - b0, 0, len(d))
+        for k in np.flatnonzero(local[1:] > local[:-1]):
+            part = d[local[k]:local[k + 1]]
+            n = len(part) if finite is None else int(np.count_nonzero(finite[local[k]:local[k + 1]]))
+            self.count[k] += n
+            self.sum[k] += float(part.sum())
+            self.sumsq[k] += float(np.dot(part, part))
+
+    def merge(self, other: 'HourlyStats') -> 'HourlyStats':
+        """Folds another trace's bins into these and returns self."""
+        if np.isnan(other.shift):
+            return self
+        if np.isnan(self.shift):
+            self.shift = other.shift
+        # re-centre the other sums on this shift: x - s = (x - s_other) + delta
+        delta = other.shift - self.shift
+        self.sumsq += other.sumsq + 2 * delta * other.sum + other.count * delta * delta
+        self.sum += other.sum + other.count * delta
+        self.count += other.count
+        return self
+
+    @property
+    def rms(self) -> np.ndarray:
+        """RMS about the mean of every bin, NaN for bins without samples."""
+        n = np.maximum(self.count, 1)
+        mean_dev = self.sum / n
+        rms = np.sqrt(np.maximum(0.0, self.sumsq / n - mean_dev * mean_dev))
+        return np.where(self.count > 0, rms, np.nan)
+
+def _trace_stats(data: np.ndarray, block_size: int = TRACE_STATS_BLOCK_SIZE,
+                 dtype=np.float64, sketch: Optional[QuantileSketch] = None,
+                 hourly: Optional[HourlyStats] = None) -> TraceStats:
+    """
+    (Internal) Sum, sum of squares, min, max and NaN count in one blocked pass.
+
+    Each block is read from the trace once; the `dtype` work buffer is block
+    sized, so no trace-length temporaries are created. In float32 mode the
+    samples are held in single precision but the sums are still accumulated
+    in float64 (squares of float32 values are exact in float64). If a
+    `sketch` is given, every block's finite samples are folded into it, and
+    an `hourly` accumulator gets the same blocks binned by time.
+    """
+    npts = len(data)
+    stats = TraceStats(npts=npts)
+    if npts == 0:
+        return stats
+    if _is_native_int(data):
+        return _trace_stats_int(data, block_size, sketch, hourly)
+
+    is_float = np.ma.isMaskedArray(data) or np.issubdtype(data.dtype, np.floating)
+    buf = np.empty(min(block_size, npts), dtype=dtype)
+    single = buf.dtype == np.float32
+    shift = None
+    total = 0.0
+    total_sq = 0.0
+    vmin = np.inf
+    vmax = -np.inf
+
+    for b0 in range(0, npts, block_size):
+        block = data[b0:b0 + block_size]
+        if is_float:
+            block = _as_float(block, dtype)
+        if hourly is not None:
+            hourly.add(block, b0)
+        if is_float:
+            nan_mask = np.isnan(block)
+            n_nan = int(np.count_nonzero(nan_mask))
+            if n_nan:
+                stats.nan_count += n_nan
+                block = block[~nan_mask]
+        if len(block) == 0:
+            continue
+        if sketch is not None:
+            sketch.update(block)
+
+        if shift is None:
+            shift = float(block[0])
+        vmin = min(vmin, float(block.min()))
+        vmax = max(vmax, float(block.max()))
+
+        d = buf[:len(block)]
+        np.subtract(block, shift, out=d)
+        if single:
+            total += float(d.sum(dtype=np.float64))
+            total_sq += float(np.einsum('i,i->', d, d, dtype=np.float64))
+        else:
+            total += float(d.sum())
+            total_sq += float(np.dot(d, d))
+
+    if shift is not None:
+        stats.shift = shift
+        stats.sum = total
+        stats.sumsq = total_sq
+        stats.min = vmin
+        stats.max = vmax
+    return stats
+
+def _trace_stats_int(data: np.ndarray, block_size: int = TRACE_STATS_BLOCK_SIZE,
+                     sketch: Optional[QuantileSketch] = None,
+                     hourly: Optional[HourlyStats] = None) -> TraceStats:
+    """
+    (Internal) Integer-native `_trace_stats` for unmasked <= 32-bit integer data.
+
+    Min/max are taken on the native dtype, and (x - shift) and its square are
+    accumulated in int64 per block and in Python ints across blocks, so the
+    sums are exact and no float64 copy of the samples is made.
+    """
+    npts = len(data)
+    shift = int(data[0])
+    buf = np.empty(min(block_size, npts), dtype=np.int64)
+    total = 0
+    total_sq = 0
+    vmin = shift
+    vmax = shift
+
+    for b0 in range(0, npts, block_size):
+        block = data[b0:b0 + block_size]
+        if sketch is not None:
+            sketch.update(block)
+        if hourly is not None:
+            hourly.add(block, b0)
+        bmin = int(block.min())
+        bmax = int(block.max())
+        vmin = min(vmin, bmin)
+        vmax = max(vmax, bmax)
+
+        d = buf[:len(block)]
+        np.subtract(block, shift, out=d, dtype=np.int64)
+        total += int(d.sum())
+
+        peak = max(bmax - shift, shift - bmin)
+        if peak == 0:
+            continue
+        # longest run whose sum of squares can not overflow int64
+        step = INT64_MAX // (peak * peak)
+        if step == 0:
+            total_sq += int(round(float(np.dot(d.astype(np.float64), d.astype(np.float64)))))
+            continue
+        for s0 in range(0, len(d), step):
+            part = d[s0:s0 + step]
+            total_sq += int(np.dot(part, part))
+
+    return TraceStats(npts=npts, nan_count=0, shift=float(shift), sum=total, sumsq=total_sq,
+                      min=float(vmin), max=float(vmax))
+
+def _calculate_rms(st: Stream, trace_stats: Optional[List[TraceStats]] = None):
     """Calculates the average RMS of all traces in a Stream."""
     if not st:
         return 0.0
+    if trace_stats is None:
+        trace_stats = [_trace_stats(tr.data) for tr in st]
     
     rms_values = []
-    for tr in st:
-        if tr.stats.npts == 0 or len(tr.data) == 0:
+    for stats in trace_stats:
+        # Skip empty and all-NaN traces
+        if stats.count == 0:
             continue
-        
-        # Use float64 for precision and nanmean to handle gaps
-        try:
-            mean_square = np.nanmean(np.square(tr.data.astype(np.float64)- np.nanmean(tr.data.astype(np.float64))))
-            if not np.isnan(mean_square) and mean_square >= 0:
-                rms_values.append(np.sqrt(mean_square))
-        except Exception:
-            continue # Skip trace on numerical error
+        rms = stats.rms
+        if not np.isnan(rms):
+            rms_values.append(rms)
 
     if not rms_values:
         return 0.0
         
     return sum(rms_values) / len(rms_values)
 
-def _calculate_percent_availability(st: Stream, day_start_time: UTCDateTime, day_end_time: UTCDateTime):
+@dataclass
+class GapSummary:
     """
-    Calculates the percentage of data availability against a fixed daily window.
+    Gap, overlap and coverage summary of one stream, built from trace headers.
+
+    Only start/end times and sampling rates are used (plus the mask of
+    masked traces, which marks gaps already merged into a trace), so it can
+    be built without any decoded samples, e.g. from MiniSEED record headers.
+    `gaps` holds the same entries, in the same order, as Stream.get_gaps():
+    [network, station, location, channel, starttime, endtime, delta, nsamples].
     """
-    if not st:
-        return 0.0
-    
-    # 1. The Denominator: The total window size (handles leap seconds)
-    total_day_duration = day_end_time - day_start_time
-    if total_day_duration <= 0:
-        return 0.0
+    segments: List[tuple] = field(default_factory=list)
+    gaps: List[list] = field(default_factory=list)
 
-    try:
-        # 2. The Numerator: The actual duration of data present in the stream
-        stream_starttime = min(tr.stats.starttime for tr in st)
-        stream_endtime = max(tr.stats.endtime for tr in st)
-        
-        # This is the total time span *covered* by the data
+    @classmethod
+    def from_segments(cls, segments) -> 'GapSummary':
+        """
+        Builds the summary from (network, station, location, channel,
+        starttime, endtime, sampling_rate) tuples in any order.
+        """
+        segments = sorted(segments, key=lambda seg: (seg[0], seg[1], seg[2], seg[3], seg[4], seg[5]))
+        gaps = []
+        for i in range(len(segments) - 1):
+            net, sta, loc, cha, start, end, sampling_rate = segments[i]
+            nxt = segments[i + 1]
+            # skip segments of different network, station, location or channel
+            if (net, sta, loc, cha) != nxt[:4]:
+                continue
+            delta_t = 1.0 / sampling_rate if sampling_rate else 0.0
+            nxt_delta_t = 1.0 / nxt[6] if nxt[6] else 0.0
+            same_sampling_rate = delta_t == nxt_delta_t
+
+            stime = min(end, nxt[5])
+            etime = nxt[4]
+            # last sample of the earlier segment covers one delta past its endtime
+            delta = etime.timestamp - (stime.timestamp + delta_t)
+            # an overlap can not be larger than the later segment itself
+            if delta < 0:
+                temp = nxt[5].timestamp - etime.timestamp
+                if (delta * -1) > temp:
+                    delta = -1 * temp
+
+            nsamples = int(round_away(abs(delta) * sampling_rate))
+            if delta < 0:
+                nsamples = -nsamples
+            if same_sampling_rate and nsamples == 0:
+                continue
+
+            # skip gaps lying inside an earlier, longer segment of the same id
+            covered = any(
+                prev[:4] == (net, sta, loc, cha) and prev[4] < stime < etime < prev[5]
+                for prev in segments[:i]
+            )
+            if covered:
+                continue
+            gaps.append([net, sta, loc, cha, stime, etime, delta, nsamples])
+        return cls(segments=segments, gaps=gaps)
+
+    @classmethod
+    def from_stream(cls, st: Stream) -> 'GapSummary':
+        """Builds the summary from the headers (and masks) of a Stream's traces."""
+        segments = []
+        for tr in st:
+            s = tr.stats
+            ids = (s.network, s.station, s.location, s.channel)
+            mask = np.ma.getmask(tr.data)
+            if mask is np.ma.nomask or not mask.any():
+                segments.append(ids + (s.starttime, s.endtime, s.sampling_rate))
+                continue
+            # masked trace: every unmasked run is its own segment, like Trace.split()
+            for run in np.ma.clump_unmasked(tr.data):
+                t_start = s.starttime + run.start * s.delta
+                t_end = s.starttime + (run.stop - 1) * s.delta
+                segments.append(ids + (t_start, t_end, s.sampling_rate))
+        return cls.from_segments(segments)
+
+    @property
+    def gap_count(self) -> int:
+        return sum(1 for g in self.gaps if g[6] > 0)
+
+    @property
+    def overlap_count(self) -> int:
+        return sum(1 for g in self.gaps if g[6] <= 0)
+
+    @property
+    def gap_duration(self) -> float:
+        """Total duration (s) of the gaps, overlaps excluded."""
+        return sum(g[6] for g in self.gaps if g[6] > 0)
+
+    def availability(self, day_start_time: UTCDateTime, day_end_time: UTCDateTime) -> float:
+        """Percentage of the [day_start_time, day_end_time] window covered by data."""
+        if not self.segments:
+            return 0.0
+
+        # 1. The Denominator: The total window size (handles leap seconds)
+        total_day_duration = day_end_time - day_start_time
+        if total_day_duration <= 0:
+            return 0.0
+
+        # 2. The Numerator: the span covered by data, minus the gaps inside it
+        stream_starttime = min(seg[4] for seg in self.segments)
+        stream_endtime = max(seg[5] for seg in self.segments)
         stream_span = stream_endtime - stream_starttime
-        
         if stream_span < 0: # Data is invalid
             return 0.0
+        actual_data_duration = stream_span - self.gap_duration
 
-        # Find all gaps *within* that span
-        delta_gaps = 0
-        for gap in st.get_gaps():
-            if gap[6] > 0: # gap[6] is the duration
-                delta_gaps += gap[6]
-        
-        # This is the actual amount of data recorded
-        actual_data_duration = stream_span - delta_gaps
-        
         # 3. The Final Formula
         percentage = 100 * (actual_data_duration / total_day_duration)
-        
+
         # Cap at 100% in case of rounding or minor data overlaps beyond the day
         return min(100.0, round(percentage, 2))
 
+    def hourly(self, day_start_time: UTCDateTime, day_end_time: UTCDateTime,
+               bin_seconds: float = HOURLY_BIN_SECONDS):
+        """
+        Per-bin availability (%) and gap count of the day window.
+
+        A segment covers its samples plus one delta after the last one;
+        overlapping segments are counted once. A gap is counted in the bin
+        where it starts.
+
+        Returns
+        -------
+        Tuple[numpy.ndarray, numpy.ndarray]
+            Availability and gap count of every bin.
+        """
+        n_bins = _n_bins(day_start_time, day_end_time, bin_seconds)
+        starts = day_start_time.timestamp + np.arange(n_bins) * bin_seconds
+        ends = np.minimum(starts + bin_seconds, day_end_time.timestamp)
+
+        intervals = sorted(
+            (seg[4].timestamp, seg[5].timestamp + (1.0 / seg[6] if seg[6] else 0.0))
+            for seg in self.segments
+        )
+        covered = np.zeros(n_bins)
+        run_start, run_end = None, None
+        for seg_start, seg_end in intervals + [(np.inf, np.inf)]:
+            if run_end is not None and seg_start <= run_end:
+                run_end = max(run_end, seg_end)
+                continue
+            if run_end is not None:
+                covered += np.clip(np.minimum(ends, run_end) - np.maximum(starts, run_start), 0.0, None)
+            run_start, run_end = seg_start, seg_end
+        availability = np.minimum(100.0, np.round(100 * covered / (ends - starts), 2))
+
+        gap_starts = np.array([g[4].timestamp for g in self.gaps if g[6] > 0])
+        bins = np.clip(((gap_starts - day_start_time.timestamp) // bin_seconds).astype(np.int64), 0, n_bins - 1)
+        ngap = np.bincount(bins, minlength=n_bins).astype(np.int64)
+        return availability, ngap
+
+def _calculate_percent_availability(st: Stream, day_start_time: UTCDateTime, day_end_time: UTCDateTime,
+                                    gap_summary: Optional[GapSummary] = None):
+    """
+    Calculates the percentage of data availability against a fixed daily window.
+    """
+    if not st and gap_summary is None:
+        return 0.0
+
+    try:
+        if gap_summary is None:
+            gap_summary = GapSummary.from_stream(st)
+        return gap_summary.availability(day_start_time, day_end_time)
+
     except Exception as e:
         stream_id = st[0].id if st else "empty stream" # type: ignore
         logger.warning(f"Could not calculate availability for {stream_id}: {e}")
         return 0.0
 
-def _calculate_gaps_overlaps(st: Stream):
+def _calculate_gaps_overlaps(st: Stream, gap_summary: Optional[GapSummary] = None):
     """Counts the number of gaps and overlaps in a Stream."""
     try:
-        result = st.get_gaps()
-        gaps = 0
-        overlaps = 0
-        for r in result:
-            if r[6] > 0:
-                gaps += 1
-            else:
-                overlaps += 1
-        return gaps, overlaps
+        if gap_summary is None:
+            gap_summary = GapSummary.from_stream(st)
+        return gap_summary.gap_count, gap_summary.overlap_count
     except Exception as e:
         stream_id = st[0].id if st else "empty stream" # type: ignore
         logger.warning(f"Could not calculate gaps/overlaps for {stream_id}: {e}")
         return 99999.0, 99999.0
 
-def _calculate_stream_amplitude(st: Stream):
+def _calculate_stream_amplitude(st: Stream, trace_stats: Optional[List[TraceStats]] = None):
     """Finds the min and max amplitude across all traces in a Stream."""
-    ampmax = -np.inf
-    ampmin = np.inf
-    valid_data_found = False
-    
-    for tr in st:
-        data = tr.data
-        if not isinstance(data, np.ndarray) or len(data) == 0 or np.all(np.isnan(data)):
-            continue
-            
-        try:
-            current_max = np.nanmax(data)
-            current_min = np.nanmin(data)
-            
-            if current_max > ampmax:
-                ampmax = current_max
-            if current_min < ampmin:
-                ampmin = current_min
-            valid_data_found = True
-        except Exception:
-            continue
+    if trace_stats is None:
+        trace_stats = [_trace_stats(tr.data) for tr in st]
 
-    if not valid_data_found:
+    valid = [stats for stats in trace_stats if stats.count > 0]
+    if not valid:
         return np.nan, np.nan
-    else:
-        return ampmax, ampmin
+
+    ampmax = max(stats.max for stats in valid)
+    ampmin = min(stats.min for stats in valid)
+    return ampmax, ampmin
 
 def _calculate_ratioamp(ampmin, ampmax):
     """Calculates the ratio of max/min amplitude."""
@@ -250,20 +1205,77 @@ def _calculate_ratioamp(ampmin, ampmax):
     
     return min(ratio, 99999.0)
 
-def process_basic_metrics(data: Stream, day_start_time: UTCDateTime, day_end_time: UTCDateTime, spike_method: str = 'fast'):
+def process_basic_metrics(data: Stream, day_start_time: UTCDateTime, day_end_time: UTCDateTime, spike_method: str = 'fast',
+                          spike_max_block_mb: float = DEFAULT_SPIKE_MAX_BLOCK_MB,
+                          memory_budget_bytes: Optional[float] = None,
+                          metrics_dtype: str = DEFAULT_METRICS_DTYPE, threads: int = 1,
+                          amplitude_sketch: bool = False, hourly: bool = False,
+                          spike_mad: str = DEFAULT_SPIKE_MAD):
     """
     Main function to calculate all basic metrics from a stream.
     Now calculates ratioamp internally.
+
+    The input stream is read-only: no metric function modifies `data` or its
+    traces, so it is used without a copy and the caller can hand the same
+    stream to the PPSD stage afterwards.
+
+    `metrics_dtype` ('float64' or 'float32') sets the working precision of
+    the statistics kernel and the vectorized spike engines. With
+    `threads` > 1 the traces of a fragmented stream are processed on a
+    thread pool of that size (see `threads_per_worker`). `spike_mad`
+    ('trace' or 'window') sets the reference of the spike MAD for every
+    spike method (see `_calculate_spikes`).
+
+    With `amplitude_sketch`, the same pass feeds a mergeable quantile
+    sketch of the samples; the result then also holds 'amp_p01',
+    'amp_p50', 'amp_p99', 'amp_mad' and the 'sketch' itself.
+
+    With `hourly`, the same pass also bins the day into HOURLY_BIN_SECONDS
+    windows; the result's 'hourly' entry maps each name in HOURLY_METRICS
+    to a per-bin array (availability %, RMS, gap count, spike count).
     """
-    st = data.copy()
+    st = data
+    dtype = _metrics_dtype(metrics_dtype)
     # st.detrend()
+
+    n_bins = _n_bins(day_start_time, day_end_time)
+    edges = [_bin_edges(tr, day_start_time, n_bins) for tr in st] if hourly else None
+    bins = [HourlyStats.empty(n_bins, e) for e in edges] if hourly else [None] * len(st)
     
-    rms = _calculate_rms(st)
+    # 0. One pass over every trace's samples; RMS and amplitude derive from it
+    sketches = [QuantileSketch() for _ in st] if amplitude_sketch else [None] * len(st)
+    trace_stats = _thread_map(
+        lambda item: _trace_stats(item[0].data, dtype=dtype, sketch=item[1], hourly=item[2]),
+        list(zip(st, sketches, bins)), threads
+    )
+    num_spikes = _calculate_spikes(st, 80, 10, spike_method, spike_max_block_mb, memory_budget_bytes, dtype,
+                                   threads, edges, _spike_mad(spike_mad))
+
+    sketch = None
+    if amplitude_sketch:
+        sketch = sketches[0] if len(sketches) == 1 else merge_sketches(sketches)
+    hourly_stats, spike_bins = None, None
+    if hourly:
+        hourly_stats = HourlyStats.empty(n_bins)
+        for b in bins:
+            hourly_stats.merge(b)
+        spike_bins = num_spikes if isinstance(num_spikes, np.ndarray) else np.zeros(n_bins, dtype=np.int64)
+        num_spikes = int(spike_bins.sum())
+    return _assemble_basic_metrics(st, day_start_time, day_end_time, trace_stats, num_spikes, sketch,
+                                   hourly_stats, spike_bins)
+
+def _assemble_basic_metrics(st: Stream, day_start_time: UTCDateTime, day_end_time: UTCDateTime,
+                            trace_stats: List[TraceStats], num_spikes: int,
+                            sketch: Optional[QuantileSketch] = None,
+                            hourly_stats: Optional[HourlyStats] = None,
+                            spike_bins: Optional[np.ndarray] = None):
+    """(Internal) Final metrics dict from the per-trace statistics and spike count."""
+    rms = _calculate_rms(st, trace_stats)
     if rms > 99999:
         rms = 99999.0
     
     # 1. Get raw amplitude
-    ampmax, ampmin = _calculate_stream_amplitude(st)
+    ampmax, ampmin = _calculate_stream_amplitude(st, trace_stats)
     
     # 2. Calculate ratioamp internally
     ampmax_abs = abs(ampmax)
@@ -271,9 +1283,13 @@ def process_basic_metrics(data: Stream, day_start_time: UTCDateTime, day_end_tim
     ratioamp = _calculate_ratioamp(ampmin_abs, ampmax_abs)
     
     # 3. Get other metrics
-    psdata = _calculate_percent_availability(st, day_start_time, day_end_time)
-    ngap, nover = _calculate_gaps_overlaps(st)
-    num_spikes = _calculate_spikes(st, 80, 10, spike_method)
+    try:
+        gap_summary = GapSummary.from_stream(st)
+    except Exception as e:
+        logger.warning(f"Could not build gap summary: {e}")
+        gap_summary = None
+    psdata = _calculate_percent_availability(st, day_start_time, day_end_time, gap_summary)
+    ngap, nover = _calculate_gaps_overlaps(st, gap_summary)
     
     # 4. Return all metrics
     final_metrics = {
@@ -286,4 +1302,245 @@ def process_basic_metrics(data: Stream, day_start_time: UTCDateTime, day_end_tim
         'nover': nover,
         'num_spikes': num_spikes
     }
-    return final_metrics
\ No newline at end of file
+    if sketch is not None:
+        final_metrics.update(sketch.metrics())
+        final_metrics['sketch'] = sketch
+    if hourly_stats is not None:
+        n_bins = len(hourly_stats.count)
+        if gap_summary is not None:
+            bin_psdata, bin_ngap = gap_summary.hourly(day_start_time, day_end_time)
+        else:
+            bin_psdata, bin_ngap = np.zeros(n_bins), np.zeros(n_bins, dtype=np.int64)
+        final_metrics['hourly'] = {
+            'availability': bin_psdata,
+            'rms': np.minimum(hourly_stats.rms, 99999.0),
+            'ngap': bin_ngap,
+            'num_spikes': spike_bins,
+        }
+    return final_metrics
+
+def _aligned_components(streams: Dict[str, Stream]) -> Optional[List[np.ndarray]]:
+    """
+    (Internal) The components' sample arrays if they can be stacked: one
+    unmasked trace each, same dtype, sampling rate and length, and start
+    times within half a sample. None for ragged components.
+    """
+    if len(streams) < 2 or any(len(st) != 1 for st in streams.values()):
+        return None
+    traces = [st[0] for st in streams.values()]
+    ref = traces[0]
+    for tr in traces:
+        if np.ma.isMaskedArray(tr.data) or tr.data.dtype != ref.data.dtype:
+            return None
+        if tr.stats.npts != ref.stats.npts or tr.stats.sampling_rate != ref.stats.sampling_rate:
+            return None
+        if abs(tr.stats.starttime - ref.stats.starttime) > 0.5 * ref.stats.delta:
+            return None
+    if ref.stats.npts == 0:
+        return None
+    return [tr.data for tr in traces]
+
+def _stacked_trace_stats(channels: List[np.ndarray], block_size: int = TRACE_STATS_BLOCK_SIZE,
+                         dtype=np.float64,
+                         sketches: Optional[List[QuantileSketch]] = None,
+                         hourly: Optional[List[HourlyStats]] = None) -> Optional[List[TraceStats]]:
+    """
+    (Internal) `_trace_stats` of equal-length components in one blocked pass.
+
+    Each block of every component is copied into one (components, block)
+    buffer; min/max and the shift come from single axis-1 reductions.
+    Integer data is exact as in `_trace_stats_int`. Returns None (caller
+    falls back to per-trace stats) for float data containing NaN, or
+    integer data whose squares would overflow int64.
+    """
+    n_comp = len(channels)
+    npts = len(channels[0])
+    native_int = _is_native_int(channels[0])
+    work_dtype = np.int64 if native_int else dtype
+    raw_dtype = channels[0].dtype if native_int else dtype
+
+    width = min(block_size, npts)
+    raw = np.empty((n_comp, width), dtype=raw_dtype)
+    buf = np.empty((n_comp, width), dtype=work_dtype)
+    shift = np.array([c[0] for c in channels], dtype=work_dtype)
+    total = [0 if native_int else 0.0] * n_comp
+    total_sq = [0 if native_int else 0.0] * n_comp
+    vmin = None
+    vmax = None
+
+    for b0 in range(0, npts, block_size):
+        b = min(block_size, npts - b0)
+        block = raw[:, :b]
+        for i, c in enumerate(channels):
+            block[i] = c[b0:b0 + b]
+        if not native_int and np.isnan(block).any():
+            return None
+        if sketches is not None:
+            for i in range(n_comp):
+                sketches[i].update(block[i])
+        if hourly is not None:
+            for i in range(n_comp):
+                hourly[i].add(block[i], b0)
+
+        bmin = block.min(axis=1)
+        bmax = block.max(axis=1)
+        vmin = bmin if vmin is None else np.minimum(vmin, bmin)
+        vmax = bmax if vmax is None else np.maximum(vmax, bmax)
+
+        d = buf[:, :b]
+        np.subtract(block, shift[:, None], out=d, dtype=work_dtype)
+        if not native_int:
+            # same row reductions as `_trace_stats`, so results are bit-identical
+            for i in range(n_comp):
+                if work_dtype == np.float32:
+                    total[i] += float(d[i].sum(dtype=np.float64))
+                    total_sq[i] += float(np.einsum('i,i->', d[i], d[i], dtype=np.float64))
+                else:
+                    total[i] += float(d[i].sum())
+                    total_sq[i] += float(np.dot(d[i], d[i]))
+            continue
+
+        sums = d.sum(axis=1)
+        peak = int(max(np.max(bmax.astype(np.int64) - shift), np.max(shift - bmin.astype(np.int64))))
+        if peak == 0:
+            squares = np.zeros(n_comp, dtype=np.int64)
+        else:
+            step = INT64_MAX // (peak * peak)
+            if step == 0:
+                return None
+            squares = sum(np.einsum('ij,ij->i', d[:, s0:s0 + step], d[:, s0:s0 + step])
+                          for s0 in range(0, b, step))
+        for i in range(n_comp):
+            total[i] += int(sums[i])
+            total_sq[i] += int(squares[i])
+
+    return [
+        TraceStats(npts=npts, nan_count=0, shift=float(shift[i]),
+                   sum=total[i], sumsq=total_sq[i],
+                   min=float(vmin[i]), max=float(vmax[i]))
+        for i in range(n_comp)
+    ]
+
+def _stacked_spikes(channels: List[np.ndarray], wn: int, sigma, max_block_mb: float,
+                    dtype=np.float64, edges: Optional[np.ndarray] = None,
+                    spike_mad: str = DEFAULT_SPIKE_MAD) -> list:
+    """
+    (Internal) The chunked spike engine over stacked components: each block
+    of windows is one (components, samples) array counted in a single call.
+    With the (shared) sample `edges`, per-bin counts are returned per component.
+    """
+    npts = len(channels[0])
+    n_windows = npts - wn
+    if n_windows <= 0 or npts < wn * 2:
+        return [_no_spikes(edges) for _ in channels]
+
+    bytes_per_row = len(channels) * (wn + 1) * _spike_bytes_per_cell(dtype)
+    rows = max(1, int(max_block_mb * 1024 * 1024 // bytes_per_row))
+
+    mad_center = None
+    if spike_mad == 'trace':
+        block_size = _mad_center_block_size(max_block_mb)
+        mad_center = np.array([_window_matrix_median(c, wn, block_size) for c in channels])
+
+    shape = (len(channels),) if edges is None else (len(channels), len(edges) - 1)
+    counts = np.zeros(shape, dtype=np.int64)
+    for w0 in range(0, n_windows, rows):
+        w1 = min(w0 + rows, n_windows)
+        block = np.stack([_spike_input(c[w0 : w1 + wn], dtype) for c in channels])
+        counts += _spike_counts(block, wn, sigma, None if edges is None else edges - w0, mad_center)
+    if edges is not None:
+        return list(counts)
+    return [int(c) for c in counts]
+
+def process_station_basic_metrics(streams: Dict[str, Stream], day_start_time: UTCDateTime,
+                                  day_end_time: UTCDateTime, spike_method: str = 'fast',
+                                  spike_max_block_mb: float = DEFAULT_SPIKE_MAX_BLOCK_MB,
+                                  memory_budget_bytes: Optional[float] = None,
+                                  metrics_dtype: str = DEFAULT_METRICS_DTYPE,
+                                  threads: int = 1, amplitude_sketch: bool = False,
+                                  hourly: bool = False, spike_mad: str = DEFAULT_SPIKE_MAD) -> Dict[str, dict]:
+    """
+    Basic metrics for all components of a station at once.
+
+    `streams` maps each component (e.g. 'E', 'N', 'Z') to its Stream. When
+    the components are aligned on the same time base (one unmasked trace
+    each, same length, rate and dtype), RMS, amplitudes and spikes are
+    computed on stacked (components, samples) blocks in one vectorized pass.
+    The 'fast', 'chunked' and 'auto' spike methods are batched, with 'fast'
+    blocks capped at the footprint of one component's 'fast' run. Ragged
+    components, other spike methods and data the stacked kernels can not
+    take fall back to process_basic_metrics() per component; with
+    `threads` > 1 those components (and their traces) run on thread pools.
+
+    Returns
+    -------
+    Dict[str, dict]
+        The process_basic_metrics() result for every component.
+    """
+    # components run concurrently share the threads and the memory budget
+    parallel = max(1, min(int(threads or 1), len(streams)))
+    comp_threads = max(1, int(threads or 1) // max(1, len(streams)))
+    comp_budget = memory_budget_bytes / parallel if memory_budget_bytes is not None else None
+
+    def per_component():
+        results = _thread_map(
+            lambda st: process_basic_metrics(
+                st, day_start_time, day_end_time, spike_method=spike_method,
+                spike_max_block_mb=spike_max_block_mb, memory_budget_bytes=comp_budget,
+                metrics_dtype=metrics_dtype, threads=comp_threads, amplitude_sketch=amplitude_sketch,
+                hourly=hourly, spike_mad=spike_mad
+            ),
+            list(streams.values()), threads
+        )
+        return dict(zip(streams, results))
+
+    channels = _aligned_components(streams)
+    if channels is None or spike_method not in ('fast', 'chunked', 'auto'):
+        logger.debug(f"Components {list(streams)} not batchable, computing metrics per component.")
+        return per_component()
+
+    dtype = _metrics_dtype(metrics_dtype)
+    sketches = [QuantileSketch() for _ in channels] if amplitude_sketch else None
+    n_bins = _n_bins(day_start_time, day_end_time)
+    edges = _bin_edges(next(iter(streams.values()))[0], day_start_time, n_bins) if hourly else None
+    bins = [HourlyStats.empty(n_bins, edges) for _ in channels] if hourly else None
+    trace_stats = _stacked_trace_stats(channels, dtype=dtype, sketches=sketches, hourly=bins)
+    if trace_stats is None:
+        logger.debug("Stacked statistics not applicable, computing metrics per component.")
+        return per_component()
+
+    wn, sigma = 80, 10
+    npts = len(channels[0])
+    block_mb = spike_max_block_mb
+    engine = spike_method
+    if spike_method == 'auto':
+        budget = memory_budget_bytes if memory_budget_bytes is not None else _available_memory_bytes()
+        engine, block_mb = _select_spike_engine(npts, wn, spike_max_block_mb, budget, dtype)
+    if engine == 'fast':
+        # one component's whole-trace working set, shared by the stack
+        block_mb = _estimate_spike_memory(npts, wn, 'fast', dtype=dtype) / (1024 * 1024)
+
+    spike_counts = None
+    if engine != 'streaming':
+        try:
+            spike_counts = _stacked_spikes(channels, wn, sigma, block_mb, dtype, edges, _spike_mad(spike_mad))
+        except MemoryError:
+            logger.warning(f"MemoryError in batched spike calculation for {list(streams)}, counting per component.")
+    if spike_counts is None:
+        if spike_method == 'auto':
+            comp_budget = budget / parallel
+        spike_counts = _thread_map(
+            lambda st: _calculate_spikes(st, wn, sigma, spike_method, spike_max_block_mb, comp_budget, dtype,
+                                         edges=None if edges is None else [edges],
+                                         spike_mad=_spike_mad(spike_mad)),
+            list(streams.values()), threads
+        )
+
+    return {
+        comp: _assemble_basic_metrics(
+            st, day_start_time, day_end_time, [stats],
+            int(np.sum(num_spikes)), sketches[i] if sketches else None,
+            bins[i] if bins else None, num_spikes if bins else None
+        )
+        for i, ((comp, st), stats, num_spikes) in enumerate(zip(streams.items(), trace_stats, spike_counts))
+    }
@@ -0,0 +1,169 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import logging
+from obspy import Stream, Trace
+from scipy.signal import welch
+
+from .psd_engine import psd_setup, _segment_offsets
+
+logger = logging.getLogger(__name__)
+
+# Envelope decimation of the screen: min/max/mean of every block of this length (s)
+DEAD_SCREEN_BLOCK_SECONDS = 1.0
+# Shortest block (samples); low-rate channels (LH/VH) use longer blocks, since a
+# one-sample block is trivially flat
+DEAD_MIN_BLOCK_SAMPLES = 8
+# Share of blocks that must be flat (or collapsed) to call the channel dead
+DEAD_CONSTANT_FRACTION = 0.99
+# Variance collapse: blocks whose peak-to-peak stays within this many counts
+DEAD_MAX_RANGE_COUNTS = 2
+# ... and whose coarse PSD (counts, 2-100 s) is this flat (|slope| in dB/decade)
+DEAD_MAX_PSD_SLOPE = 3.0
+# ... and this white (spectral flatness, 1 = white; any microseism peak drops it far below)
+DEAD_MIN_PSD_FLATNESS = 0.5
+# Period band (s) of the coarse PSD slope
+DEAD_SLOPE_PERIODS = (2.0, 100.0)
+
+
+@dataclass
+class DeadChannelScreen:
+    """
+    Outcome of the cheap dead-channel screen of one channel-day.
+
+    `reason` is 'flatline', 'constant' or 'variance collapse' for a dead
+    channel and '' otherwise; the fractions are shares of envelope blocks.
+    """
+    dead: bool = False
+    reason: str = ''
+    constant_fraction: float = 0.0
+    collapsed_fraction: float = 0.0
+    psd_slope: float = np.nan
+    psd_flatness: float = np.nan
+
+
+def _envelope(data: np.ndarray, block: int):
+    """(Internal) Per-block min, max and mean of the unmasked full blocks of `data`."""
+    n_blocks = len(data) // block
+    if n_blocks == 0:
+        return np.empty(0), np.empty(0), np.empty(0)
+    blocks = data[:n_blocks * block].reshape(n_blocks, block)
+    if np.ma.is_masked(blocks):
+        full = ~np.ma.getmaskarray(blocks).any(axis=1)
+        blocks = np.ma.getdata(blocks)[full]
+    else:
+        blocks = np.ma.getdata(blocks)
+    return blocks.min(axis=1), blocks.max(axis=1), blocks.mean(axis=1, dtype=np.float64)
+
+
+def _coarse_psd_shape(means: np.ndarray, block_seconds: float) -> Tuple[float, float]:
+    """
+    (Internal) Slope (dB per decade of period) and spectral flatness of a
+    one-shot Welch PSD of the block means over DEAD_SLOPE_PERIODS. Live
+    sensors show the microseism peak and the long-period rise; electronic
+    or quantization noise of a dead channel is white (slope ~0, flatness
+    ~1). (NaN, NaN) if it cannot be estimated.
+    """
+    fs = 1.0 / block_seconds
+    nperseg = min(len(means), 1024)
+    if nperseg < 256:
+        return np.nan, np.nan
+    freq, pxx = welch(means, fs=fs, nperseg=nperseg, detrend='linear')
+    with np.errstate(divide='ignore'):
+        period = 1.0 / freq
+    band = (period >= DEAD_SLOPE_PERIODS[0]) & (period <= DEAD_SLOPE_PERIODS[1]) & (pxx > 0)
+    if band.sum() < 3:
+        return np.nan, np.nan
+    slope, _ = np.polyfit(np.log10(period[band]), 10 * np.log10(pxx[band]), 1)
+    flatness = np.exp(np.mean(np.log(pxx[band]))) / np.mean(pxx[band])
+    return float(slope), float(flatness)
+
+
+def screen_dead_channel(sig: Stream, block_seconds: float = DEAD_SCREEN_BLOCK_SECONDS,
+                        constant_fraction: float = DEAD_CONSTANT_FRACTION,
+                        max_range_counts: float = DEAD_MAX_RANGE_COUNTS,
+                        max_psd_slope: float = DEAD_MAX_PSD_SLOPE,
+                        min_psd_flatness: float = DEAD_MIN_PSD_FLATNESS) -> DeadChannelScreen:
+    """
+    Cheap screen for obviously dead or disconnected channels, run before
+    the PPSD.
+
+    The data are decimated to a min/max/mean envelope of `block_seconds`
+    blocks, at least DEAD_MIN_BLOCK_SAMPLES long (one pass over the
+    samples); traces shorter than one block are not screened. The channel
+    is dead if:
+    - flatline: every sample has the same value;
+    - constant: at least `constant_fraction` of the blocks are flat
+      (max == min within the block; the level may differ between blocks,
+      e.g. a digitizer stuck on successive values);
+    - variance collapse: at least `constant_fraction` of the blocks stay
+      within `max_range_counts` peak-to-peak AND a coarse PSD of the block
+      means is white (|slope| <= `max_psd_slope` dB/decade and spectral
+      flatness >= `min_psd_flatness`), i.e. no seismic signal is left in
+      the last counts.
+    """
+    lows, highs, means = [], [], []
+    longest: Optional[Trace] = None
+    means_block_seconds = block_seconds
+    for tr in sig:
+        if tr.stats.npts == 0 or tr.stats.sampling_rate <= 0:
+            continue
+        block = max(DEAD_MIN_BLOCK_SAMPLES, int(round(block_seconds * tr.stats.sampling_rate)))
+        low, high, mean = _envelope(tr.data, block)
+        lows.append(low)
+        highs.append(high)
+        if longest is None or tr.stats.npts > longest.stats.npts:
+            longest, means = tr, mean
+            means_block_seconds = block / tr.stats.sampling_rate
+
+    if not lows or sum(len(low) for low in lows) == 0:
+        return DeadChannelScreen()
+    low, high = np.concatenate(lows), np.concatenate(highs)
+    spread = high - low
+
+    result = DeadChannelScreen(
+        constant_fraction=float(np.mean(spread == 0)),
+        collapsed_fraction=float(np.mean(spread <= max_range_counts)),
+    )
+    if low.min() == high.max():
+        result.dead, result.reason = True, 'flatline'
+    elif result.constant_fraction >= constant_fraction:
+        result.dead, result.reason = True, 'constant'
+    elif result.collapsed_fraction >= constant_fraction:
+        result.psd_slope, result.psd_flatness = _coarse_psd_shape(means, means_block_seconds)
+        if abs(result.psd_slope) <= max_psd_slope and result.psd_flatness >= min_psd_flatness:
+            result.dead, result.reason = True, 'variance collapse'
+    return result
+
+
+def dead_channel_metrics(sig: Stream, reason: str = 'flatline') -> Optional[dict]:
+    """
+    PPSD metrics written for a screened dead channel, or None if the full
+    PPSD must still run.
+
+    Only a flatline has fixed PPSD values (whole PSD below the -200 dB
+    histogram floor: 0 % above NHNM, 100 % below NLNM, DCL 0, DCG dead, 0 %
+    inside the model bands). 'constant' and 'variance collapse' channels
+    keep some PSD above the floor (e.g. +-1 count white noise: pctL 94.94,
+    DCL 3.87, short period 15.38), so None is returned for them.
+    `psd_segments` is the number of hourly segments the PPSD would have used.
+    """
+    if reason != 'flatline':
+        return None
+    trace = max(sig, key=lambda tr: tr.stats.npts)
+    segments = sig.select(id=trace.id, sampling_rate=trace.stats.sampling_rate)
+    fs = trace.stats.sampling_rate
+    start = min(tr.stats.starttime for tr in segments)
+    end = max(tr.stats.endtime for tr in segments)
+    npts = int(round((end - start) * fs)) + 1
+    n_segments = len(_segment_offsets(npts, psd_setup(fs))) if fs > 0 else 0
+    return {
+        'pctH': '0.0',
+        'pctL': '100.0',
+        'dcl': '0.0',
+        'dcg': '1',
+        'long_period': '0.0',
+        'microseism': '0.0',
+        'short_period': '0.0',
+        'psd_segments': str(n_segments),
+    }
@@ -1,14 +1,37 @@
-import math
 import numpy as np
+from functools import lru_cache
 import logging
 
 logger = logging.getLogger(__name__)
 
+# --- NHNM Constants (Peterson, 1993) ---
+# Segment i covers Ph[i] < period <= Ph[i + 1], with power Ah[i] + Bh[i] * log10(period)
+Ph = np.array([0.10, 0.22, 0.32, 0.80, 3.80, 4.60, 6.30, 7.90, 15.40, 20.00, 354.80, 100000.00])
+Ah = np.array([-108.73, -150.34, -122.31, -116.85, -108.48, -74.66, 0.66, -93.37, 73.54, -151.52, -206.66])
+Bh = np.array([-17.23, -80.50, -23.87, 32.51, 18.08, -32.95, -127.18, -22.42, -162.98, 10.01, 31.63])
+
+# --- NLNM Constants (Peterson, 1993) ---
+Pl = np.array([0.10, 0.17, 0.40, 0.80, 1.24, 2.40, 4.30, 5.00, 6.00, 10.00, 12.00, 15.60, 21.90,
+               31.60, 45.00, 70.00, 101.00, 154.00, 328.00, 600.00, 10000.00, 100000.00])
+Al = np.array([-162.36, -166.7, -170.00, -166.40, -168.60, -159.98, -141.10, -71.36, -97.26,
+               -132.18, -205.27, -37.65, -114.37, -160.58, -187.50, -216.47, -185.00, -168.34,
+               -217.43, -258.28, -346.88])
+Bl = np.array([5.64, 0.00, -8.30, 28.90, 52.48, 29.81, 0.00, -99.77, -66.49, -31.57, 36.16,
+               -104.33, -47.10, -16.28, 0.00, 15.70, 0.00, -7.61, 11.90, 26.60, 48.75])
+
+# Distinct period grids kept per worker; a grid depends only on the sampling
+# rate and the PPSD parameters, so a handful covers a whole network
+MODEL_CACHE_SIZE = 32
+
+
 def get_models(periods, powers):
     """
     Calculates the NHNM (New High Noise Model) and NLNM (New Low Noise Model)
     values for a given set of periods.
-    
+
+    Results are cached per period grid (see `_models_for_grid`), so
+    channels sharing a grid evaluate the models once per worker.
+
     Args:
         periods (np.array): Array of period values.
         powers (list): List of power values (e.g., -190 to -90 dB).
@@ -19,47 +42,32 @@ def get_models(periods, powers):
             - NLNM (New Low Noise Model values)
             - PERIODS_IDX (Indices of the original periods that are valid)
     """
-    NHNM = []
-    NLNM = []
-    PERIODS_IDX = [] # The indices corresponding to periods within the defined models
+    periods = np.ascontiguousarray(periods, dtype=np.float64).ravel()
+    NHNM, NLNM, PERIODS_IDX = _models_for_grid(periods.tobytes())
+    return NHNM, NLNM, list(PERIODS_IDX)
+
 
-    # --- NHNM Constants (Peterson, 1993) ---
-    Ph = [0.10, 0.22, 0.32, 0.80, 3.80, 4.60, 6.30, 7.90, 15.40, 20.00, 354.80, 100000.00]
-    Ah = [-108.73, -150.34, -122.31, -116.85, -108.48, -74.66, 0.66, -93.37, 73.54, -151.52, -206.66]
-    Bh = [-17.23, -80.50, -23.87, 32.51, 18.08, -32.95, -127.18, -22.42, -162.98, 10.01, 31.63]
-    
-    # --- NLNM Constants (Peterson, 1993) ---
-    Pl = [0.10, 0.17, 0.40, 0.80, 1.24, 2.40, 4.30, 5.00, 6.00, 10.00, 12.00, 15.60, 21.90, 
-            31.60, 45.00, 70.00, 101.00, 154.00, 328.00, 600.00, 10000.00, 100000.00]
-    Al = [-162.36, -166.7, -170.00, -166.40, -168.60, -159.98, -141.10, -71.36, -97.26, 
-            -132.18, -205.27, -37.65, -114.37, -160.58, -187.50, -216.47, -185.00, -168.34, 
-            -217.43, -258.28, -346.88]
-    Bl = [5.64, 0.00, -8.30, 28.90, 52.48, 29.81, 0.00, -99.77, -66.49, -31.57, 36.16, 
-            -104.33, -47.10, -16.28, 0.00, 15.70, 0.00, -7.61, 11.90, 26.60, 48.75]
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
+def _models_for_grid(period_bytes: bytes):
+    """
+    (Internal) Vectorized model evaluation for one period grid (float64
+    bytes, the cache key). The returned arrays are read-only.
 
-    pInd = 0
-    for period in periods:
-        try:
-            # Find the segment this period falls into
-            highInd = [i for i, x in enumerate([period > Ph][0]) if x][-1]
-            lowInd = [i for i, x in enumerate([period > Pl][0]) if x][-1]
+    A period belongs to the last segment whose lower breakpoint it strictly
+    exceeds; periods <= 0.1 s or > 100000 s (or NaN) lie outside both models.
+    """
+    periods = np.frombuffer(period_bytes, dtype=np.float64)
 
-            if highInd >= len(Ah) or lowInd >= len(Al):
-                pInd += 1
-                continue
-            
-        except IndexError:
-            # Period is outside the defined model range (e.g., < 0.1s)
-            pInd += 1
-            continue
+    high_ind = np.searchsorted(Ph, periods, side='left') - 1
+    low_ind = np.searchsorted(Pl, periods, side='left') - 1
+    valid = (high_ind >= 0) & (high_ind < len(Ah)) & (low_ind >= 0) & (low_ind < len(Al))
 
-        # Calculate the noise model power (in dB) for this period
-        nhnm = Ah[highInd] + Bh[highInd] * math.log10(period)
-        nlnm = Al[lowInd] + Bl[lowInd] * math.log10(period)
-        
-        NHNM.append(nhnm)
-        NLNM.append(nlnm)
-        PERIODS_IDX.append(pInd)
-        pInd += 1
+    PERIODS_IDX = np.flatnonzero(valid)
+    log_period = np.log10(periods[PERIODS_IDX])
+    NHNM = Ah[high_ind[PERIODS_IDX]] + Bh[high_ind[PERIODS_IDX]] * log_period
+    NLNM = Al[low_ind[PERIODS_IDX]] + Bl[low_ind[PERIODS_IDX]] * log_period
 
-    return np.array(NHNM), np.array(NLNM), PERIODS_IDX
\ No newline at end of file
+    for array in (NHNM, NLNM, PERIODS_IDX):
+        array.setflags(write=False)
+    logger.debug(f"Evaluated noise models for a {len(periods)}-period grid ({len(PERIODS_IDX)} valid)")
+    return NHNM, NLNM, tuple(PERIODS_IDX.tolist())
@@ -0,0 +1,112 @@
+import os
+import glob
+import numpy as np
+from typing import List, Optional, Tuple
+import logging
+from obspy import UTCDateTime
+from obspy.imaging.cm import pqlx
+
+from .psd_engine import PSDHistogram, plot_histogram, ppsd_histogram
+
+logger = logging.getLogger(__name__)
+
+# Period range of the PDF plots (s)
+PDF_PERIOD_LIM = (0.03, 100)
+
+# Suffix of a stored plot histogram, next to where the PNG goes
+PLOT_DATA_SUFFIX = '.npz'
+
+
+def plot_data_path(plot_filename: str) -> str:
+    """Stored histogram of a deferred plot: the PNG path with PLOT_DATA_SUFFIX."""
+    return os.path.splitext(plot_filename)[0] + PLOT_DATA_SUFFIX
+
+
+def _plot_title(ppsds) -> str:
+    """(Internal) '<id>   <first day> -- <last day>  (<n> segments)'."""
+    if isinstance(ppsds, PSDHistogram):
+        times = [UTCDateTime(t) for t in ppsds.times]
+        length = ppsds.setup.ppsd_length
+    else:
+        times = list(ppsds.times_processed)
+        length = ppsds.ppsd_length
+    if not times:
+        return ppsds.id
+    return f"{ppsds.id}   {times[0].date} -- {(times[-1] + length).date}  ({len(times)} segments)"
+
+
+def save_plot_histogram(path: str, ppsds):
+    """
+    Persists what the PDF plot of a native PSDHistogram or an ObsPy PPSD
+    needs (a few kB: counts, bin edges, title), to be rendered later by
+    render_plot_histogram().
+    """
+    hist = ppsd_histogram(ppsds)
+    np.savez_compressed(
+        path,
+        hist=hist.astype(np.uint32),
+        psd_segments=int(ppsds.psd_segments),
+        period_xedges=ppsds.period_xedges,
+        db_bin_edges=ppsds.db_bin_edges,
+        title=_plot_title(ppsds),
+    )
+
+
+def render_plot_histogram(path: str, plot_filename: Optional[str] = None) -> str:
+    """
+    Renders a stored plot histogram to PNG (default: same path, .png).
+    Same layout as the inline native plot, without the coverage bar.
+    """
+    plot_filename = plot_filename or os.path.splitext(path)[0] + '.png'
+    with np.load(path) as npz:
+        plot_histogram(plot_filename, npz['hist'], int(npz['psd_segments']), npz['period_xedges'],
+                       npz['db_bin_edges'], title=str(npz['title']), cmap=pqlx, period_lim=PDF_PERIOD_LIM)
+    return plot_filename
+
+
+def _render_one(path: str) -> Tuple[str, Optional[str]]:
+    """(Internal) Pool task: (path, error message or None)."""
+    try:
+        render_plot_histogram(path)
+        return path, None
+    except Exception as e:
+        return path, str(e)
+
+
+def pending_plots(directory: str, stations: Optional[List[str]] = None, force: bool = False) -> List[str]:
+    """
+    Stored plot histograms in `directory` whose PNG is missing or older
+    (all of them with `force`), optionally only for these station codes
+    (files are named <STA>_<component>_PDF.npz).
+    """
+    paths = []
+    for path in sorted(glob.glob(os.path.join(directory, f"*_PDF{PLOT_DATA_SUFFIX}"))):
+        if stations and os.path.basename(path).split('_')[0] not in stations:
+            continue
+        png = os.path.splitext(path)[0] + '.png'
+        if force or not os.path.exists(png) or os.path.getmtime(png) < os.path.getmtime(path):
+            paths.append(path)
+    return paths
+
+
+def render_pending_plots(directory: str, stations: Optional[List[str]] = None, force: bool = False,
+                         processes: int = 1) -> Tuple[int, int]:
+    """
+    Renders the pending plots of one output directory, on a process pool
+    when `processes` > 1. Returns (rendered, failed).
+    """
+    paths = pending_plots(directory, stations, force)
+    if not paths:
+        return 0, 0
+    processes = max(1, min(int(processes or 1), len(paths)))
+    if processes > 1:
+        import multiprocessing
+        with multiprocessing.Pool(processes=processes) as pool:
+            results = pool.map(_render_one, paths)
+    else:
+        results = [_render_one(path) for path in paths]
+
+    failed = [(path, error) for path, error in results if error]
+    for path, error in failed:
+        logger.error(f"Could not render {path}: {error}")
+    return len(results) - len(failed), len(failed)
@@ -0,0 +1,153 @@
+import os
+import numpy as np
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+import logging
+
+from .psd_engine import histogram_percentile, histogram_mean, histogram_mode, plot_histogram, ppsd_histogram
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PPSDAccumulator:
+    """
+    Long-term PPSD histogram of one channel over one month ('YYYY-MM') or
+    year ('YYYY').
+
+    Holds only the (period, dB) counts, the number of PSD segments and the
+    days already added, so a new day is one addition of its histogram, in
+    the spirit of PPSD.add_npz() but without keeping or reloading the
+    per-segment PSDs. Statistics follow the PPSD conventions.
+    """
+    seed_id: str
+    period: str
+    period_bin_centers: np.ndarray
+    period_xedges: np.ndarray
+    db_bin_edges: np.ndarray
+    hist: np.ndarray
+    psd_segments: int = 0
+    days: List[str] = field(default_factory=list)
+
+    @classmethod
+    def empty(cls, seed_id: str, period: str, period_bin_centers, period_xedges, db_bin_edges) -> 'PPSDAccumulator':
+        hist = np.zeros((len(period_bin_centers), len(db_bin_edges) - 1), dtype=np.uint64)
+        return cls(seed_id, period, np.asarray(period_bin_centers), np.asarray(period_xedges),
+                   np.asarray(db_bin_edges), hist)
+
+    def compatible(self, period_bin_centers, db_bin_edges) -> bool:
+        """True if a histogram on this period/dB grid can be added."""
+        return (len(period_bin_centers) == len(self.period_bin_centers)
+                and np.allclose(period_bin_centers, self.period_bin_centers)
+                and np.array_equal(db_bin_edges, self.db_bin_edges))
+
+    def add(self, day: str, hist: np.ndarray, psd_segments: int) -> bool:
+        """
+        Adds one day's histogram. A day already in the accumulator is
+        skipped (returns False), so rerunning a day does not count it twice.
+        """
+        if day in self.days:
+            return False
+        self.hist += np.asarray(hist, dtype=np.uint64)
+        self.psd_segments += int(psd_segments)
+        self.days.append(day)
+        self.days.sort()
+        return True
+
+    def get_percentile(self, percentile: float = 50) -> Tuple[np.ndarray, np.ndarray]:
+        return self.period_bin_centers, histogram_percentile(self.hist, self.db_bin_edges, percentile)
+
+    def get_mean(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.period_bin_centers, histogram_mean(self.hist, self.db_bin_edges, self.psd_segments)
+
+    def get_mode(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.period_bin_centers, histogram_mode(self.hist, self.db_bin_edges)
+
+    def plot(self, filename: str, cmap=None, period_lim=(0.01, 179), max_percentage=30):
+        """Saves the probability density plot of the whole month or year."""
+        title = f"{self.seed_id}   {self.period}  ({len(self.days)} days, {self.psd_segments} segments)"
+        plot_histogram(filename, self.hist, self.psd_segments, self.period_xedges, self.db_bin_edges,
+                       title=title, cmap=cmap, period_lim=period_lim, max_percentage=max_percentage)
+
+
+def archive_path(archive_root: str, period: str, seed_id: str) -> str:
+    """Path of an accumulator: <archive_root>/<YYYY or YYYY-MM>/<NET.STA.LOC.CHA>.npz"""
+    return os.path.join(archive_root, period, f"{seed_id}.npz")
+
+
+def save_accumulator(path: str, acc: PPSDAccumulator):
+    """Writes an accumulator (write-then-rename, never a partial file)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(
+        tmp_path,
+        seed_id=acc.seed_id,
+        period=acc.period,
+        period_bin_centers=acc.period_bin_centers,
+        period_xedges=acc.period_xedges,
+        db_bin_edges=acc.db_bin_edges,
+        hist=acc.hist,
+        psd_segments=acc.psd_segments,
+        days=np.array(acc.days, dtype=str),
+    )
+    os.replace(tmp_path, path)
+
+
+def load_accumulator(path: str) -> PPSDAccumulator:
+    """Loads an accumulator written by save_accumulator()."""
+    with np.load(path) as npz:
+        return PPSDAccumulator(
+            seed_id=str(npz['seed_id']),
+            period=str(npz['period']),
+            period_bin_centers=npz['period_bin_centers'],
+            period_xedges=npz['period_xedges'],
+            db_bin_edges=npz['db_bin_edges'],
+            hist=npz['hist'].astype(np.uint64),
+            psd_segments=int(npz['psd_segments']),
+            days=[str(d) for d in npz['days']],
+        )
+
+
+def accumulate_daily_ppsd(archive_root: str, ppsds, day: str) -> List[str]:
+    """
+    Adds one channel-day's PPSD histogram (native PSDHistogram or ObsPy
+    PPSD) to the channel's monthly and yearly accumulators under
+    `archive_root`. Only those two files are read and rewritten.
+
+    Args:
+        archive_root: Root directory of the archive.
+        ppsds: The day's PPSD (needs id, period_bin_centers, period_xedges,
+            db_bin_edges and psd_segments).
+        day: The day as 'YYYY-MM-DD'.
+
+    Returns:
+        Paths of the accumulators the day was added to.
+    """
+    hist = ppsd_histogram(ppsds)
+    psd_segments = int(ppsds.psd_segments)
+    updated = []
+    if hist is None or psd_segments == 0:
+        return updated
+
+    for period in (day[:7], day[:4]):
+        path = archive_path(archive_root, period, ppsds.id)
+        acc: Optional[PPSDAccumulator] = None
+        if os.path.exists(path):
+            try:
+                acc = load_accumulator(path)
+            except Exception as e:
+                logger.warning(f"Could not load PPSD accumulator {path}, starting a new one: {e}")
+        if acc is None:
+            acc = PPSDAccumulator.empty(ppsds.id, period, ppsds.period_bin_centers,
+                                        ppsds.period_xedges, ppsds.db_bin_edges)
+        elif not acc.compatible(ppsds.period_bin_centers, ppsds.db_bin_edges):
+            logger.warning(f"{ppsds.id}: {day} has another period/dB grid than {path} "
+                           f"(sampling rate changed?), not added")
+            continue
+
+        if not acc.add(day, hist, psd_segments):
+            logger.debug(f"{ppsds.id}: {day} already in {path}, skipped")
+            continue
+        save_accumulator(path, acc)
+        updated.append(path)
+    return updated
@@ -2,33 +2,111 @@ import numpy as np
 from numpy import polyfit
 from obspy import Stream, Trace, Inventory
 from obspy.signal import PPSD
+from obspy.signal.spectral_estimation import UTCDATETIME_OPEN_START, UTCDATETIME_OPEN_END
 from typing import Optional, cast
 import logging
 import warnings
 from obspy.imaging.cm import pqlx
 from . import models
+from .psd_engine import calculate_psd_histogram, decimate_for_psd, ppsd_summary
+from .response_cache import evaluate_response
+from .ppsd_archive import accumulate_daily_ppsd
+from .pdf_plots import PDF_PERIOD_LIM, plot_data_path, save_plot_histogram
 
 logger = logging.getLogger(__name__)
 
+# Period bands (s, exclusive) of the percentage-inside-model metrics
+MODEL_BANDS = {
+    'long_period': (20, 900),
+    'microseism': (2, 25),
+    'short_period': (0.1, 1),
+}
+
+# --- Private Helper: Merge Without Copy ---
+def _merge_for_ppsd(sig: Stream) -> Stream:
+    """
+    (Internal) Returns a merged stream without touching `sig`.
+
+    Stream.merge() creates new traces where several segments of one id are
+    joined, but it realigns sub-sample misaligned segments by setting their
+    stats.starttime. The segments are therefore merged as new Trace objects
+    sharing the caller's sample arrays with a copy of their stats: `sig`
+    keeps its traces and headers, and a channel that is already one segment
+    is passed on without copying its samples.
+    """
+    data = Stream(traces=[Trace(data=tr.data, header=tr.stats.copy()) for tr in sig])
+    data.merge()
+    return data
+
+# --- Private Helper: PPSD with Cached Responses ---
+def _cached_responses(inventory: Inventory, seed_id: str, sampling_rate: float, nfft: int) -> list:
+    """
+    (Internal) Every epoch of `seed_id` in the layout of `PPSD.responses`,
+    with the evaluated responses taken from the response cache (see
+    `response_cache.evaluate_response`). Epochs that fail are skipped with
+    a warning, as ObsPy does.
+    """
+    result = []
+    for network in inventory:
+        for station in network:
+            for channel in station:
+                if f"{network.code}.{station.code}.{channel.location_code}.{channel.code}" != seed_id:
+                    continue
+                try:
+                    response = evaluate_response(inventory, seed_id, channel, sampling_rate, nfft)
+                except Exception as e:
+                    warnings.warn(f"Could not get response for {seed_id} - {channel.start_date}, error {e}")
+                    continue
+                result.append({
+                    "seed_id": seed_id,
+                    "start_time": channel.start_date or UTCDATETIME_OPEN_START,
+                    "end_time": channel.end_date or UTCDATETIME_OPEN_END,
+                    "response": response,
+                })
+    return result
+
+def _ppsd_with_cached_responses(stats, inventory: Inventory) -> PPSD:
+    """
+    (Internal) PPSD of `stats` whose per-epoch responses come from the
+    response cache instead of being evaluated again for every channel-day.
+
+    The PPSD is built without metadata, so its constructor evaluates
+    nothing, and the cached epochs are attached through its public
+    `responses` list (ObsPy >= 1.5). ObsPy versions without that list
+    evaluate the inventory response per segment themselves.
+    """
+    ppsd = PPSD(stats, metadata=None)
+    ppsd.metadata = inventory
+    if hasattr(ppsd, 'responses'):
+        ppsd.responses = _cached_responses(inventory, ppsd.id, ppsd.sampling_rate, ppsd.nfft)
+    else:
+        logger.debug(f"{ppsd.id}: PPSD has no 'responses' list, response cache not used")
+    return ppsd
+
 # --- Private Helper: PPSD Object Creation ---
 def _create_ppsd_object(sig: Stream, inventory: Optional[Inventory] = None, npz_output_path: str = ''):
     """
     (Internal) Creates the PPSD object from a stream.
     This was formerly 'prosess_psd'.
+
+    `sig` is read-only; only the merge of gappy channels allocates new data.
+    One PPSD is built per channel, from the longest segment's id and
+    sampling rate, so the instrument response is evaluated once; every
+    compatible segment is then added to it. The number of trace and PSD
+    segments used is logged and kept in `trace_segments` / `psd_segments`.
     """
     NPZFNAME = '_{}.npz'
-    data = sig.copy()
     
     if inventory is None:
         logger.warning('PPSD object creation skipped, no inventory provided.')
         return None
-    if data.count() == 0:
+    if sig.count() == 0:
         logger.warning('No data in stream for PPSD.')
         return None
         
-    data.merge()
+    data = _merge_for_ppsd(sig)
     
-    _trace = cast(Trace, data[0])
+    _trace = cast(Trace, max(data, key=lambda tr: tr.stats.npts))
     sampling_rate = _trace.stats.sampling_rate
 
     if sampling_rate == 0:
@@ -41,27 +119,38 @@ def _create_ppsd_object(sig: Stream, inventory: Optional[Inventory] = None, npz_
         return None
         
     ppsds_object = None
-    _id = ''
+    _id = _trace.id
     try:
-        for tr in data:
-            _id = tr.id
-            with warnings.catch_warnings(record=True) as caught_warnings:
-                warnings.simplefilter("always")
-                ppsds_object = PPSD(tr.stats, inventory)
-                ppsds_object.add(tr)
-                
-                # Collect unique warnings
-                warning_counts = {}
-                for w in caught_warnings:
-                    msg = str(w.message).replace('\n', ' ')
-                    warning_counts[msg] = warning_counts.get(msg, 0) + 1
-                
-                # Log each unique warning once
-                for msg, count in warning_counts.items():
-                    if count > 1:
-                        logger.warning(f"{_id}: {msg} (occurred {count} times)")
-                    else:
-                        logger.warning(f"{_id}: {msg}")
+        segments = data.select(id=_id, sampling_rate=sampling_rate)
+        if len(segments) < len(data):
+            logger.warning(
+                f"{_id}: {len(data) - len(segments)} segment(s) with another id or sampling rate "
+                f"not added to the PPSD"
+            )
+        with warnings.catch_warnings(record=True) as caught_warnings:
+            warnings.simplefilter("always")
+            ppsds_object = _ppsd_with_cached_responses(_trace.stats, inventory)
+            ppsds_object.add(segments)
+            
+            # Collect unique warnings
+            warning_counts = {}
+            for w in caught_warnings:
+                msg = str(w.message).replace('\n', ' ')
+                warning_counts[msg] = warning_counts.get(msg, 0) + 1
+            
+            # Log each unique warning once
+            for msg, count in warning_counts.items():
+                if count > 1:
+                    logger.warning(f"{_id}: {msg} (occurred {count} times)")
+                else:
+                    logger.warning(f"{_id}: {msg}")
+
+        ppsds_object.trace_segments = len(segments)
+        ppsds_object.psd_segments = len(ppsds_object._times_processed)
+        logger.debug(
+            f"{_id}: PPSD from {ppsds_object.trace_segments} trace segment(s), "
+            f"{ppsds_object.psd_segments} PSD segment(s)"
+        )
         if npz_output_path and ppsds_object:
             fname_out = npz_output_path + NPZFNAME.format(_id)
             logger.debug(f"Saving PPSD to {fname_out}")
@@ -84,23 +173,42 @@ def _dead_channel_gsn(psd, model, t, t0=4.0, t1=8.0):
     return 1 if gsn_deviation > 5.0 else 0
     # return gsn_deviation
 
+def _percent(count, total_len):
+    """(Internal) count / total as a percentage rounded to 2 decimals, 0.0 if empty."""
+    if total_len == 0: return 0.0
+    return round(float(int(count) * 100 / total_len), 2)
+
 def _percentage_outside_model(psd, AHNM, ALNM):
-    percH, percL, total_len = 0, 0, len(psd)
-    if total_len == 0: return 0.0, 0.0
-    for i in range(total_len):
-        if psd[i] > AHNM[i]: percH += 1
-        if psd[i] < ALNM[i]: percL += 1
-    return round(float(percH * 100 / total_len), 2), round(float(percL * 100 / total_len), 2)
+    psd = np.asarray(psd)
+    return (_percent(np.count_nonzero(psd > AHNM), len(psd)),
+            _percent(np.count_nonzero(psd < ALNM), len(psd)))
 
 def _percentage_inside_model_by_period(psd, LNM, HNM, t, t0, t1):
-    percH, mask = 0, (t > t0) & (t < t1)
-    psd_slice, LNM_slice, HNM_slice = psd[mask], LNM[mask], HNM[mask]
-    total_len = len(psd_slice)
-    if total_len == 0: return 0.0
-    for i in range(total_len):
-        if (psd_slice[i] <= HNM_slice[i]) and (psd_slice[i] >= LNM_slice[i]):
-            percH += 1
-    return round(float(percH * 100 / total_len), 2)
+    mask = (t > t0) & (t < t1)
+    inside = (psd <= HNM) & (psd >= LNM)
+    return _percent(np.count_nonzero(inside & mask), np.count_nonzero(mask))
+
+def _model_percentages(psd, HNM, LNM, t, bands=MODEL_BANDS):
+    """
+    (Internal) pctH, pctL and the percentage inside the models for every
+    period band, from one set of element-wise comparisons.
+
+    Same values as `_percentage_outside_model` plus one
+    `_percentage_inside_model_by_period` call per band.
+    """
+    psd = np.asarray(psd)
+    above = psd > HNM
+    below = psd < LNM
+    inside = (psd <= HNM) & (psd >= LNM)
+
+    result = {
+        'pctH': _percent(np.count_nonzero(above), len(psd)),
+        'pctL': _percent(np.count_nonzero(below), len(psd)),
+    }
+    for name, (t0, t1) in bands.items():
+        mask = (t > t0) & (t < t1)
+        result[name] = _percent(np.count_nonzero(inside & mask), np.count_nonzero(mask))
+    return result
 
 def _dead_channel_lin(psd, t, fs):
     """
@@ -136,12 +244,31 @@ def _dead_channel_lin(psd, t, fs):
     return value
 
 # --- NEW Main Public Function ---
-def process_ppsd_metrics(sig: Stream, inventory, plot_filename: str, npz_output_path: str):
+def process_ppsd_metrics(sig: Stream, inventory, plot_filename: str, npz_output_path: str,
+                         engine: str = 'obspy', threads: int = 1, archive_root: str = '',
+                         archive_day: str = '', defer_plot: bool = False, min_period: float = 0.0):
     """
     Calculates all PPSD metrics from a Stream and Inventory.
     
     This function creates the PPSD, plots it, and calculates all
     dead-channel and noise-model metrics.
+
+    `engine` = 'native' computes the PSD histogram with `psd_engine`
+    (same values, batched FFTs); the ObsPy PPSD is still used when an NPZ
+    output path is given, since the NPZ files are ObsPy PPSD archives.
+    `threads` > 1 splits the native computation into blocks of hourly
+    segments run on a thread pool. With `archive_root` the day's histogram
+    is added to the channel's monthly and yearly accumulators
+    (see `ppsd_archive.accumulate_daily_ppsd`) for `archive_day`.
+    `defer_plot` stores the plot's histogram next to `plot_filename`
+    instead of drawing it (see `pdf_plots.render_pending_plots`).
+    `min_period` > 0 first decimates high-rate channels (anti-alias FIR)
+    to the lowest rate that still covers periods from `min_period` s up
+    (see `psd_engine.decimate_for_psd`) for the ObsPy PPSD; not applied
+    with an NPZ output path or the native engine. Percentile and band
+    metrics from `min_period` up are unchanged. DCL is fitted from 4/fs of
+    the channel's own rate, above the decimated passband, so it is left out
+    of the decimated path: its mean PSD comes from a full-rate native pass.
     
     Returns:
         A dictionary of final metrics, or None if processing fails.
@@ -150,32 +277,49 @@ def process_ppsd_metrics(sig: Stream, inventory, plot_filename: str, npz_output_
     try:
         # 0. Validate Inputs
         _trace = cast(Trace, sig[0])
+        fs = _trace.stats.sampling_rate
 
-        # 1. Create the PPSD object
-        ppsds = _create_ppsd_object(sig, inventory, npz_output_path)
+        # 0b. Anti-alias pre-decimation of high-rate channels (ObsPy PPSD)
+        full_rate = None
+        if min_period and not npz_output_path and engine != 'native':
+            decimated = decimate_for_psd(sig, min_period)
+            if decimated[0].stats.sampling_rate != fs:
+                logger.debug(f"{_trace.id} decimated to {decimated[0].stats.sampling_rate:g} Hz for the PPSD")
+                full_rate, sig = sig, decimated
+                _trace = cast(Trace, sig[0])
+
+        # 1. Create the PPSD object (or the native PSD histogram)
+        if engine == 'native' and not npz_output_path:
+            ppsds = calculate_psd_histogram(sig, inventory, threads=threads)
+        else:
+            ppsds = _create_ppsd_object(sig, inventory, npz_output_path)
         
         # 2. Safety Check (NEW)
-        if not ppsds or not hasattr(ppsds, '_times_processed') or not ppsds._times_processed:
+        if not ppsds or not getattr(ppsds, 'psd_segments', 0):
             raise ValueError(f"PPSD object for {_trace.id} is invalid or has no data.")
         
         # 2. Plot the PPSD
-        if plot_filename:
-            ppsds.plot(filename=plot_filename, cmap=pqlx, show=False, period_lim=(0.03, 100))
-        
-        fs = _trace.stats.sampling_rate
+        if plot_filename and defer_plot:
+            save_plot_histogram(plot_data_path(plot_filename), ppsds)
+        elif plot_filename:
+            ppsds.plot(filename=plot_filename, cmap=pqlx, show=False, period_lim=PDF_PERIOD_LIM)
+
+        # 2b. Long-term archive (failures never cost the day's metrics)
+        if archive_root and archive_day:
+            try:
+                accumulate_daily_ppsd(archive_root, ppsds, archive_day)
+            except Exception as e:
+                logger.warning(f"{_trace.id} could not update the PPSD archive: {e}")
         
-        # 3. Get Percentile Data
-        period, psd1 = ppsds.get_percentile() # type: ignore
-        ind = period <= 100
-        period = period[ind]
-        psd1 = psd1[ind]
+        # 3. Get Percentile and Mean Data (one pass over the histogram, periods <= 100 s)
+        summary = ppsd_summary(ppsds, max_period=100)
         
         powers = sorted(range(-190, -90 + 1), reverse=True)
-        NHNM, NLNM, PInd = models.get_models(period, powers)
+        NHNM, NLNM, PInd = models.get_models(summary.periods, powers)
         
         # Filter psd/period by valid model indices
-        period = period[PInd]
-        psd1 = psd1[PInd]
+        period = summary.periods[PInd]
+        psd1 = summary.percentile[PInd]
         
         if len(period) == 0:
             logger.warning(f"{_trace.id} No valid period data after model filtering")
@@ -183,29 +327,23 @@ def process_ppsd_metrics(sig: Stream, inventory, plot_filename: str, npz_output_
         
         # 4. Calculate Percentile Metrics
         dcg = _dead_channel_gsn(psd1, NLNM, period)
-        pctH, pctL = _percentage_outside_model(psd1, NHNM, NLNM)
-        
-        long_period = _percentage_inside_model_by_period(psd1, NLNM, NHNM, period, 20, 900)
-        microseism = _percentage_inside_model_by_period(psd1, NLNM, NHNM, period, 2, 25)
-        short_period = _percentage_inside_model_by_period(psd1, NLNM, NHNM, period, 0.1, 1)
-        
-        # 5. Get Mean Data and Calculate DCL
-        period_mean, psd_mean = ppsds.get_mean() # type: ignore
-        ind_mean = period_mean <= 100
-        period_mean = period_mean[ind_mean]
-        psd_mean = psd_mean[ind_mean]
+        percentages = _model_percentages(psd1, NHNM, NLNM, period)
         
-        dcl = _dead_channel_lin(psd_mean, period_mean, fs)
+        # 5. Calculate DCL from the Mean Data (full rate: it starts at 4/fs)
+        if full_rate is not None:
+            summary = ppsd_summary(calculate_psd_histogram(full_rate, inventory, threads=threads), max_period=100)
+        dcl = _dead_channel_lin(summary.mean, summary.periods, fs)
 
         # 6. Assemble and return the metrics dictionary
         final_metrics = {
-            'pctH': str(pctH),
-            'pctL': str(pctL),
+            'pctH': str(percentages['pctH']),
+            'pctL': str(percentages['pctL']),
             'dcl': str(round(float(dcl), 2)),
             'dcg': str(round(dcg, 2)),
-            'long_period': str(long_period),
-            'microseism': str(microseism),
-            'short_period': str(short_period)
+            'long_period': str(percentages['long_period']),
+            'microseism': str(percentages['microseism']),
+            'short_period': str(percentages['short_period']),
+            'psd_segments': str(ppsds.psd_segments)
         }
         return final_metrics
         
@@ -0,0 +1,603 @@
+import math
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+from typing import List, Optional, Tuple, cast
+import logging
+from obspy import Stream, Trace, Inventory, UTCDateTime
+from obspy.signal.invsim import cosine_taper
+from obspy.signal.util import prev_pow_2
+from scipy.signal import firwin, kaiserord, upfirdn
+from .response_cache import evaluate_response
+
+logger = logging.getLogger(__name__)
+
+# PPSD parameters of the ObsPy defaults (McNamara & Buland, 2004)
+PPSD_LENGTH = 3600.0
+PPSD_OVERLAP = 0.5
+PERIOD_SMOOTHING_WIDTH_OCTAVES = 1.0
+PERIOD_STEP_OCTAVES = 0.125
+DB_BINS = (-200.0, -50.0, 1.0)
+
+# Working-set cap (MB) of one block of segments (windows + spectra)
+DEFAULT_PSD_BLOCK_MB = 256
+
+# Smallest positive float, floor of the power spectra before going to dB
+DTINY = np.finfo(0.0).tiny
+
+# Anti-alias pre-decimation (see `decimate_for_psd`): passband edge of the
+# FIR as a fraction of the new Nyquist, and its stopband attenuation (dB)
+DECIMATION_PASSBAND = 0.8
+DECIMATION_ATTENUATION_DB = 100.0
+
+
+@dataclass(frozen=True)
+class PSDSetup:
+    """
+    FFT layout and period/dB binning of one sampling rate, identical to
+    what `obspy.signal.PPSD.__init__` derives from the same parameters.
+    """
+    sampling_rate: float
+    ppsd_length: float
+    overlap: float
+    nfft: int
+    nlap: int
+    seg_len: int
+    window: np.ndarray
+    freq: np.ndarray               # rfft frequencies without the offset, reversed
+    psd_periods: np.ndarray        # 1 / freq, ascending
+    period_bin_left_edges: np.ndarray
+    period_bin_right_edges: np.ndarray
+    period_bin_centers: np.ndarray
+    period_xedges: np.ndarray
+    db_bin_edges: np.ndarray
+
+    @property
+    def step(self) -> float:
+        """Time between two segment starts (s)."""
+        return self.ppsd_length * (1 - self.overlap)
+
+
+@lru_cache(maxsize=16)
+def psd_setup(sampling_rate: float, ppsd_length: float = PPSD_LENGTH, overlap: float = PPSD_OVERLAP,
+              period_smoothing_width_octaves: float = PERIOD_SMOOTHING_WIDTH_OCTAVES,
+              period_step_octaves: float = PERIOD_STEP_OCTAVES,
+              db_bins: Tuple[float, float, float] = DB_BINS) -> PSDSetup:
+    """
+    Builds (and caches per worker) the PSD layout of one sampling rate.
+
+    Mirrors ObsPy: nfft is the power of 2 below a quarter segment, the
+    sub-windows overlap by 75 %, and every period bin averages one octave
+    of the spectrum in steps of 1/8 octave.
+    """
+    nfft = prev_pow_2(ppsd_length * sampling_rate / 4.0)
+    nlap = int(0.75 * nfft)
+    seg_len = int(sampling_rate * ppsd_length)
+
+    freq = np.fft.rfftfreq(nfft, d=1.0 / sampling_rate)[1:][::-1]
+    psd_periods = 1.0 / freq
+
+    step_factor = 2 ** period_step_octaves
+    width_factor = 2 ** period_smoothing_width_octaves
+    per_left = psd_periods[0] / width_factor ** 0.5
+    per_right = per_left * width_factor
+    per_center = math.sqrt(per_left * per_right)
+    left, right, center = [per_left], [per_right], [per_center]
+    while per_center < psd_periods[-1]:
+        per_left *= step_factor
+        per_right = per_left * width_factor
+        per_center = math.sqrt(per_left * per_right)
+        left.append(per_left)
+        right.append(per_right)
+        center.append(per_center)
+    left, right, center = np.array(left), np.array(right), np.array(center)
+    valid = (right > psd_periods[0]) & (left < psd_periods[-1])
+    left, right, center = left[valid], right[valid], center[valid]
+    period_xedges = np.concatenate([center[:1] / step_factor ** 0.5, center * step_factor ** 0.5])
+
+    num_db_bins = int((db_bins[1] - db_bins[0]) / db_bins[2])
+    db_bin_edges = np.linspace(db_bins[0], db_bins[1], num_db_bins + 1, endpoint=True)
+
+    setup = PSDSetup(
+        sampling_rate=sampling_rate, ppsd_length=ppsd_length, overlap=overlap,
+        nfft=nfft, nlap=nlap, seg_len=seg_len, window=cosine_taper(nfft, 0.2),
+        freq=freq, psd_periods=psd_periods,
+        period_bin_left_edges=left, period_bin_right_edges=right,
+        period_bin_centers=center, period_xedges=period_xedges,
+        db_bin_edges=db_bin_edges,
+    )
+    for array in (setup.window, setup.freq, setup.psd_periods, setup.period_bin_left_edges,
+                  setup.period_bin_right_edges, setup.period_bin_centers, setup.period_xedges,
+                  setup.db_bin_edges):
+        array.setflags(write=False)
+    return setup
+
+
+@dataclass
+class ResponseEpoch:
+    """Velocity response of one channel epoch, evaluated on a PSD frequency grid."""
+    start: float
+    end: float
+    response: np.ndarray
+
+
+def channel_responses(inventory: Inventory, seed_id: str, setup: PSDSetup) -> List[ResponseEpoch]:
+    """
+    Response of every epoch of `seed_id` on the rfft grid of `setup`, like
+    the epochs ObsPy's PPSD preloads (epochs that fail are skipped). Evaluated
+    responses come from the per-worker/on-disk response cache.
+    """
+    epochs = []
+    for network in inventory:
+        for station in network:
+            for channel in station:
+                if f"{network.code}.{station.code}.{channel.location_code}.{channel.code}" != seed_id:
+                    continue
+                try:
+                    response = evaluate_response(inventory, seed_id, channel, setup.sampling_rate, setup.nfft)
+                except Exception as e:
+                    logger.warning(f"Could not get response for {seed_id} - {channel.start_date}, error {e}")
+                    continue
+                epochs.append(ResponseEpoch(
+                    start=channel.start_date.timestamp if channel.start_date else -np.inf,
+                    end=channel.end_date.timestamp if channel.end_date else np.inf,
+                    response=response,
+                ))
+    return epochs
+
+
+@dataclass
+class PSDHistogram:
+    """
+    Smoothed PSDs of one channel and their period/dB histogram.
+
+    Exposes the statistics used by the PPSD metrics with the same
+    conventions as `obspy.signal.PPSD`: get_percentile(), get_mean() and
+    get_mode() return (period_bin_centers, values).
+    """
+    id: str
+    setup: PSDSetup
+    psds: np.ndarray                              # (segments, period bins), float32
+    times: np.ndarray = field(default_factory=lambda: np.empty(0))   # segment start timestamps
+    trace_segments: int = 0
+
+    @property
+    def psd_segments(self) -> int:
+        return len(self.psds)
+
+    @property
+    def period_bin_centers(self) -> np.ndarray:
+        return self.setup.period_bin_centers
+
+    @property
+    def db_bin_edges(self) -> np.ndarray:
+        return self.setup.db_bin_edges
+
+    @property
+    def db_bin_centers(self) -> np.ndarray:
+        return _db_bin_centers(self.db_bin_edges)
+
+    @cached_property
+    def histogram(self) -> np.ndarray:
+        """(period bins, dB bins) counts; values outside the dB range go to the end bins."""
+        num_period_bins = len(self.period_bin_centers)
+        num_db_bins = len(self.db_bin_centers)
+        inds = self.db_bin_edges.searchsorted(self.psds, side="left") - 1
+        inds[inds == -1] = 0
+        inds[inds == num_db_bins] -= 1
+        flat = inds + np.arange(num_period_bins) * num_db_bins
+        counts = np.bincount(flat.ravel(), minlength=num_period_bins * num_db_bins)
+        return counts.reshape(num_period_bins, num_db_bins).astype(np.uint64)
+
+    @property
+    def period_xedges(self) -> np.ndarray:
+        return self.setup.period_xedges
+
+    def get_percentile(self, percentile: float = 50) -> Tuple[np.ndarray, np.ndarray]:
+        return self.period_bin_centers, histogram_percentile(self.histogram, self.db_bin_edges, percentile)
+
+    def get_mean(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.period_bin_centers, histogram_mean(self.histogram, self.db_bin_edges, self.psd_segments)
+
+    def get_mode(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.period_bin_centers, histogram_mode(self.histogram, self.db_bin_edges)
+
+    def plot(self, filename: str, cmap=None, show: bool = False, period_lim=(0.01, 179), max_percentage=30):
+        """
+        Saves the probability density plot (see `plot_histogram`). Takes
+        PPSD.plot()'s keywords; `show` is ignored.
+        """
+        title = ''
+        if self.psd_segments:
+            t0 = UTCDateTime(self.times[0]).date
+            t1 = UTCDateTime(self.times[-1] + self.setup.ppsd_length).date
+            title = f"{self.id}   {t0} -- {t1}  ({self.psd_segments} segments)"
+        plot_histogram(filename, self.histogram, self.psd_segments, self.period_xedges, self.db_bin_edges,
+                       title=title, cmap=cmap, period_lim=period_lim, max_percentage=max_percentage)
+
+
+# --- Histogram Statistics (PPSD conventions) ---
+def ppsd_histogram(ppsds) -> np.ndarray:
+    """(period, dB) count histogram of a native PSDHistogram or an ObsPy PPSD."""
+    if isinstance(ppsds, PSDHistogram):
+        return ppsds.histogram
+    return ppsds.current_histogram
+
+
+def _db_bin_centers(db_bin_edges: np.ndarray) -> np.ndarray:
+    return (db_bin_edges[:-1] + db_bin_edges[1:]) / 2.0
+
+
+def _histogram_cumulative(hist: np.ndarray) -> np.ndarray:
+    """(Internal) Per period bin cumulative counts normalized to 0..1, as PPSD.calculate_histogram()."""
+    cumulative = hist.cumsum(axis=1)
+    norm = cumulative[:, -1].astype(np.float64)
+    norm[norm == 0] = 1
+    return cumulative / norm[:, None]
+
+
+def _cumulative_percentile(cumulative: np.ndarray, db_bin_edges: np.ndarray, percentile: float) -> np.ndarray:
+    """
+    (Internal) Left edge of the first dB bin whose normalized cumulative
+    count reaches `percentile` (%), per period bin. Counting the entries
+    below the percentile is `searchsorted` on every (ascending) row.
+    """
+    percentile = percentile / 100.0
+    if percentile == 0:
+        indices = np.count_nonzero(cumulative <= percentile, axis=1)
+    else:
+        indices = np.count_nonzero(cumulative < percentile, axis=1)
+    return db_bin_edges[indices]
+
+
+def histogram_percentile(hist: np.ndarray, db_bin_edges: np.ndarray, percentile: float = 50) -> np.ndarray:
+    """
+    dB value of `percentile` per period bin of a (period, dB) count
+    histogram, as PPSD.get_percentile(): the left edge of the first dB bin
+    whose normalized cumulative count reaches the percentile.
+    """
+    return _cumulative_percentile(_histogram_cumulative(hist), db_bin_edges, percentile)
+
+
+def histogram_mean(hist: np.ndarray, db_bin_edges: np.ndarray, count: int) -> np.ndarray:
+    """Mean dB per period bin over `count` PSD segments, as PPSD.get_mean()."""
+    return (hist * _db_bin_centers(db_bin_edges) / count).sum(axis=1)
+
+
+def histogram_mode(hist: np.ndarray, db_bin_edges: np.ndarray) -> np.ndarray:
+    """Centre of the most populated dB bin per period bin, as PPSD.get_mode()."""
+    return _db_bin_centers(db_bin_edges)[hist.argmax(axis=1)]
+
+
+@dataclass
+class PPSDSummary:
+    """
+    Percentile curve, mean and mode of one PPSD histogram on the period
+    grid up to `max_period`, from a single walk over the histogram.
+    Values equal get_percentile(), get_mean() and get_mode() of the PPSD
+    (or PSDHistogram) restricted to the same periods.
+    """
+    periods: np.ndarray
+    percentile: np.ndarray
+    mean: np.ndarray
+    mode: np.ndarray
+    psd_segments: int = 0
+
+    @classmethod
+    def from_histogram(cls, hist: np.ndarray, period_bin_centers: np.ndarray, db_bin_edges: np.ndarray,
+                       count: int, percentile: float = 50, max_period: float = np.inf,
+                       cumulative: Optional[np.ndarray] = None) -> 'PPSDSummary':
+        """
+        Builds the summary of a (period, dB) count histogram of `count` PSD
+        segments. `cumulative` is the normalized cumulative histogram if the
+        caller already has it (ObsPy's PPSD keeps one).
+        """
+        keep = np.asarray(period_bin_centers) <= max_period
+        hist = hist[keep]
+        cumulative = _histogram_cumulative(hist) if cumulative is None else cumulative[keep]
+        return cls(
+            periods=np.asarray(period_bin_centers)[keep],
+            percentile=_cumulative_percentile(cumulative, db_bin_edges, percentile),
+            mean=histogram_mean(hist, db_bin_edges, count),
+            mode=histogram_mode(hist, db_bin_edges),
+            psd_segments=int(count),
+        )
+
+
+def ppsd_summary(ppsds, percentile: float = 50, max_period: float = np.inf) -> PPSDSummary:
+    """PPSDSummary of a native PSDHistogram or an ObsPy PPSD (its cached histograms are reused)."""
+    if isinstance(ppsds, PSDHistogram):
+        return PPSDSummary.from_histogram(ppsds.histogram, ppsds.period_bin_centers, ppsds.db_bin_edges,
+                                          ppsds.psd_segments, percentile, max_period)
+    return PPSDSummary.from_histogram(ppsds.current_histogram, ppsds.period_bin_centers, ppsds.db_bin_edges,
+                                      ppsds.current_histogram_count, percentile, max_period,
+                                      cumulative=ppsds.current_histogram_cumulative)
+
+
+def plot_histogram(filename: str, hist: np.ndarray, count: int, period_xedges: np.ndarray,
+                   db_bin_edges: np.ndarray, title: str = '', cmap=None, period_lim=(0.01, 179),
+                   max_percentage=30):
+    """
+    Saves a probability density plot (histogram in % of `count` segments,
+    Peterson noise models) in the layout of PPSD.plot(), without the data
+    coverage bar.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import FormatStrFormatter
+    from obspy.imaging.cm import obspy_sequential
+    from obspy.signal.spectral_estimation import get_nhnm, get_nlnm
+
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    data = hist.T * 100.0 / (count or 1)
+    mesh = ax.pcolormesh(period_xedges, db_bin_edges, data,
+                         cmap=cmap or obspy_sequential, vmin=0, vmax=max_percentage, zorder=-1)
+    fig.colorbar(mesh, ax=ax).set_label("[%]")
+    for periods, noise_model in (get_nhnm(), get_nlnm()):
+        ax.plot(periods, noise_model, '0.4', linewidth=2, zorder=10)
+    ax.grid(True, which="major")
+    ax.grid(True, which="minor", linestyle=":")
+    ax.set_xscale('log')
+    ax.set_xlim(period_lim)
+    ax.set_ylim(db_bin_edges[0], db_bin_edges[-1])
+    ax.set_xlabel('Period [s]')
+    ax.set_ylabel('Amplitude [$m^2/s^4/Hz$] [dB]')
+    ax.xaxis.set_major_formatter(FormatStrFormatter("%g"))
+    if title:
+        ax.set_title(title)
+    with np.errstate(all="ignore"):
+        fig.savefig(filename)
+    plt.close(fig)
+
+
+# --- Private Helpers: Batched Spectra ---
+def _segment_offsets(npts: int, setup: PSDSetup) -> np.ndarray:
+    """(Internal) Sample offsets of every full segment, stepping like PPSD.add()."""
+    step_samples = setup.step * setup.sampling_rate
+    n_seg = int((npts - setup.seg_len) // step_samples) + 1 if npts >= setup.seg_len else 0
+    offsets = np.round(np.arange(n_seg) * step_samples).astype(np.int64)
+    return offsets[offsets + setup.seg_len <= npts]
+
+
+def _spectra(x: np.ndarray, offsets: np.ndarray, setup: PSDSetup) -> np.ndarray:
+    """
+    (Internal) Welch power spectra (mlab.psd conventions: linear detrend,
+    cosine taper, one-sided, density scaling) of the segments starting at
+    `offsets`, as a (segments, nfft // 2) array without the offset bin and
+    in ascending period order.
+
+    All sub-windows of the block are gathered from one strided view of the
+    trace into a (segments, windows, nfft) array and transformed at once.
+    """
+    nfft, sub_step = setup.nfft, setup.nfft - setup.nlap
+    n_sub = (setup.seg_len - setup.nlap) // sub_step
+    starts = offsets[:, None] + np.arange(n_sub) * sub_step
+    windows = np.lib.stride_tricks.sliding_window_view(x, nfft)[starts]
+
+    # linear detrend: y - (b * (t - mean(t)) + mean(y)), b the least-squares slope
+    tc = np.arange(nfft, dtype=np.float64) - (nfft - 1) / 2.0
+    slope = (windows @ tc) / (tc @ tc)
+    windows -= windows.mean(axis=-1, keepdims=True)
+    windows -= slope[..., None] * tc
+    windows *= setup.window
+
+    spectrum = np.fft.rfft(windows, axis=-1)
+    del windows
+    power = np.square(spectrum.real)
+    power += np.square(spectrum.imag)
+    del spectrum
+    power = power.mean(axis=1)
+
+    power[:, 1:-1] *= 2.0
+    power /= setup.sampling_rate * np.sum(setup.window ** 2)
+    return power[:, 1:][:, ::-1]
+
+
+def _smooth(spec_db: np.ndarray, setup: PSDSetup) -> np.ndarray:
+    """
+    (Internal) Mean of the dB spectrum over every period bin
+    (left <= period <= right), via cumulative sums; empty bins are NaN.
+    """
+    lo = np.searchsorted(setup.psd_periods, setup.period_bin_left_edges, side='left')
+    hi = np.searchsorted(setup.psd_periods, setup.period_bin_right_edges, side='right')
+    cumulative = np.zeros((len(spec_db), spec_db.shape[1] + 1))
+    np.cumsum(spec_db, axis=1, out=cumulative[:, 1:])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        smoothed = (cumulative[:, hi] - cumulative[:, lo]) / (hi - lo)
+    return smoothed.astype(np.float32)
+
+
+def compute_psds(x: np.ndarray, offsets: np.ndarray, setup: PSDSetup, response: np.ndarray,
+                 max_block_mb: float = DEFAULT_PSD_BLOCK_MB, threads: int = 1) -> np.ndarray:
+    """
+    Smoothed, response-corrected (acceleration, dB) PSDs of the segments of
+    `x` (float64) starting at `offsets`, as a (segments, period bins)
+    float32 array. Segments are processed in blocks of at most
+    `max_block_mb` working memory.
+
+    With `threads` > 1 the channel-day is split into blocks of consecutive
+    hourly segments that run on a thread pool (NumPy's FFT, matmul and
+    reductions release the GIL); the memory cap is shared by the running
+    blocks. Rows stay in segment order, so the result does not depend on
+    `threads`.
+    """
+    resp = response[1:][::-1]
+    respamp = np.absolute(resp * np.conjugate(resp))
+    w = 2.0 * math.pi * setup.freq
+    correction = w ** 2 / respamp
+
+    threads = max(1, min(int(threads or 1), len(offsets)))
+    n_sub = (setup.seg_len - setup.nlap) // (setup.nfft - setup.nlap)
+    bytes_per_segment = n_sub * setup.nfft * 8 * 3
+    block = max(1, int(max_block_mb / threads * 2 ** 20 // bytes_per_segment))
+    if threads > 1:
+        block = min(block, -(-len(offsets) // threads))
+
+    psds = np.empty((len(offsets), len(setup.period_bin_centers)), dtype=np.float32)
+
+    def run_block(b0):
+        spec = _spectra(x, offsets[b0:b0 + block], setup)
+        spec *= correction
+        spec[spec < DTINY] = DTINY
+        spec = 10 * np.log10(spec)
+        psds[b0:b0 + block] = _smooth(spec, setup)
+
+    starts = range(0, len(offsets), block)
+    if threads <= 1:
+        for b0 in starts:
+            run_block(b0)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(run_block, starts))
+    return psds
+
+
+# --- Main Public Function ---
+def calculate_psd_histogram(sig: Stream, inventory: Optional[Inventory],
+                            max_block_mb: float = DEFAULT_PSD_BLOCK_MB, threads: int = 1) -> Optional[PSDHistogram]:
+    """
+    Native counterpart of building an ObsPy PPSD for one channel and adding
+    the whole stream to it.
+
+    The channel is the longest segment's id and sampling rate; its segments
+    are merged with gaps zero-filled (as PPSD.add() does), cut into
+    overlapping one-hour segments, transformed as batches and corrected by
+    the response of the matching epoch, evaluated once. `threads` > 1
+    computes blocks of hourly segments in parallel (see `compute_psds`).
+
+    Returns:
+        A PSDHistogram, or None if there is no inventory or not enough data.
+    """
+    if inventory is None:
+        logger.warning('PSD histogram skipped, no inventory provided.')
+        return None
+    if sig.count() == 0:
+        logger.warning('No data in stream for PSD histogram.')
+        return None
+
+    _trace = cast(Trace, max(sig, key=lambda tr: tr.stats.npts))
+    _id = _trace.id
+    sampling_rate = _trace.stats.sampling_rate
+    if sampling_rate == 0:
+        logger.warning(f"Cannot process PSD for {_id}: sampling rate is 0.")
+        return None
+
+    segments = Stream(traces=list(sig.select(id=_id, sampling_rate=sampling_rate).traces))
+    if len(segments) < len(sig):
+        logger.warning(
+            f"{_id}: {len(sig) - len(segments)} segment(s) with another id or sampling rate "
+            f"not added to the PSD histogram"
+        )
+    segments.merge(fill_value=0)
+    setup = psd_setup(sampling_rate)
+    epochs = channel_responses(inventory, _id, setup)
+
+    all_psds, all_times = [], []
+    for tr in segments:
+        offsets = _segment_offsets(tr.stats.npts, setup)
+        if len(offsets) == 0:
+            logger.debug(f"{_id}: trace shorter than {setup.ppsd_length:g} s skipped")
+            continue
+        x = np.ma.filled(tr.data, 0).astype(np.float64)
+        starts = tr.stats.starttime.timestamp + offsets / sampling_rate
+        for epoch in epochs:
+            in_epoch = (starts >= epoch.start) & (starts <= epoch.end)
+            if in_epoch.any():
+                all_psds.append(compute_psds(x, offsets[in_epoch], setup, epoch.response, max_block_mb, threads))
+                all_times.append(starts[in_epoch])
+                starts = np.where(in_epoch, np.nan, starts)
+        if np.isfinite(starts).any():
+            logger.warning(f"{_id}: no matching response for {np.isfinite(starts).sum()} segment(s), skipped")
+
+    psds = np.concatenate(all_psds) if all_psds else np.empty((0, len(setup.period_bin_centers)), np.float32)
+    times = np.concatenate(all_times) if all_times else np.empty(0)
+    order = np.argsort(times, kind='stable')
+    result = PSDHistogram(id=_id, setup=setup, psds=psds[order], times=times[order],
+                          trace_segments=len(segments))
+    logger.debug(f"{_id}: PSD histogram from {result.trace_segments} trace segment(s), "
+                 f"{result.psd_segments} PSD segment(s)")
+    return result
+
+
+# --- Anti-alias Pre-decimation ---
+def decimation_factor(sampling_rate: float, min_period: float,
+                      period_smoothing_width_octaves: float = PERIOD_SMOOTHING_WIDTH_OCTAVES) -> int:
+    """
+    Largest power of 2 the sampling rate can be divided by while every
+    period bin from `min_period` (s) up keeps its whole smoothing octave
+    inside the flat passband of the decimation filter. 1 = no decimation.
+
+    Powers of 2 keep nfft/sampling_rate, so the PSD frequencies and period
+    bins of the decimated rate are a subset of the original ones.
+    """
+    if not min_period or min_period <= 0 or sampling_rate <= 0:
+        return 1
+    f_max = 2 ** (period_smoothing_width_octaves / 2) / min_period
+    factor = 1
+    while DECIMATION_PASSBAND * sampling_rate / (4 * factor) >= f_max:
+        factor *= 2
+    return factor
+
+
+@lru_cache(maxsize=8)
+def _decimation_filter(factor: int) -> np.ndarray:
+    """
+    (Internal) Linear-phase Kaiser FIR of a decimation by `factor`: flat
+    to DECIMATION_PASSBAND of the new Nyquist, DECIMATION_ATTENUATION_DB
+    down where aliases would land below it. The delay ((taps - 1) / 2) is
+    a whole number of output samples.
+    """
+    width = 2 * (1 - DECIMATION_PASSBAND) / factor
+    numtaps, beta = kaiserord(DECIMATION_ATTENUATION_DB, width)
+    numtaps += -(numtaps - 1) % (2 * factor)
+    taps = firwin(numtaps, 1.0 / factor, window=('kaiser', beta))
+    taps.setflags(write=False)
+    return taps
+
+
+def decimate_trace(tr: Trace, factor: int, block_seconds: float = PPSD_LENGTH) -> Trace:
+    """
+    Anti-alias filters and decimates one trace by `factor` (polyphase, only
+    the kept samples are computed), in blocks of `block_seconds` so the
+    full-rate data are never converted to float64 as a whole. Output
+    samples sit at the times of every `factor`-th input sample, so the
+    start time does not move.
+    """
+    taps = _decimation_filter(factor)
+    delay = (len(taps) - 1) // 2
+    npts = tr.stats.npts
+    data = np.empty(-(-npts // factor), dtype=np.float64)
+    step = max(1, int(block_seconds * tr.stats.sampling_rate) // factor) * factor
+    for start in range(0, npts, step):
+        # Input from `delay` samples before the block to `delay` after it:
+        # every output sample of the block sees the same samples as when
+        # filtering the whole trace at once
+        lo = max(0, start - delay)
+        hi = min(npts, start + step + delay)
+        filtered = upfirdn(taps, np.asarray(tr.data[lo:hi], dtype=np.float64), down=factor)
+        first, last = start // factor, min(len(data), (start + step) // factor)
+        skip = (start + delay - lo) // factor
+        data[first:last] = filtered[skip:skip + last - first]
+    header = tr.stats.copy()
+    header.npts = len(data)
+    header.sampling_rate = tr.stats.sampling_rate / factor
+    return Trace(data=data, header=header)
+
+
+def decimate_for_psd(sig: Stream, min_period: float) -> Stream:
+    """
+    Decimates the traces of a channel to the lowest rate that still covers
+    periods from `min_period` (s) up (see `decimation_factor`); traces that
+    need no decimation are passed on as they are. Gappy (masked) traces are
+    split first, so the filter never runs across a gap.
+    """
+    out = Stream()
+    for tr in sig:
+        factor = decimation_factor(tr.stats.sampling_rate, min_period)
+        if factor == 1:
+            out.append(tr)
+            continue
+        parts = tr.split() if np.ma.is_masked(tr.data) else [tr]
+        out.extend([decimate_trace(part, factor) for part in parts])
+    return out
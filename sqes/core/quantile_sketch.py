@@ -0,0 +1,183 @@
+import os
+import numpy as np
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Centroid budget of a sketch: ~compression / 2 centroids are kept, tails
+# are resolved down to single samples (k1 scale function of the t-digest)
+DEFAULT_SKETCH_COMPRESSION = 400
+
+# Amplitude quantiles reported as per-channel metrics
+SKETCH_QUANTILES = {'amp_p01': 0.01, 'amp_p50': 0.50, 'amp_p99': 0.99}
+
+
+@dataclass
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch (merging t-digest).
+
+    Samples are folded in block by block; the state is a sorted set of
+    weighted centroids whose size is bounded by `compression`, with small
+    centroids at both tails. Two sketches merge by pooling their centroids
+    and compressing again, so daily sketches give weekly or monthly
+    quantiles without rereading waveforms.
+    """
+    compression: float = DEFAULT_SKETCH_COMPRESSION
+    means: np.ndarray = field(default_factory=lambda: np.empty(0))
+    weights: np.ndarray = field(default_factory=lambda: np.empty(0))
+    min: float = np.inf
+    max: float = -np.inf
+
+    @property
+    def count(self) -> float:
+        """Number of samples folded into the sketch."""
+        return float(self.weights.sum())
+
+    def update(self, values: np.ndarray):
+        """Folds a block of samples (NaN and masked samples are ignored) into the sketch."""
+        values = np.ma.filled(np.ma.asarray(values, dtype=np.float64), np.nan).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        values.sort()
+        self.min = min(self.min, float(values[0]))
+        self.max = max(self.max, float(values[-1]))
+
+        # merge the sorted block into the sorted centroids without a full argsort
+        n = len(self.means) + len(values)
+        at = np.searchsorted(values, self.means, side='right') + np.arange(len(self.means))
+        means = np.empty(n)
+        weights = np.ones(n)
+        is_value = np.ones(n, dtype=bool)
+        is_value[at] = False
+        means[at] = self.means
+        weights[at] = self.weights
+        means[is_value] = values
+        self._compress(means, weights, presorted=True)
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """Folds another sketch into this one and returns self."""
+        if other.count == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray, presorted: bool = False):
+        """
+        (Internal) Merges adjacent centroids whose combined span stays within
+        one unit of k(q) = compression / (2 pi) * asin(2q - 1).
+        """
+        if not presorted:
+            order = np.argsort(means, kind='stable')
+            means = means[order]
+            weights = weights[order]
+        total = weights.sum()
+        if len(means) <= 2 * self.compression:
+            self.means, self.weights = means, weights
+            return
+
+        q_mid = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q_mid - 1, -1.0, 1.0))
+        cluster = np.floor(k).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+
+        new_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / new_weights
+        self.weights = new_weights
+
+    def quantile(self, q: float) -> float:
+        """Estimated q-quantile (0 <= q <= 1), NaN for an empty sketch."""
+        total = self.count
+        if total == 0:
+            return np.nan
+        # centroid i covers the ranks around its cumulative midpoint
+        ranks = np.concatenate([[0.0], np.cumsum(self.weights) - self.weights / 2, [total]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * total, ranks, values))
+
+    def mad(self) -> float:
+        """Estimated median absolute deviation about the sketch median."""
+        total = self.count
+        if total == 0:
+            return np.nan
+        median = self.quantile(0.5)
+        deviation = np.abs(self.means - median)
+        order = np.argsort(deviation, kind='stable')
+        deviation = deviation[order]
+        weights = self.weights[order]
+        ranks = np.cumsum(weights) - weights / 2
+        return float(np.interp(total / 2, ranks, deviation))
+
+    def metrics(self) -> dict:
+        """Per-channel amplitude metrics: P01/P50/P99 and the MAD."""
+        result = {name: self.quantile(q) for name, q in SKETCH_QUANTILES.items()}
+        result['amp_mad'] = self.mad()
+        return result
+
+
+def merge_sketches(sketches: Iterable[QuantileSketch],
+                   compression: float = DEFAULT_SKETCH_COMPRESSION) -> QuantileSketch:
+    """Merges any number of sketches into a new one."""
+    merged = QuantileSketch(compression=compression)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+def save_sketch(path: str, sketch: QuantileSketch):
+    """Persists a sketch as a compact .npz file (float32 means, integer weights)."""
+    np.savez_compressed(
+        path,
+        compression=sketch.compression,
+        means=sketch.means.astype(np.float32),
+        weights=np.round(sketch.weights).astype(np.int64),
+        min=sketch.min,
+        max=sketch.max,
+    )
+
+
+def load_sketch(path: str) -> QuantileSketch:
+    """Loads a sketch written by save_sketch()."""
+    with np.load(path) as npz:
+        return QuantileSketch(
+            compression=float(npz['compression']),
+            means=npz['means'].astype(np.float64),
+            weights=npz['weights'].astype(np.float64),
+            min=float(npz['min']),
+            max=float(npz['max']),
+        )
+
+
+def sketch_path(output_root: str, day: str, seed_id: str) -> str:
+    """Path of a channel's daily sketch: <output_root>/<YYYY-MM-DD>/<NET.STA.LOC.CHA>.npz"""
+    return os.path.join(output_root, day, f"{seed_id}.npz")
+
+
+def merge_daily_sketches(output_root: str, seed_id: str, start: date, end: date) -> Optional[QuantileSketch]:
+    """
+    Merges the persisted daily sketches of one channel over [start, end]
+    (inclusive), e.g. for weekly or monthly amplitude percentiles.
+    Missing days are skipped; returns None if no day has a sketch.
+    """
+    sketches = []
+    day = start
+    while day <= end:
+        path = sketch_path(output_root, day.strftime("%Y-%m-%d"), seed_id)
+        if os.path.exists(path):
+            try:
+                sketches.append(load_sketch(path))
+            except Exception as e:
+                logger.warning(f"Could not load sketch {path}: {e}")
+        day += timedelta(days=1)
+
+    if not sketches:
+        return None
+    logger.debug(f"Merged {len(sketches)} daily sketches of {seed_id} ({start} to {end})")
+    return merge_sketches(sketches, sketches[0].compression)
@@ -0,0 +1,112 @@
+import os
+import hashlib
+import pickle
+import numpy as np
+from collections import OrderedDict
+from typing import Optional
+import logging
+from obspy import Inventory
+
+logger = logging.getLogger(__name__)
+
+# Evaluated responses kept in memory per worker (one per distinct response,
+# sampling rate and nfft; a 100 Hz response is 0.5 MB)
+RESPONSE_CACHE_SIZE = 128
+
+# The response of an epoch is looked up this many seconds after its start
+# date, as ObsPy's PPSD does, so an epoch whose start equals the previous
+# epoch's end date is not matched to the previous epoch
+EPOCH_LOOKUP_OFFSET_S = 10
+
+# --- Per-worker state ---
+_memory: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_cache_dir: Optional[str] = None
+_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+
+
+def configure_response_cache(cache_dir: Optional[str]):
+    """
+    Sets the on-disk cache directory (None or '' keeps the cache in memory
+    only). Called once per worker; the directory is shared by all workers
+    and all days of a run.
+    """
+    global _cache_dir
+    _cache_dir = cache_dir or None
+    if _cache_dir:
+        os.makedirs(_cache_dir, exist_ok=True)
+
+
+def clear_response_cache():
+    """Empties the in-memory cache and resets the counters (the disk cache is kept)."""
+    _memory.clear()
+    for key in _stats:
+        _stats[key] = 0
+
+
+def response_cache_info() -> dict:
+    """Hit/miss counters of this worker's cache."""
+    return dict(_stats, size=len(_memory))
+
+
+def _remember(key: tuple, response: np.ndarray):
+    """(Internal) Stores a read-only response, evicting the oldest entries."""
+    response.setflags(write=False)
+    _memory[key] = response
+    _memory.move_to_end(key)
+    while len(_memory) > RESPONSE_CACHE_SIZE:
+        _memory.popitem(last=False)
+
+
+def _response_digest(response) -> str:
+    """(Internal) Content hash of an ObsPy Response (stages and sensitivity)."""
+    return hashlib.sha1(pickle.dumps(response, protocol=4)).hexdigest()[:16]
+
+
+def _disk_path(digest: str, sampling_rate: float, nfft: int) -> str:
+    return os.path.join(_cache_dir, f"{digest}_{sampling_rate:g}Hz_{nfft}.npy")
+
+
+def evaluate_response(inventory: Inventory, seed_id: str, channel,
+                      sampling_rate: float, nfft: int) -> np.ndarray:
+    """
+    Complex velocity response of one channel epoch on the rfft grid of
+    (sampling_rate, nfft), as `Response.get_evalresp_response` returns it.
+
+    Looked up by the content of the response, sampling rate and nfft in
+    memory and then in the disk cache, so components and days sharing a
+    response reuse it and a corrected response of the same epoch is
+    evaluated again; evaluated only on a miss. The returned array is
+    read-only.
+    """
+    resp = inventory.get_response(seed_id, channel.start_date + EPOCH_LOOKUP_OFFSET_S)
+    digest = _response_digest(resp)
+    key = (digest, float(sampling_rate), int(nfft))
+    if key in _memory:
+        _stats['hits'] += 1
+        _memory.move_to_end(key)
+        return _memory[key]
+
+    path = _disk_path(digest, sampling_rate, nfft) if _cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            response = np.load(path)
+            _stats['disk_hits'] += 1
+            _remember(key, response)
+            return response
+        except Exception as e:
+            logger.warning(f"Could not load cached response {path}: {e}")
+
+    _stats['misses'] += 1
+    response = resp.get_evalresp_response(t_samp=1.0 / sampling_rate, nfft=nfft, output="VEL")[0]
+    logger.debug(f"Evaluated response of {seed_id} ({channel.start_date}) at {sampling_rate:g} Hz, nfft {nfft}")
+    if path:
+        try:
+            # write-then-rename: concurrent workers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, response)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not write cached response {path}: {e}")
+    _remember(key, response)
+    return response
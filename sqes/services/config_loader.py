@@ -38,9 +38,11 @@ def load_config(filename: str = 'global.cfg', section: str = 'postgresql') -> Di
         int_keys = {
             'cpu_number_used', 'pool_size', 
             'ram_soft_start_initial', 'ram_soft_start_initial_worker',
-            'ram_soft_start_interval', 'ram_allocation_delay'
+            'ram_soft_start_interval', 'ram_allocation_delay',
+            'threads_per_worker'
         }
-        float_keys = {'ram_limit_gb', 'ram_station_default_gb'}
+        float_keys = {'ram_limit_gb', 'ram_station_default_gb', 'spike_max_block_mb', 'psd_parallel_min_rate',
+                      'ppsd_min_period'}
         # --- END FIX ---
 
         params = parser.items(section)
@@ -1,6 +1,8 @@
+import json
 import logging
 from typing import Optional
 from .db_pool import DBPool
+from ..core.basic_metrics import HOURLY_METRICS
 
 logger = logging.getLogger(__name__)
 
@@ -125,6 +127,13 @@ class QCRepository:
                         diff20_100, diff5_20, diff5
                     ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """,
+                'insert_detail_hourly': """
+                    INSERT INTO tb_qcdetail (
+                        id_kode, kode, tanggal, komp, rms, ratioamp, avail, ngap, nover, num_spikes, 
+                        pct_above, pct_below, dead_channel_lin, dead_channel_gsn, 
+                        diff20_100, diff5_20, diff5, hourly_metrics
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
                 'get_qc_details': "SELECT * FROM tb_qcdetail WHERE tanggal = %s AND kode = %s",
                 'get_station_info': "SELECT kode_sensor, lokasi_sensor, sistem_sensor FROM tb_slmon WHERE kode_sensor = %s",
                 'check_analysis': "SELECT * FROM tb_qcres WHERE tanggal_res = %s AND kode_res = %s",
@@ -169,6 +178,14 @@ class QCRepository:
                         sp_percentage
                     ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """,
+                'insert_detail_hourly': """
+                    INSERT INTO stations_qc_details (
+                        id, code, date, channel, rms, amplitude_ratio, availability, num_gap, 
+                        num_overlap, num_spikes, perc_above_nhnm, perc_below_nlnm, 
+                        linear_dead_channel, gsn_dead_channel, lp_percentage, bw_percentage, 
+                        sp_percentage, hourly_metrics
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
                 'get_qc_details': "SELECT * FROM stations_qc_details WHERE date = %s AND code = %s",
                 'get_station_info': "SELECT network, code, location, network_group FROM stations WHERE code = %s",
                 'check_analysis': "SELECT * FROM stations_data_quality WHERE date = %s AND code = %s",
@@ -319,7 +336,6 @@ class QCRepository:
 
     def insert_qc_detail(self, metrics: dict):
         """Inserts a full row of metrics."""
-        query = self._get_query('insert_detail')
         args = (
             metrics['id_kode'], metrics['kode'], metrics['tgl'], metrics['cha'],
             metrics['rms'], metrics['ratioamp'], metrics['psdata'],
@@ -327,21 +343,46 @@ class QCRepository:
             metrics['pctH'], metrics['pctL'], metrics['dcl'], metrics['dcg'],
             metrics['long_period'], metrics['microseism'], metrics['short_period']
         )
-        self.pool.execute(query, args=args, commit=True)
+        self._insert_detail(args, metrics.get('hourly'))
         logger.debug(f"Inserted full metrics for {metrics['id_kode']}")
 
     def insert_default_qc_detail(self, id_kode, kode, tgl, cha, metrics: dict):
         """Inserts a row with default (bad) data."""
-        query = self._get_query('insert_detail')
         args = (
             id_kode, kode, tgl, cha,
             metrics['rms'], metrics['ratioamp'], metrics['psdata'],
             metrics['ngap'], metrics['nover'], metrics['num_spikes'],
             '100', '0', '0', '0', '0', '0', '0' # Default PPSD values
         )
-        self.pool.execute(query, args=args, commit=True)
+        self._insert_detail(args, metrics.get('hourly'))
         logger.debug(f"Inserted default metrics for {id_kode}")
 
+    def _insert_detail(self, args: tuple, hourly: Optional[dict]):
+        """
+        (Internal) Inserts one qc-detail row. The hourly_metrics column is
+        only written when hourly metrics were computed (`hourly_metrics = on`),
+        so databases without that column keep working.
+        """
+        if hourly:
+            query = self._get_query('insert_detail_hourly')
+            args = args + (self._hourly_arg(hourly),)
+        else:
+            query = self._get_query('insert_detail')
+        self.pool.execute(query, args=args, commit=True)
+
+    def _hourly_arg(self, hourly: dict):
+        """
+        (Internal) Hourly metrics as one row per HOURLY_METRICS entry (bins
+        without data as NULL): a 2-D array for PostgreSQL, JSON text for MySQL.
+        """
+        rows = [
+            [None if v != v else round(float(v), 2) for v in hourly[name]]
+            for name in HOURLY_METRICS
+        ]
+        if self.db_type == 'mysql':
+            return json.dumps(rows)
+        return rows
+
     # --- QC Analysis Methods ---
 
     def get_station_info(self, station_code: str):
@@ -4,5 +4,7 @@ Workflows package for SQES.
 This package contains the main processing workflows for seismic quality evaluation.
 """
 from .orchestrator import run_processing_workflow
+from .availability_scan import run_availability_scan
+from .render_plots import run_render
 
-__all__ = ['run_processing_workflow']
+__all__ = ['run_processing_workflow', 'run_availability_scan', 'run_render']
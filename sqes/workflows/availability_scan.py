@@ -0,0 +1,137 @@
+"""Availability-only workflow: gaps/overlaps/availability from MiniSEED headers."""
+import logging
+from datetime import datetime
+from typing import Any, Optional, Dict
+
+from obspy.clients.filesystem.sds import Client as SDSClient
+
+from ..clients import sds
+from ..core.basic_metrics import GapSummary
+from ..services.db_pool import DBPool
+from ..services.repository import QCRepository
+from ..services import source_mapper
+from ..services.config_loader import load_config, load_archive_config
+from .helpers import setup_paths_and_times
+
+logger = logging.getLogger(__name__)
+
+
+def scan_station_availability(sta_tuple, data_client: SDSClient, time0, time1) -> Dict[str, dict]:
+    """
+    Scans one station's components in an SDS archive without decoding data.
+
+    Args:
+        sta_tuple: Station tuple (network, code, location, sensor, prefixes, components, ...)
+        data_client: ObsPy SDS client for the station's archive
+        time0: Start of the day (UTCDateTime)
+        time1: End of the day (UTCDateTime)
+
+    Returns:
+        Dict keyed by component with 'psdata', 'ngap' and 'nover' (same
+        meaning as in basic_metrics.process_basic_metrics), or an empty
+        dict entry for components with no data.
+    """
+    network, kode, location = sta_tuple[0], sta_tuple[1], sta_tuple[2] or ''
+    channel_prefixes = (sta_tuple[4] or '').split(',')
+    channel_components = (sta_tuple[5] or '').split(',')
+
+    result = {}
+    for ch in channel_components:
+        segments = sds.get_segments(
+            data_client, network, kode, location,
+            channel_prefixes, time0, time1, ch
+        )
+        if not segments:
+            result[ch] = {}
+            continue
+        gap_summary = GapSummary.from_segments(segments)
+        result[ch] = {
+            'psdata': gap_summary.availability(time0, time1),
+            'ngap': gap_summary.gap_count,
+            'nover': gap_summary.overlap_count,
+        }
+    return result
+
+
+def run_availability_scan(date_str: str, basic_config: Dict[str, Any],
+                          stations: Optional[list] = None,
+                          network: Optional[list] = None) -> Dict[str, Dict[str, dict]]:
+    """
+    Quick "which stations have data" pass for a single day.
+
+    Only stations whose waveform source is SDS (globally or via source.cfg)
+    can be scanned; FDSN stations are listed as skipped. Nothing is written
+    to the database. Overlapping records with identical samples are counted
+    as overlaps here, while the full run's cleanup merge drops them.
+
+    Args:
+        date_str: Date string in YYYYMMDD format
+        basic_config: Basic configuration dictionary
+        stations: Optional list of station codes to scan
+        network: Optional list of network codes to scan
+
+    Returns:
+        Dict keyed by station code, see scan_station_availability().
+    """
+    logger.info(f"--- Starting Availability Scan for {date_str} ---")
+    dt_start = datetime.now()
+
+    time0, time1, tgl, _ = setup_paths_and_times(date_str)
+
+    db_pool = DBPool(**load_config(section=basic_config['use_database']))
+    repo = QCRepository(db_pool, basic_config['use_database'])
+    if stations:
+        data = repo.get_station_tuples(stations, network=network)
+    else:
+        data = repo.get_stations_to_process(tgl, network=network)
+    del(db_pool)
+
+    if not data:
+        logger.warning(f"No stations to scan for {tgl}.")
+        return {}
+
+    default_type = basic_config.get('waveform_source', 'fdsn').lower()
+    source_map = source_mapper.load_source_mapping()
+    clients: Dict[str, SDSClient] = {}
+    results: Dict[str, Dict[str, dict]] = {}
+    skipped = []
+
+    for sta_tuple in data:
+        net, kode = sta_tuple[0], sta_tuple[1]
+        waveform_type, waveform_tag = default_type, 'archive'
+        station_sources = source_map.get((net, kode))
+        if station_sources and station_sources.waveform:
+            waveform_type = station_sources.waveform.type
+            waveform_tag = station_sources.waveform.tag
+
+        if waveform_type != 'sds':
+            skipped.append(kode)
+            continue
+
+        try:
+            if waveform_tag not in clients:
+                clients[waveform_tag] = SDSClient(sds_root=load_archive_config(waveform_tag))
+            results[kode] = scan_station_availability(sta_tuple, clients[waveform_tag], time0, time1)
+        except Exception as e:
+            logger.error(f"{net}.{kode} availability scan failed: {e}")
+            results[kode] = {}
+
+    with_data = sorted(kode for kode, comps in results.items() if any(comps.values()))
+    without_data = sorted(kode for kode, comps in results.items() if not any(comps.values()))
+    for kode in with_data:
+        summary = ", ".join(
+            f"{ch}: {m['psdata']}% ({m['ngap']} gaps, {m['nover']} overlaps)" if m else f"{ch}: no data"
+            for ch, m in results[kode].items()
+        )
+        logger.info(f"{kode} {summary}")
+
+    logger.info(f"Stations with data on {tgl}: {len(with_data)}/{len(results)}")
+    if with_data:
+        logger.info(f"Stations with data: {' '.join(with_data)}")
+    if without_data:
+        logger.warning(f"Stations without data: {' '.join(without_data)}")
+    if skipped:
+        logger.info(f"Skipped {len(skipped)} non-SDS stations: {' '.join(sorted(skipped))}")
+
+    logger.info(f"--- Availability Scan for {date_str} finished in {datetime.now() - dt_start} ---")
+    return results
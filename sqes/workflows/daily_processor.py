@@ -149,16 +149,17 @@ def run_single_day(date_str: str, ppsd: bool, flush: bool, mseed: bool,
             
             del(db_pool) # Close main pool before forking
 
+            # --- RAM Manager Setup ---
+            stations_ram_map = load_stations_config()
+            ram_manager = RAMManager(basic_config, stations_ram_map)
+
             # Pass all static configuration to initializer so every worker runs it ONCE
+            # (workers use the RAM manager's station estimates as their memory budget)
             init_args = (
                 db_creds, basic_config, log_level, log_file_path,
                 tgl, time0, time1, client_creds, output_paths,
-                ppsd, mseed, qc_thresholds
+                ppsd, mseed, qc_thresholds, ram_manager
             )
-            
-            # --- RAM Manager Setup ---
-            stations_ram_map = load_stations_config()
-            ram_manager = RAMManager(basic_config, stations_ram_map)
             # Track previous concurrency for logging trends
             last_logged_concurrency = ram_manager.current_concurrency
             
@@ -60,7 +60,8 @@ def get_output_paths(basic_config, tahun, tgl, date_str):
         date_str: Date string in YYYYMMDD format (unused, kept for compatibility)
         
     Returns:
-        Dictionary with keys: outputPSD, outputPDF, outputsignal, outputmseed
+        Dictionary with keys: outputPSD, outputPDF, outputsignal, outputmseed,
+        outputsketch (None unless 'outputsketch' is configured)
     """
     outputPSD = os.path.join(basic_config['outputpsd'], str(tgl))
     outputPDF = os.path.join(basic_config['outputpdf'], str(tgl))
@@ -71,12 +72,18 @@ def get_output_paths(basic_config, tahun, tgl, date_str):
     create_directory(outputPDF)
     create_directory(outputmseed)
     create_directory(outputPSD)
+
+    outputsketch = None
+    if basic_config.get('outputsketch'):
+        outputsketch = os.path.join(basic_config['outputsketch'], str(tgl))
+        create_directory(outputsketch)
     
     return {
         'outputPSD': outputPSD,
         'outputPDF': outputPDF,
         'outputsignal': outputsignal,
-        'outputmseed': outputmseed
+        'outputmseed': outputmseed,
+        'outputsketch': outputsketch
     }
 
 
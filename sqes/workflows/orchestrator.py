@@ -4,6 +4,8 @@ from datetime import datetime, timedelta
 from typing import Any, Optional, Dict
 
 from .daily_processor import run_single_day
+from .availability_scan import run_availability_scan
+from .render_plots import run_render
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +14,9 @@ def run_processing_workflow(start_date_str: str, end_date_str: str,
                             stations: Optional[list], network: Optional[list],
                             ppsd: bool, mseed: bool, flush: bool, log_level: int,
                             log_file_path: str,
-                            basic_config: Dict[str, Any]):
+                            basic_config: Dict[str, Any],
+                            availability_only: bool = False,
+                            render_only: bool = False):
     """
     Orchestrates processing for all or specific stations over a date range.
     
@@ -28,6 +32,10 @@ def run_processing_workflow(start_date_str: str, end_date_str: str,
         log_level: Logging level (INFO, DEBUG, etc.)
         log_file_path: Path to the log file for worker processes
         basic_config: Basic configuration dictionary
+        availability_only: Only scan SDS MiniSEED headers for availability,
+            gaps and overlaps (no metrics, no database writes)
+        render_only: Only render the PDF plots stored by a
+            ppsd_plot = deferred run (no metrics, no database writes)
     """
     logger.info(f"--- Starting Main Workflow from {start_date_str} to {end_date_str} ---")
     
@@ -56,6 +64,31 @@ def run_processing_workflow(start_date_str: str, end_date_str: str,
         # cli.py already blocks this, but we double-check.
         do_flush = (flush and (start_date == end_date))
         
+        if availability_only:
+            try:
+                run_availability_scan(
+                    date_str=date_str,
+                    basic_config=basic_config,
+                    stations=stations,
+                    network=network
+                )
+            except Exception as e:
+                logger.error(f"Availability scan failed for {date_str}: {e}. Skipping to next date.")
+            current_date += timedelta(days=1)
+            continue
+
+        if render_only:
+            try:
+                run_render(
+                    date_str=date_str,
+                    basic_config=basic_config,
+                    stations=stations
+                )
+            except Exception as e:
+                logger.error(f"Plot rendering failed for {date_str}: {e}. Skipping to next date.")
+            current_date += timedelta(days=1)
+            continue
+
         try:
             # Call the internal single-day processor
             run_single_day(
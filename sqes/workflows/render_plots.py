@@ -0,0 +1,45 @@
+"""Render workflow: PDF plots from the histograms stored with ppsd_plot = deferred."""
+import os
+import logging
+from datetime import datetime
+from typing import Any, Optional, Dict, Tuple
+
+from ..core.pdf_plots import render_pending_plots
+from .helpers import setup_paths_and_times
+
+logger = logging.getLogger(__name__)
+
+
+def run_render(date_str: str, basic_config: Dict[str, Any],
+               stations: Optional[list] = None, force: bool = False) -> Tuple[int, int]:
+    """
+    Renders the deferred PDF plots of one day (<outputpdf>/<YYYY-MM-DD>).
+
+    Plots whose PNG is missing or older than the stored histogram are
+    drawn on a process pool of `cpu_number_used` workers (1 if unset).
+    No waveforms are read and nothing is written to the database.
+
+    Args:
+        date_str: Date string in YYYYMMDD format
+        basic_config: Basic configuration dictionary
+        stations: Optional list of station codes to render
+        force: Render again even if the PNG is up to date
+
+    Returns:
+        Tuple of (rendered, failed) plot counts.
+    """
+    logger.info(f"--- Starting PDF Plot Rendering for {date_str} ---")
+    dt_start = datetime.now()
+
+    _, _, tgl, _ = setup_paths_and_times(date_str)
+    directory = os.path.join(basic_config['outputpdf'], str(tgl))
+    if not os.path.isdir(directory):
+        logger.warning(f"No PDF output directory for {tgl}: {directory}")
+        return 0, 0
+
+    processes = int(basic_config.get('cpu_number_used') or 1)
+    rendered, failed = render_pending_plots(directory, stations=stations, force=force, processes=processes)
+
+    logger.info(f"Rendered {rendered} plot(s) for {tgl}" + (f", {failed} failed" if failed else ""))
+    logger.info(f"--- PDF Plot Rendering for {date_str} finished in {datetime.now() - dt_start} ---")
+    return rendered, failed
@@ -1,6 +1,7 @@
 import signal
 import os
 import time
+import psutil
 import numpy as np
 from obspy import UTCDateTime, Trace
 from typing import Optional, cast, Dict, Any
@@ -12,6 +13,9 @@ from ..services.repository import QCRepository
 from ..services import source_mapper
 from ..analysis import qc_analyzer
 from ..core import basic_metrics, ppsd_metrics, models, utils
+from ..core.dead_channel import screen_dead_channel, dead_channel_metrics
+from ..core.quantile_sketch import save_sketch
+from ..core.response_cache import configure_response_cache
 from ..clients import fdsn, sds, local
 
 # Global Worker Resources
@@ -20,7 +24,7 @@ GW_CONTEXT: Dict[str, Any] = {}
 
 def init_worker(db_credentials, basic_config, log_level, log_file_path,
                 tgl, time0, time1, client_credentials, output_paths,
-                pdf_trigger, mseed_trigger, qc_thresholds):
+                pdf_trigger, mseed_trigger, qc_thresholds, ram_manager=None):
     """
     Initializer for worker processes.
     Sets up DBPool, Logging, and Context once per process.
@@ -43,6 +47,13 @@ def init_worker(db_credentials, basic_config, log_level, log_file_path,
         
     # 3. Handle Signals
     signal.signal(signal.SIGALRM, _handle_timeout)
+
+    # 3b. Response cache (in memory per worker, optionally shared on disk)
+    try:
+        configure_response_cache(basic_config.get('responsecache'))
+    except Exception as e:
+        logger.warning(f"Response disk cache disabled: {e}")
+        configure_response_cache(None)
     
     # 4. Populate Context
     GW_CONTEXT.update({
@@ -54,10 +65,29 @@ def init_worker(db_credentials, basic_config, log_level, log_file_path,
         'output_paths': output_paths,
         'pdf_trigger': pdf_trigger,
         'mseed_trigger': mseed_trigger,
-        'qc_thresholds': qc_thresholds
+        'qc_thresholds': qc_thresholds,
+        'ram_manager': ram_manager
     })
 
 
+def _worker_memory_budget(sta_tuple) -> Optional[float]:
+    """
+    Bytes this worker may still allocate: the station's RAM estimate
+    (stations.cfg or ram_station_default_gb) minus the worker's current RSS.
+    The RSS includes the component streams already loaded, so they are
+    counted at the size actually acquired. Returns None if no RAM manager
+    was passed to the worker.
+    """
+    ram_manager = GW_CONTEXT.get('ram_manager')
+    if ram_manager is None:
+        return None
+    estimate_bytes = ram_manager.get_station_estimate(sta_tuple) * 1024**3
+    try:
+        rss = psutil.Process().memory_info().rss
+    except Exception:
+        rss = 0
+    return max(0.0, estimate_bytes - rss)
+
 def _handle_timeout(signum, frame):
     """Timeout handler for worker processes."""
     print(f"!! Process TIMEOUT after signal {signum}", flush=True)
@@ -212,24 +242,26 @@ def process_station_data(sta_tuple):
     outputsignal = output_paths['outputsignal']
     outputPSD = output_paths['outputPSD']
     outputPDF = output_paths['outputPDF']
+    outputsketch = output_paths.get('outputsketch')
+
+    def log_default_and_continue(id_kode, cha, base_metrics=None, reason=""):
+        if base_metrics:
+            metrics = base_metrics
+        else:
+            metrics = {'rms': '0', 'ratioamp': '0', 'psdata': '0', 'ngap': '1', 'nover': '0', 'num_spikes': '0'}
+        
+        try:
+            repo.check_and_delete_qc_detail(id_kode, tgl)
+            repo.insert_default_qc_detail(id_kode, kode, tgl, cha, metrics)
+            logger.warning(f"{id_kode} - Skipped with default parameters. Reason: {reason}")
+        except Exception as e:
+            logger.error(f"{id_kode} - FAILED to log default parameters: {e}")
+        time.sleep(0.5)
 
-    # --- UPDATED: Main Loop ---
+    # --- UPDATED: Acquisition Loop (all components first, for batched metrics) ---
+    prepared = {}
     for ch in channel_components:
         id_kode = f"{kode}_{ch}_{tgl}"
-        
-        def log_default_and_continue(base_metrics=None, cha=ch, reason=""):
-            if base_metrics:
-                metrics = base_metrics
-            else:
-                metrics = {'rms': '0', 'ratioamp': '0', 'psdata': '0', 'ngap': '1', 'nover': '0', 'num_spikes': '0'}
-            
-            try:
-                repo.check_and_delete_qc_detail(id_kode, tgl)
-                repo.insert_default_qc_detail(id_kode, kode, tgl, cha, metrics)
-                logger.warning(f"{id_kode} - Skipped with default parameters. Reason: {reason}")
-            except Exception as e:
-                logger.error(f"{id_kode} - FAILED to log default parameters: {e}")
-            time.sleep(0.5)
 
         # --- 2. Load/Download Waveforms ---
         logger.debug(f"{id_kode} Acquiring waveforms (method: {waveform_source})...")
@@ -252,16 +284,16 @@ def process_station_data(sta_tuple):
         
         except TimeoutError:
             logger.error(f"!! {id_kode} FDSN download timeout!")
-            log_default_and_continue(reason="Download Timeout")
+            log_default_and_continue(id_kode, ch, reason="Download Timeout")
             continue
         except Exception as e:
             logger.error(f"!! {id_kode} data acquisition error: {e}")
-            log_default_and_continue(reason="Data Acquisition Error")
+            log_default_and_continue(id_kode, ch, reason="Data Acquisition Error")
             continue
 
         if sig is None or sig.count() == 0:
             logger.info(f"!! {id_kode} No Data found (source: {waveform_source})")
-            log_default_and_continue(reason="No Data")
+            log_default_and_continue(id_kode, ch, reason="No Data")
             continue
 
         logger.debug(f"{id_kode} Waveform acquisition complete")
@@ -286,7 +318,7 @@ def process_station_data(sta_tuple):
         
         if not inv:
             logger.warning(f"!! {id_kode} Got data but NO INVENTORY (source: {inventory_source}). Skipping.")
-            log_default_and_continue(reason="No Inventory")
+            log_default_and_continue(id_kode, ch, reason="No Inventory")
             continue
         
         # --- 3. Save Waveform & Plot ---
@@ -301,20 +333,58 @@ def process_station_data(sta_tuple):
         except Exception as e:
             signal.alarm(0)
             logger.error(f"{id_kode} saving exception: {e}")
-            log_default_and_continue(cha=ch, reason="Save waveform/plot failed")
+            log_default_and_continue(id_kode, ch, reason="Save waveform/plot failed")
             continue
-        
-        # --- 4. Process Basic Metrics ---
-        try:
-            logger.debug(f"{id_kode} Process basic info")
-            spike_method = basic_config.get('spike_method', 'fast').lower()
 
-            metrics = basic_metrics.process_basic_metrics(
-                sig, 
-                time0, 
+        prepared[ch] = (sig, inv, cha)
+
+    psd_engine = (basic_config.get('psd_engine') or 'obspy').lower()
+    psd_parallel_min_rate = basic_config.get('psd_parallel_min_rate')
+    psd_threads = basic_config.get('threads_per_worker') or 1
+    ppsd_archive_root = basic_config.get('outputppsdarchive') or ''
+    defer_plot = (basic_config.get('ppsd_plot') or 'inline').lower() == 'deferred'
+    dead_prefilter = (basic_config.get('dead_prefilter') or 'off').lower() == 'on'
+    ppsd_min_period = basic_config.get('ppsd_min_period') or 0.0
+    hourly_metrics = (basic_config.get('hourly_metrics') or 'off').lower() == 'on'
+
+    held_mb = sum(tr.data.nbytes for item in prepared.values() for tr in item[0]) / 1024**2
+    logger.debug(f"{network}.{kode} holding {held_mb:.0f} MB of waveforms for {len(prepared)} component(s)")
+
+    # --- 4. Process Basic Metrics (all components in one batched call) ---
+    spike_method = basic_config.get('spike_method', 'fast').lower()
+    basic_kwargs = dict(
+        spike_method=spike_method,
+        spike_max_block_mb=basic_config.get('spike_max_block_mb') or basic_metrics.DEFAULT_SPIKE_MAX_BLOCK_MB,
+        spike_mad=basic_config.get('spike_mad') or basic_metrics.DEFAULT_SPIKE_MAD,
+        memory_budget_bytes=_worker_memory_budget(sta_tuple) if spike_method == 'auto' else None,
+        metrics_dtype=basic_config.get('metrics_dtype') or basic_metrics.DEFAULT_METRICS_DTYPE,
+        threads=basic_config.get('threads_per_worker') or 1,
+        amplitude_sketch=bool(outputsketch),
+        hourly=hourly_metrics
+    )
+    station_metrics = {}
+    if prepared:
+        try:
+            logger.debug(f"{network}.{kode} Process basic info for components {list(prepared)}")
+            station_metrics = basic_metrics.process_station_basic_metrics(
+                {ch: item[0] for ch, item in prepared.items()},
+                time0,
                 time1,
-                spike_method=spike_method
+                **basic_kwargs
             )
+        except Exception as e:
+            logger.warning(f"{network}.{kode} batched basic info failed ({e}), computing per component")
+
+    # --- Main Loop (per component) ---
+    for ch in list(prepared):
+        id_kode = f"{kode}_{ch}_{tgl}"
+        sig, inv, cha = prepared.pop(ch)
+
+        try:
+            metrics = station_metrics.get(ch)
+            if metrics is None:
+                logger.debug(f"{id_kode} Process basic info")
+                metrics = basic_metrics.process_basic_metrics(sig, time0, time1, **basic_kwargs)
             
             basic_metrics_dict = {
                 'rms': str(round(float(metrics['rms']), 2)),
@@ -322,50 +392,85 @@ def process_station_data(sta_tuple):
                 'psdata': str(round(float(metrics['psdata']), 2)),
                 'ngap': str(int(metrics['ngap'])),
                 'nover': str(int(metrics['nover'])),
-                'num_spikes': str(int(metrics['num_spikes']))
+                'num_spikes': str(int(metrics['num_spikes'])),
+                'hourly': metrics.get('hourly')
             }
 
         except Exception as e:
             logger.error(f"{id_kode} basic info exception: {e}")
-            log_default_and_continue(cha=cha, reason="Basic metrics failed")
+            log_default_and_continue(id_kode, cha, reason="Basic metrics failed")
             continue
+
+        if metrics.get('sketch') is not None:
+            try:
+                save_sketch(os.path.join(outputsketch, f"{sig[0].id}.npz"), metrics['sketch'])
+                logger.debug(
+                    f"{id_kode} amplitude P01/P50/P99 {metrics['amp_p01']:.1f}/{metrics['amp_p50']:.1f}/"
+                    f"{metrics['amp_p99']:.1f}, MAD {metrics['amp_mad']:.1f}"
+                )
+            except Exception as e:
+                logger.warning(f"{id_kode} could not save amplitude sketch: {e}")
         
         # # --- 5. High Gap Check ---
         # if int(basic_metrics_dict['ngap']) > 2000:
         #     logger.warning(f"{id_kode} high gap ({basic_metrics_dict['ngap']}) - Continuing with default")
-        #     log_default_and_continue(basic_metrics_dict, cha, reason="High gap count")
+        #     log_default_and_continue(id_kode, cha, basic_metrics_dict, reason="High gap count")
         #     continue
             
         # --- 6. Process PPSD Metrics ---
         logger.debug(f"{id_kode} Process PPSD metrics")
         plot_filename = f"{outputPDF}/{kode}_{cha[-1]}_PDF.png"
         npz_path = outputPSD if pdf_trigger else ''
+
+        # Heavy channels: hourly segment blocks on the worker's threads (native engine)
+        ppsd_kwargs = dict(engine=psd_engine, archive_root=ppsd_archive_root, archive_day=str(tgl),
+                           defer_plot=defer_plot, min_period=ppsd_min_period)
+        fs = sig[0].stats.sampling_rate
+        if psd_parallel_min_rate and psd_threads > 1 and fs >= psd_parallel_min_rate and not npz_path:
+            logger.debug(f"{id_kode} {fs:g} Hz channel, PSD segments on {psd_threads} threads")
+            ppsd_kwargs.update(engine='native', threads=psd_threads)
         
+        # Flatlined channels: cheap screen on the envelope, no PPSD or plot
         final_metrics = None
-        try:
-            signal.alarm(1200) # 20 min timeout
-            final_metrics = ppsd_metrics.process_ppsd_metrics(
-                sig, 
-                inv, 
-                plot_filename=plot_filename, 
-                npz_output_path=npz_path
-            )
-            signal.alarm(0)
-        except TimeoutError:
-            signal.alarm(0)
-            logger.error(f"{id_kode} PPSD metric processing timed out")
-            log_default_and_continue(basic_metrics_dict, cha, reason="PPSD processing timeout")
-            continue
-        except Exception as e:
-            signal.alarm(0)
-            logger.error(f"{id_kode} PPSD metric processing failed: {e}")
-            log_default_and_continue(basic_metrics_dict, cha, reason="PPSD processing error")
-            continue
+        if dead_prefilter and not npz_path:
+            try:
+                screen = screen_dead_channel(sig)
+                if screen.dead:
+                    final_metrics = dead_channel_metrics(sig, screen.reason)
+                    skipped = "PPSD skipped" if final_metrics else "running the full PPSD"
+                    logger.warning(f"{id_kode} dead channel ({screen.reason}), {skipped}")
+            except Exception as e:
+                logger.warning(f"{id_kode} dead-channel screen failed ({e}), running the full PPSD")
+
+        if final_metrics is None:
+            try:
+                signal.alarm(1200) # 20 min timeout
+                final_metrics = ppsd_metrics.process_ppsd_metrics(
+                    sig, 
+                    inv, 
+                    plot_filename=plot_filename, 
+                    npz_output_path=npz_path,
+                    **ppsd_kwargs
+                )
+                signal.alarm(0)
+            except TimeoutError:
+                signal.alarm(0)
+                logger.error(f"{id_kode} PPSD metric processing timed out")
+                log_default_and_continue(id_kode, cha, basic_metrics_dict, reason="PPSD processing timeout")
+                continue
+            except Exception as e:
+                signal.alarm(0)
+                logger.error(f"{id_kode} PPSD metric processing failed: {e}")
+                log_default_and_continue(id_kode, cha, basic_metrics_dict, reason="PPSD processing error")
+                continue
+
+        # The PPSD was the last use of this component's stream and inventory
+        del sig, inv
 
         # --- 7. Check PPSD Result ---
         if not final_metrics:
             logger.warning(f"{id_kode} PPSD metrics returned None. Skipping with defaults.")
-            log_default_and_continue(basic_metrics_dict, cha, reason="PPSD calculation failed")
+            log_default_and_continue(id_kode, cha, basic_metrics_dict, reason="PPSD calculation failed")
             continue
             
         # --- 8. Commit Full Result ---
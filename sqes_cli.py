@@ -77,6 +77,12 @@ Examples:
   
   # Run single day with mseed and npz saved
   ./sqes_cli.py --date 20230101 --mseed --ppsd
+
+  # Quick availability/gap check from SDS MiniSEED headers only (no DB writes)
+  ./sqes_cli.py --date 20230101 --availability-only -v
+
+  # Render the PDF plots stored by a 'ppsd_plot = deferred' run
+  ./sqes_cli.py --date-range 20230101 20230103 --render -v
 """
     )
     
@@ -131,6 +137,16 @@ Examples:
         action="store_true",
         help="Save the downloaded waveform data as MiniSEED files."
     )
+    parser.add_argument(
+        "--availability-only",
+        action="store_true",
+        help="Only report availability, gaps and overlaps of SDS stations by scanning MiniSEED record headers (no data decoding, no metrics, no database writes)."
+    )
+    parser.add_argument(
+        "--render",
+        action="store_true",
+        help="Only render the PDF plots stored by a 'ppsd_plot = deferred' run for the given date(s) (no metrics, no database writes)."
+    )
     parser.add_argument(
         "-f", "--flush",
         action="store_true",
@@ -324,6 +340,18 @@ if __name__ == "__main__":
     if args.flush and args.date_range:
         logger.error("--flush can only be used with --date, not --date-range.")
         sys.exit(1)
+
+    if args.flush and args.availability_only:
+        logger.error("--flush can not be used with --availability-only.")
+        sys.exit(1)
+
+    if args.flush and args.render:
+        logger.error("--flush can not be used with --render.")
+        sys.exit(1)
+
+    if args.render and args.availability_only:
+        logger.error("--render can not be used with --availability-only.")
+        sys.exit(1)
         
     start_date_str = ""
     end_date_str = ""
@@ -354,7 +382,9 @@ if __name__ == "__main__":
             flush=args.flush,
             log_level=log_level,
             log_file_path=log_file_path,
-            basic_config=basic_config
+            basic_config=basic_config,
+            availability_only=args.availability_only,
+            render_only=args.render
         )
             
     except Exception as e:
@@ -4,7 +4,13 @@ import numpy as np
 from obspy import Stream, Trace, UTCDateTime
 
 # Import the *only* public function you want to test
-from sqes.core.basic_metrics import process_basic_metrics
+from sqes.core.basic_metrics import process_basic_metrics, process_station_basic_metrics
+from sqes.core.basic_metrics import (
+    _calculate_spikes, _spikes_streaming, _spikes_chunked, _spikes_vectorized,
+    _select_spike_engine, _trace_stats, _calculate_rms, _calculate_stream_amplitude,
+    GapSummary, _calculate_percent_availability, _calculate_gaps_overlaps,
+    _estimate_spike_memory, _aligned_components, _spikes_approx, _window_matrix_median
+)
 
 # --- Fixtures: Reusable Test Data (Unchanged) ---
 
@@ -116,4 +122,506 @@ def test_process_basic_metrics_spikes(stream_with_spike, stream_with_edge_spike)
     metrics_edge_eff = process_basic_metrics(
         "file.mseed", stream_with_edge_spike, t0, t1, spike_method='efficient'
     )
-    assert metrics_edge_eff['num_spikes'] == "0"
\ No newline at end of file
+    assert metrics_edge_eff['num_spikes'] == "0"
+
+# --- Streaming spike engine ---
+
+def _noisy_stream_with_spikes(n=5000, seed=0, dtype=np.float64):
+    rng = np.random.default_rng(seed)
+    data = np.round(rng.normal(0, 3, n)).astype(dtype)
+    data[rng.choice(n, 40, replace=False)] = 500
+    tr = Trace(data=data, header={'starttime': UTCDateTime(0), 'sampling_rate': 1.0})
+    return Stream(traces=[tr])
+
+
+@pytest.mark.parametrize("wn", [80, 10, 7])
+def test_streaming_spikes_match_fast(wn):
+    st = _noisy_stream_with_spikes()
+    assert _calculate_spikes(st, wn, 3, 'streaming') == _calculate_spikes(st, wn, 3, 'fast')
+
+
+def test_streaming_spikes_match_fast_int32():
+    st = _noisy_stream_with_spikes(dtype=np.int32)
+    assert _calculate_spikes(st, 80, 3, 'streaming') == _calculate_spikes(st, 80, 3, 'fast')
+
+
+def test_streaming_spikes_ignore_nan_windows():
+    st = _noisy_stream_with_spikes()
+    st[0].data[2000:2003] = np.nan
+    assert _calculate_spikes(st, 80, 3, 'streaming') == _calculate_spikes(st, 80, 3, 'fast')
+
+
+def test_streaming_spikes_single_and_edge_spike(stream_with_spike, stream_with_edge_spike):
+    assert _calculate_spikes(stream_with_spike, 80, 10, 'streaming') == 1
+    assert _calculate_spikes(stream_with_edge_spike, 80, 10, 'streaming') == 0
+
+
+def test_streaming_spikes_block_boundaries():
+    """Block size must not change the result."""
+    data = _noisy_stream_with_spikes(n=3000)[0].data
+    expected = _spikes_streaming(data, 80, 3)
+    assert _spikes_streaming(data, 80, 3, block_size=7) == expected
+
+
+# --- Chunked spike engine ---
+
+@pytest.mark.parametrize("max_block_mb", [0.001, 0.05, 0.3, 256.0])
+def test_chunked_spikes_match_fast(max_block_mb):
+    """Halo samples keep windows at block boundaries exact for any block size."""
+    st = _noisy_stream_with_spikes()
+    expected = _calculate_spikes(st, 80, 3, 'fast')
+    assert _calculate_spikes(st, 80, 3, 'chunked', max_block_mb) == expected
+
+
+def test_chunked_spikes_block_rows():
+    data = _noisy_stream_with_spikes(n=2000)[0].data
+    # 0.01 MB / (81 samples * 16 bytes) -> 8 windows per block
+    assert _spikes_chunked(data, 80, 3, max_block_mb=0.01) == _spikes_vectorized(data, 80, 3)
+
+
+# --- Spike MAD reference ---
+
+def _original_fast_spikes(data, wn, sigma):
+    """The original 'fast' engine: MAD around the median of the whole window matrix."""
+    data = data.astype(np.float64)
+    window_size = wn + 1
+    A, B = np.meshgrid(np.arange(window_size), np.arange(0, len(data) - wn))
+    x_array = data[A + B]
+    mad = np.median(np.abs(x_array - np.median(x_array)), axis=1)
+    x_median = np.median(x_array, axis=1)
+    difference = np.abs(data[window_size // 2 : window_size // 2 + len(x_median)] - x_median)
+    threshold = 1.4826 * sigma * mad + 1e-9
+    return int(np.sum((threshold > 0) & (difference > threshold)))
+
+
+def _drifting_stream_with_spikes(n=6000, seed=4):
+    """Noise on a slow drift much larger than the noise, with moderate spikes."""
+    rng = np.random.default_rng(seed)
+    data = np.round(rng.normal(0, 5, n) + 2000 * np.sin(np.arange(n) / 3000))
+    data[rng.choice(np.arange(100, n - 100), 30, replace=False)] += 600
+    return Stream([Trace(data=data, header={'starttime': UTCDateTime(0), 'sampling_rate': 1.0})])
+
+
+@pytest.mark.parametrize("n", [200, 201, 1000])
+def test_window_matrix_median(n):
+    data = np.random.default_rng(n).integers(-50, 50, n).astype(np.float64)
+    windows = np.lib.stride_tricks.sliding_window_view(data, 81)
+    assert _window_matrix_median(data, 80) == np.median(windows)
+    # blocked selection (never sorts the whole trace) gives the same value
+    assert _window_matrix_median(data, 80, block_size=64) == np.median(windows)
+
+
+@pytest.mark.parametrize("method", ['fast', 'chunked', 'streaming', 'efficient', 'auto'])
+def test_trace_mad_matches_original_fast(method):
+    st = _drifting_stream_with_spikes()
+    expected = _original_fast_spikes(st[0].data, 80, 10)
+    kwargs = dict(max_block_mb=0.05, memory_budget_bytes=1024**2, spike_mad='trace')
+    assert _calculate_spikes(st, 80, 10, method, **kwargs) == expected
+
+
+@pytest.mark.parametrize("method", ['fast', 'chunked', 'streaming', 'efficient', 'auto'])
+def test_window_mad_engines_agree(method):
+    st = _drifting_stream_with_spikes()
+    window = _calculate_spikes(st, 80, 10, 'fast', spike_mad='window')
+    assert window == _spikes_vectorized(st[0].data, 80, 10)
+    kwargs = dict(max_block_mb=0.05, memory_budget_bytes=1024**2, spike_mad='window')
+    assert _calculate_spikes(st, 80, 10, method, **kwargs) == window
+    # the rolling MAD follows the drift, the trace-wide default does not
+    assert window >= 30 > _calculate_spikes(st, 80, 10, 'fast')
+
+
+# --- Automatic spike engine selection ---
+
+def test_select_spike_engine_by_budget():
+    npts, wn = 8_640_000, 80
+    assert _select_spike_engine(npts, wn, 256.0, 64 * 1024**3)[0] == 'fast'
+    engine, block_mb = _select_spike_engine(npts, wn, 256.0, 1 * 1024**3)
+    assert engine == 'chunked' and block_mb == 256.0
+    engine, block_mb = _select_spike_engine(npts, wn, 256.0, 100 * 1024**2)
+    assert engine == 'chunked' and block_mb == pytest.approx(80.0)
+    assert _select_spike_engine(npts, wn, 256.0, 512 * 1024)[0] == 'streaming'
+
+
+@pytest.mark.parametrize("budget", [64 * 1024**3, 5 * 1024**2, 1024])
+def test_auto_spikes_match_fast(budget):
+    st = _noisy_stream_with_spikes()
+    expected = _calculate_spikes(st, 80, 3, 'fast')
+    assert _calculate_spikes(st, 80, 3, 'auto', memory_budget_bytes=budget) == expected
+
+
+def test_auto_spikes_fall_back_on_memory_error(monkeypatch):
+    """A MemoryError in the chosen engine must not turn into 0 spikes."""
+    from sqes.core import basic_metrics
+    st = _noisy_stream_with_spikes()
+    expected = _calculate_spikes(st, 80, 3, 'fast')
+
+    def _raise(*args, **kwargs):
+        raise MemoryError
+    monkeypatch.setattr(basic_metrics, '_spikes_vectorized', _raise)
+
+    assert expected > 0
+    assert _calculate_spikes(st, 80, 3, 'auto', memory_budget_bytes=64 * 1024**3) == expected
+
+
+# --- Fused single-pass statistics kernel ---
+
+def test_trace_stats_matches_numpy():
+    rng = np.random.default_rng(3)
+    data = rng.normal(1e6, 3.0, 200_000)
+    data[[10, 70_000, 150_000]] = np.nan
+    stats = _trace_stats(data, block_size=4096)
+
+    assert stats.npts == len(data)
+    assert stats.nan_count == 3
+    assert stats.min == np.nanmin(data)
+    assert stats.max == np.nanmax(data)
+    expected_rms = np.sqrt(np.nanmean(np.square(data - np.nanmean(data))))
+    assert stats.rms == pytest.approx(expected_rms, rel=1e-9)
+
+
+def test_trace_stats_masked_and_empty():
+    masked = np.ma.masked_array([1.0, 2.0, 3.0, 100.0], mask=[0, 0, 0, 1])
+    stats = _trace_stats(masked)
+    assert stats.count == 3
+    assert stats.max == 3.0
+
+    assert _trace_stats(np.array([])).count == 0
+    assert _trace_stats(np.array([np.nan, np.nan])).count == 0
+
+
+def test_rms_and_amplitude_from_trace_stats(sample_stream, stream_with_gap):
+    assert _calculate_rms(sample_stream) == pytest.approx(1.707825, abs=1e-6)
+    assert _calculate_stream_amplitude(sample_stream) == (5.0, 0.0)
+
+    nan_trace = Trace(data=np.full(5, np.nan))
+    st = Stream(traces=[nan_trace]) + stream_with_gap
+    assert _calculate_rms(st) == 0.0
+    assert _calculate_stream_amplitude(st) == (1.0, 1.0)
+
+
+def test_trace_stats_int32_exact():
+    data = (np.random.default_rng(5).normal(0, 3000, 200_001) + 2_000_000).astype(np.int32)
+    stats = _trace_stats(data, block_size=4096)
+    as_float = _trace_stats(data.astype(np.float64), block_size=4096)
+
+    assert isinstance(stats.sum, int) and isinstance(stats.sumsq, int)
+    assert (stats.min, stats.max) == (float(data.min()), float(data.max()))
+    assert stats.rms == np.std(data.astype(np.float64))
+    assert stats.rms == pytest.approx(as_float.rms, rel=1e-12)
+
+    # full int32 range: squares no longer fit int64 per block
+    extremes = np.array([2**31 - 1, -2**31] * 1000, dtype=np.int32)
+    assert _trace_stats(extremes).rms == pytest.approx(2**31 - 0.5)
+
+
+def test_spikes_int32_match_float64():
+    ints = _noisy_stream_with_spikes(n=20_000, seed=6, dtype=np.int32)[0].data
+    expected = _spikes_vectorized(ints.astype(np.float64), 80, 10)
+    assert _spikes_vectorized(ints, 80, 10) == expected
+    assert _spikes_chunked(ints, 80, 10, max_block_mb=0.1) == expected
+    assert expected > 0
+
+
+@pytest.mark.parametrize("method", ['fast', 'chunked'])
+def test_trace_mad_int32_match_float64(method):
+    # alternating 0/1 with mirrored spikes: the trace-wide median is 0.5
+    n = 6000
+    data = np.tile([0, 1], n // 2)
+    idx = np.arange(0, n // 2, 97)
+    data[idx] = np.where(idx % 2 == 0, 3, -2)
+    data[n - 1 - idx] = np.where(idx % 2 == 0, -2, 3)
+    assert _window_matrix_median(data, 80) == 0.5
+    ints = Stream(traces=[Trace(data=data.astype(np.int32), header={'sampling_rate': 1.0})])
+    floats = Stream(traces=[Trace(data=data.astype(np.float64), header={'sampling_rate': 1.0})])
+    kwargs = dict(max_block_mb=0.1, spike_mad='trace')
+    expected = _calculate_spikes(floats, 80, 2, method, **kwargs)
+    assert expected > 0
+    assert _calculate_spikes(ints, 80, 2, method, **kwargs) == expected
+
+
+# --- Read-only (zero-copy) contract ---
+
+def test_process_basic_metrics_does_not_copy_or_mutate_input():
+    import tracemalloc
+    t0 = UTCDateTime(0)
+    data = np.random.default_rng(4).normal(0, 1, 400_000)
+    original = data.copy()
+    st = Stream(traces=[Trace(data=data, header={'starttime': t0, 'sampling_rate': 100.0})])
+
+    tracemalloc.start()
+    process_basic_metrics(st, t0, t0 + 86400, spike_method='chunked', spike_max_block_mb=0.25)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # A Stream.copy() alone would allocate data.nbytes (3.2 MB)
+    assert peak < data.nbytes / 2
+    assert st[0].data is data
+    np.testing.assert_array_equal(st[0].data, original)
+
+
+# --- Header-only gap summary ---
+
+def test_gap_summary_matches_get_gaps(stream_with_gap):
+    overlap = Trace(data=np.ones(5), header={'starttime': UTCDateTime(12), 'sampling_rate': 1.0})
+    st = stream_with_gap + Stream(traces=[overlap])
+
+    summary = GapSummary.from_stream(st)
+
+    assert summary.gaps == [g[:8] for g in st.get_gaps()]
+    assert (summary.gap_count, summary.overlap_count) == (1, 1)
+
+
+def test_gap_summary_masked_trace(stream_with_gap):
+    merged = stream_with_gap.copy().merge()
+    summary = GapSummary.from_stream(merged)
+    assert summary.gap_count == 1
+    assert summary.gap_duration == pytest.approx(5.0)
+
+
+def test_gap_summary_from_headers_only():
+    """Availability and gap counts without any sample data."""
+    t0 = UTCDateTime("2024-01-01")
+    segments = [
+        ('IA', 'ABC', '', 'BHZ', t0 + 43200, t0 + 86399.99, 100.0),
+        ('IA', 'ABC', '', 'BHZ', t0, t0 + 36000 - 0.01, 100.0),
+    ]
+    summary = GapSummary.from_segments(segments)
+
+    assert (summary.gap_count, summary.overlap_count) == (1, 0)
+    assert summary.gap_duration == pytest.approx(7200.0)
+    assert summary.availability(t0, t0 + 86400) == pytest.approx(91.67)
+
+
+def test_availability_and_gaps_share_summary(stream_with_gap):
+    t0 = UTCDateTime(0)
+    summary = GapSummary.from_stream(stream_with_gap)
+    # Span 0..14 s minus the 5 s gap
+    assert _calculate_percent_availability(stream_with_gap, t0, t0 + 100, summary) == 9.0
+    assert _calculate_gaps_overlaps(stream_with_gap, summary) == (1, 0)
+    assert _calculate_percent_availability(Stream(), t0, t0 + 100) == 0.0
+
+
+# --- float32 processing mode parity ---
+
+def _stored_metrics(metrics):
+    """Metrics as station_processor stores them."""
+    return {
+        'rms': str(round(float(metrics['rms']), 2)),
+        'ratioamp': str(round(float(metrics['ratioamp']), 2)),
+        'psdata': str(round(float(metrics['psdata']), 2)),
+        'ngap': str(int(metrics['ngap'])),
+        'nover': str(int(metrics['nover'])),
+        'num_spikes': str(int(metrics['num_spikes'])),
+    }
+
+
+def _parity_streams():
+    rng = np.random.default_rng(9)
+    t0 = UTCDateTime("2024-01-01")
+    header = {'starttime': t0, 'sampling_rate': 20.0, 'station': 'ABC', 'channel': 'BHZ'}
+
+    # int32 counts with a DC offset and spikes (typical Steim-decoded day)
+    counts = (rng.normal(0, 4000, 60_000) + 150_000).astype(np.int32)
+    counts[rng.choice(len(counts), 50, replace=False)] += 400_000
+    yield Stream([Trace(data=counts, header=dict(header))])
+
+    # two int32 segments merged into one masked trace (gap in between)
+    a = Trace(data=counts[:20_000].copy(), header=dict(header))
+    b = Trace(data=counts[30_000:].copy(), header=dict(header, starttime=t0 + 1500))
+    yield Stream([a, b]).merge()
+
+    # float64 data with fractional values and an overlap
+    floats = rng.normal(0, 250.0, 40_000) + 1e4
+    floats[::1013] += 9_000.0
+    c = Trace(data=floats, header=dict(header))
+    d = Trace(data=floats[:5_000].copy(), header=dict(header, starttime=t0 + 1900))
+    yield Stream([c, d])
+
+
+@pytest.mark.parametrize("method", ['fast', 'chunked', 'auto'])
+def test_float32_mode_stores_same_metrics(method):
+    t0 = UTCDateTime("2024-01-01")
+    for st in _parity_streams():
+        kwargs = dict(spike_method=method, spike_max_block_mb=0.5, memory_budget_bytes=4 * 1024**2)
+        ref = process_basic_metrics(st, t0, t0 + 86400, metrics_dtype='float64', **kwargs)
+        single = process_basic_metrics(st, t0, t0 + 86400, metrics_dtype='float32', **kwargs)
+        assert _stored_metrics(single) == _stored_metrics(ref)
+        assert ref['num_spikes'] > 0
+
+
+def test_float32_halves_spike_block_footprint():
+    f64 = _estimate_spike_memory(1_000_000, 80, 'fast', dtype=np.float64)
+    f32 = _estimate_spike_memory(1_000_000, 80, 'fast', dtype=np.float32)
+    assert f32 == pytest.approx(f64 / 2)
+
+
+# --- Batched three-component metrics ---
+
+def _three_components(dtype=np.int32, npts=30_000, seed=11):
+    rng = np.random.default_rng(seed)
+    t0 = UTCDateTime("2024-01-01")
+    streams = {}
+    for i, comp in enumerate("ENZ"):
+        data = (rng.normal(0, 2000 * (i + 1), npts) + 10_000 * i).astype(dtype)
+        data[rng.choice(npts, 30, replace=False)] += 200_000
+        header = {'starttime': t0, 'sampling_rate': 20.0, 'channel': f'BH{comp}'}
+        streams[comp] = Stream([Trace(data=data, header=header)])
+    return streams
+
+
+@pytest.mark.parametrize("dtype", [np.int32, np.float64])
+@pytest.mark.parametrize("method", ['fast', 'chunked', 'auto'])
+def test_station_metrics_match_per_component(dtype, method):
+    t0 = UTCDateTime("2024-01-01")
+    streams = _three_components(dtype)
+    assert _aligned_components(streams) is not None
+
+    kwargs = dict(spike_method=method, spike_max_block_mb=0.5, memory_budget_bytes=64 * 1024**2)
+    batched = process_station_basic_metrics(streams, t0, t0 + 86400, **kwargs)
+    expected = {comp: process_basic_metrics(st, t0, t0 + 86400, **kwargs) for comp, st in streams.items()}
+    assert batched == expected
+    assert all(m['num_spikes'] > 0 for m in batched.values())
+
+
+def test_station_metrics_ragged_components_fall_back():
+    t0 = UTCDateTime("2024-01-01")
+    streams = _three_components()
+    streams['N'] = streams['N'].slice(t0, t0 + 1000)        # shorter
+    streams['Z'] = streams['Z'] + streams['Z'].copy().slice(t0 + 1400, t0 + 1450)  # two traces
+    assert _aligned_components(streams) is None
+
+    batched = process_station_basic_metrics(streams, t0, t0 + 86400)
+    expected = {comp: process_basic_metrics(st, t0, t0 + 86400) for comp, st in streams.items()}
+    assert batched == expected
+
+
+# --- Intra-worker thread pool ---
+
+def test_threaded_metrics_match_sequential():
+    t0 = UTCDateTime("2024-01-01")
+    st = _three_components()['Z']
+    # fragment the trace into several segments with gaps
+    fragmented = Stream([st.slice(t0 + i * 300, t0 + i * 300 + 250)[0] for i in range(5)])
+
+    for method in ('fast', 'chunked', 'streaming', 'auto'):
+        kwargs = dict(spike_method=method, spike_max_block_mb=0.5, memory_budget_bytes=64 * 1024**2)
+        sequential = process_basic_metrics(fragmented, t0, t0 + 86400, **kwargs)
+        threaded = process_basic_metrics(fragmented, t0, t0 + 86400, threads=4, **kwargs)
+        assert threaded == sequential
+
+    streams = _three_components()
+    streams['N'] = fragmented
+    assert process_station_basic_metrics(streams, t0, t0 + 86400, threads=3) == \
+        process_station_basic_metrics(streams, t0, t0 + 86400)
+
+
+# --- Hourly sub-window metrics ---
+
+def _hourly_stream(dtype=np.int32):
+    """Full day at 1 Hz with a 2-hour gap starting at 03:00 and spikes at 05:xx and 17:xx."""
+    rng = np.random.default_rng(21)
+    t0 = UTCDateTime("2024-01-01")
+    data = rng.normal(0, 100, 86400).astype(dtype)
+    data[5 * 3600 + 100] += 100_000
+    data[17 * 3600 + 5] += 100_000
+    tr = Trace(data=data, header={'starttime': t0, 'sampling_rate': 1.0})
+    st = Stream([tr.slice(t0, t0 + 3 * 3600 - 1), tr.slice(t0 + 5 * 3600, t0 + 86400 - 1)])
+    return st, data
+
+
+@pytest.mark.parametrize("method", ['fast', 'chunked', 'streaming', 'efficient', 'auto', 'approx'])
+def test_hourly_metrics_match_daily(method):
+    st, data = _hourly_stream()
+    t0 = UTCDateTime("2024-01-01")
+    kwargs = dict(spike_method=method, spike_max_block_mb=0.5, memory_budget_bytes=64 * 1024**2)
+    daily = process_basic_metrics(st, t0, t0 + 86400, **kwargs)
+    metrics = process_basic_metrics(st, t0, t0 + 86400, hourly=True, **kwargs)
+    hourly = metrics.pop('hourly')
+
+    assert metrics == daily
+    assert all(len(hourly[name]) == 24 for name in hourly)
+    assert hourly['num_spikes'].sum() == daily['num_spikes'] == 2
+    assert np.flatnonzero(hourly['num_spikes']).tolist() == [5, 17]
+    assert hourly['ngap'].sum() == daily['ngap'] == 1 and hourly['ngap'][2] == 1
+    assert hourly['availability'][[3, 4]].tolist() == [0.0, 0.0]
+    assert np.all(hourly['availability'][[0, 1, 2, 6, 12, 23]] == 100.0)
+    assert np.isnan(hourly['rms'][3]) and np.isnan(hourly['rms'][4])
+    hour = data[3600:7200].astype(np.float64)
+    assert hourly['rms'][1] == pytest.approx(hour.std())
+
+
+def test_hourly_stats_merge_across_traces():
+    st, data = _hourly_stream(np.float64)
+    t0 = UTCDateTime("2024-01-01")
+    hourly = process_basic_metrics(st, t0, t0 + 86400, hourly=True)['hourly']
+    for h in (0, 2, 5, 23):
+        assert hourly['rms'][h] == pytest.approx(data[h * 3600:(h + 1) * 3600].std())
+
+
+def test_station_hourly_metrics_match_per_component():
+    t0 = UTCDateTime("2024-01-01")
+    streams = _three_components()
+    batched = process_station_basic_metrics(streams, t0, t0 + 86400, hourly=True)
+    for comp, st in streams.items():
+        single = process_basic_metrics(st, t0, t0 + 86400, hourly=True)
+        for name in single['hourly']:
+            np.testing.assert_array_equal(batched[comp]['hourly'][name], single['hourly'][name])
+
+
+# --- Approximate (decimated grid) spike engine ---
+
+def _approx_relative_error(data, sigma=10, **kwargs):
+    exact = _spikes_vectorized(np.asarray(data, dtype=np.float64), 80, sigma)
+    approx = _spikes_approx(data, 80, sigma, **kwargs)
+    # candidates are re-tested exactly, so the engine can only undercount
+    assert approx <= exact
+    return exact, (exact - approx) / max(exact, 1)
+
+
+def test_approx_spikes_synthetic_error_bound():
+    rng = np.random.default_rng(5)
+    n = 200_000
+    data = rng.normal(0, 1000, n) + 3000 * np.sin(np.arange(n) / 5000)
+    data[rng.choice(n, 200, replace=False)] += rng.uniform(2e4, 2e5, 200)
+    for b in rng.choice(n - 3000, 10):
+        data[b:b + 3000] *= rng.uniform(3, 10)   # amplitude bursts
+
+    exact, error = _approx_relative_error(data.astype(np.int32))
+    assert exact >= 200 and error == 0.0
+    # NaN run, and small blocks: interpolation restarts at every block boundary
+    data[5000:5100] = np.nan
+    _, error = _approx_relative_error(data, max_block_mb=0.05)
+    assert error <= 0.01
+    # quantized low-amplitude data (MAD often 0 or 1) is the worst case
+    quantized = np.round(rng.normal(0, 0.6, 100_000)).astype(np.int32)
+    _, error = _approx_relative_error(quantized)
+    assert error <= 0.05
+
+
+def test_approx_spikes_next_to_gaps():
+    """Spikes within one grid hop of a NaN run are tested exactly, not skipped."""
+    rng = np.random.default_rng(8)
+    data = rng.normal(0, 100, 50_000)
+    for g0 in range(2_000, 48_000, 4_000):
+        data[g0:g0 + 300] = np.nan
+        for offset in (45, 52, 61, 75):  # clean windows, within one hop of the gap
+            data[g0 - offset] += 20_000
+            data[g0 + 300 + offset] += 20_000
+    exact = _spikes_vectorized(data, 80, 10)
+    assert exact == 12 * 8
+    for max_block_mb in (0.05, 256.0):
+        assert _spikes_approx(data, 80, 10, max_block_mb) == exact
+    assert _spikes_approx(data, 80, 10, hop=7) == exact
+
+
+def test_approx_spikes_real_traces_error_bound():
+    from obspy import read
+    for tr in read():   # ObsPy's bundled example event recording
+        for sigma in (3, 5, 10):
+            _, error = _approx_relative_error(tr.data, sigma)
+            assert error <= 0.05
+
+
+def test_approx_spike_method(stream_with_spike):
+    t0 = UTCDateTime(0)
+    assert process_basic_metrics(stream_with_spike, t0, t0 + 1000, spike_method='approx')['num_spikes'] == 1
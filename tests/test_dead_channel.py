@@ -0,0 +1,93 @@
+# tests/test_dead_channel.py
+import numpy as np
+import pytest
+from obspy import Stream, Trace, UTCDateTime, read_inventory
+
+from sqes.core.dead_channel import screen_dead_channel, dead_channel_metrics
+from sqes.core.ppsd_metrics import process_ppsd_metrics
+
+
+def _rjob_stream(data, sampling_rate=20.0):
+    """BW.RJOB..EHZ, a channel of ObsPy's bundled example inventory."""
+    tr = Trace(data=np.asarray(data, dtype=np.int32))
+    tr.stats.network, tr.stats.station, tr.stats.channel = "BW", "RJOB", "EHZ"
+    tr.stats.sampling_rate = sampling_rate
+    tr.stats.starttime = UTCDateTime("2009-08-24")
+    return Stream([tr])
+
+
+# --- Screen ---
+
+def _dead_data(reason, n):
+    if reason == "flatline":
+        return np.full(n, 123)
+    if reason == "constant":
+        data = np.full(n, 7)
+        data[1000:1400] = np.arange(400)  # a few glitches
+        return data
+    return np.random.default_rng(0).integers(-1, 2, n)  # +-1 count white noise
+
+
+@pytest.mark.parametrize("reason", ["flatline", "constant", "variance collapse"])
+def test_written_metrics_match_full_ppsd(reason):
+    data = _dead_data(reason, 6 * 3600 * 20)
+    st = _rjob_stream(data)
+    screen = screen_dead_channel(st)
+    assert screen.dead and screen.reason == reason
+
+    def full_ppsd(stream):
+        return process_ppsd_metrics(stream, read_inventory(), plot_filename='', npz_output_path='')
+
+    # only a flatline skips the PPSD; what is written always equals the full PPSD
+    fixed = dead_channel_metrics(st, screen.reason)
+    assert (fixed is not None) == (reason == "flatline")
+    assert (fixed or full_ppsd(st)) == full_ppsd(_rjob_stream(data))
+
+
+def test_constant_runs():
+    data = np.full(86400 * 20, 7)
+    data[1000:1400] = np.arange(400)  # a few glitches
+    screen = screen_dead_channel(_rjob_stream(data))
+    assert screen.dead and screen.reason == "constant"
+    assert screen.constant_fraction > 0.99
+
+
+def test_variance_collapse():
+    rng = np.random.default_rng(0)
+    screen = screen_dead_channel(_rjob_stream(rng.integers(-1, 2, 86400 * 20)))
+    assert screen.dead and screen.reason == "variance collapse"
+    assert abs(screen.psd_slope) < 1 and screen.psd_flatness > 0.9
+
+
+@pytest.mark.parametrize("case", ["noise", "quiet microseism"])
+def test_live_channels_pass(case):
+    rng = np.random.default_rng(0)
+    n = 86400 * 20
+    if case == "noise":
+        data = rng.normal(0, 1000, n)
+    else:
+        # Live but within +-1 count: the 6 s microseism makes the coarse PSD non-white
+        t = np.arange(n) / 20.0
+        data = (0.9 * np.sin(2 * np.pi * t / 6) + rng.normal(0, 0.3, n)).round()
+    screen = screen_dead_channel(_rjob_stream(data))
+    assert not screen.dead and screen.reason == ""
+
+
+@pytest.mark.parametrize("sampling_rate", [1.0, 0.1])
+def test_low_rate_noise_passes(sampling_rate):
+    # One-second blocks would be a single sample (trivially flat) at 1 Hz and below
+    rng = np.random.default_rng(0)
+    data = rng.normal(0, 1000, int(86400 * sampling_rate))
+    screen = screen_dead_channel(_rjob_stream(data, sampling_rate))
+    assert not screen.dead and screen.constant_fraction == 0.0
+
+    data = np.full(int(86400 * sampling_rate), 7)
+    assert screen_dead_channel(_rjob_stream(data, sampling_rate)).reason == "flatline"
+
+
+def test_gaps_and_empty_stream():
+    st = _rjob_stream(np.full(3600 * 20, 5)) + _rjob_stream(np.full(3600 * 20, 5))
+    st[1].stats.starttime += 7200
+    st.merge()  # masked gap in between
+    assert screen_dead_channel(st).reason == "flatline"
+    assert not screen_dead_channel(Stream()).dead
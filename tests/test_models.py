@@ -71,4 +71,53 @@ def test_get_models_empty(standard_powers):
     
     assert len(nhnm) == 0
     assert len(nlnm) == 0
-    assert len(p_idx) == 0
\ No newline at end of file
+    assert len(p_idx) == 0
+
+def _reference_models(periods):
+    """Per-period evaluation of the Peterson breakpoint tables (the original loop)."""
+    nhnm, nlnm, idx = [], [], []
+    for i, period in enumerate(periods):
+        high = [j for j, p in enumerate(models.Ph) if period > p]
+        low = [j for j, p in enumerate(models.Pl) if period > p]
+        if not high or not low or high[-1] >= len(models.Ah) or low[-1] >= len(models.Al):
+            continue
+        nhnm.append(models.Ah[high[-1]] + models.Bh[high[-1]] * np.log10(period))
+        nlnm.append(models.Al[low[-1]] + models.Bl[low[-1]] * np.log10(period))
+        idx.append(i)
+    return np.array(nhnm), np.array(nlnm), idx
+
+def test_get_models_matches_reference(standard_powers):
+    """
+    Tests the vectorized evaluation against the per-period loop,
+    including periods exactly on the breakpoints and NaN.
+    """
+    rng = np.random.default_rng(0)
+    periods = np.concatenate([
+        np.logspace(-2.5, 6, 400), models.Ph, models.Pl,
+        rng.uniform(0, 2e5, 200), [np.nan]
+    ])
+
+    nhnm, nlnm, p_idx = models.get_models(periods, standard_powers)
+    ref_nhnm, ref_nlnm, ref_idx = _reference_models(periods)
+
+    assert p_idx == ref_idx
+    np.testing.assert_allclose(nhnm, ref_nhnm, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(nlnm, ref_nlnm, rtol=0, atol=1e-9)
+
+def test_get_models_cached_per_grid(standard_powers):
+    """
+    Tests that a repeated period grid is served from the cache and that
+    the cached arrays can not be modified by a caller.
+    """
+    models._models_for_grid.cache_clear()
+    periods = np.logspace(-1, 2, 100)
+
+    first = models.get_models(periods, standard_powers)
+    second = models.get_models(periods.copy(), standard_powers)
+    info = models._models_for_grid.cache_info()
+
+    assert (info.hits, info.misses) == (1, 1)
+    assert first[0] is second[0]
+    assert first[2] == second[2] and first[2] is not second[2]
+    with pytest.raises(ValueError):
+        first[0][0] = 0.0
@@ -0,0 +1,88 @@
+# tests/test_pdf_plots.py
+import os
+
+import numpy as np
+import pytest
+from obspy import Stream, Trace, UTCDateTime, read_inventory
+
+from sqes.core.pdf_plots import (
+    plot_data_path, save_plot_histogram, render_plot_histogram, pending_plots, render_pending_plots
+)
+from sqes.core.psd_engine import calculate_psd_histogram
+from sqes.core.ppsd_metrics import process_ppsd_metrics, _create_ppsd_object
+from sqes.workflows.render_plots import run_render
+
+
+def _rjob_stream(hours=4):
+    """Noise on BW.RJOB..EHZ, a channel of ObsPy's bundled example inventory."""
+    rng = np.random.default_rng(0)
+    tr = Trace(data=rng.normal(0, 1000, hours * 3600 * 20).astype(np.int32))
+    tr.stats.network, tr.stats.station, tr.stats.channel = "BW", "RJOB", "EHZ"
+    tr.stats.sampling_rate = 20.0
+    tr.stats.starttime = UTCDateTime("2009-08-24")
+    return Stream([tr])
+
+
+# --- Deferred plots ---
+
+def test_deferred_plot_stores_histogram_only(tmp_path):
+    plot_filename = str(tmp_path / "RJOB_Z_PDF.png")
+    inline = process_ppsd_metrics(_rjob_stream(), read_inventory(), plot_filename='', npz_output_path='')
+    deferred = process_ppsd_metrics(_rjob_stream(), read_inventory(), plot_filename=plot_filename,
+                                    npz_output_path='', defer_plot=True)
+
+    assert deferred == inline
+    assert not os.path.exists(plot_filename)
+    assert os.path.exists(plot_data_path(plot_filename))
+    assert pending_plots(str(tmp_path)) == [plot_data_path(plot_filename)]
+
+    assert render_plot_histogram(plot_data_path(plot_filename)) == plot_filename
+    assert os.path.getsize(plot_filename) > 0
+    assert pending_plots(str(tmp_path)) == []
+    assert pending_plots(str(tmp_path), force=True) == [plot_data_path(plot_filename)]
+
+
+@pytest.mark.parametrize("engine", ["obspy", "native"])
+def test_stored_histogram_matches_ppsd(tmp_path, engine):
+    st, inv = _rjob_stream(), read_inventory()
+    ppsds = _create_ppsd_object(st, inv) if engine == "obspy" else calculate_psd_histogram(st, inv)
+    path = str(tmp_path / "RJOB_Z_PDF.npz")
+    save_plot_histogram(path, ppsds)
+
+    with np.load(path) as npz:
+        hist = ppsds.current_histogram if engine == "obspy" else ppsds.histogram
+        np.testing.assert_array_equal(npz['hist'], hist)
+        np.testing.assert_allclose(npz['period_xedges'], ppsds.period_xedges)
+        assert int(npz['psd_segments']) == 7
+        assert str(npz['title']) == "BW.RJOB..EHZ   2009-08-24 -- 2009-08-24  (7 segments)"
+
+
+# --- Rendering ---
+
+def test_render_pending_plots(tmp_path):
+    hist = calculate_psd_histogram(_rjob_stream(), read_inventory())
+    for kode in ("AAA", "BBB"):
+        for comp in "ENZ":
+            save_plot_histogram(str(tmp_path / f"{kode}_{comp}_PDF.npz"), hist)
+
+    assert render_pending_plots(str(tmp_path), stations=["AAA"]) == (3, 0)
+    assert sorted(f for f in os.listdir(tmp_path) if f.endswith(".png")) == \
+        ["AAA_E_PDF.png", "AAA_N_PDF.png", "AAA_Z_PDF.png"]
+    assert render_pending_plots(str(tmp_path), processes=2) == (3, 0)
+    assert render_pending_plots(str(tmp_path)) == (0, 0)
+
+
+def test_render_reports_broken_files(tmp_path):
+    (tmp_path / "AAA_Z_PDF.npz").write_bytes(b"not a histogram")
+    assert render_pending_plots(str(tmp_path)) == (0, 1)
+
+
+def test_run_render_for_a_day(tmp_path):
+    day_dir = tmp_path / "2009-08-24"
+    day_dir.mkdir()
+    save_plot_histogram(str(day_dir / "RJOB_Z_PDF.npz"), calculate_psd_histogram(_rjob_stream(), read_inventory()))
+    basic_config = {'outputpdf': str(tmp_path)}
+
+    assert run_render("20090824", basic_config) == (1, 0)
+    assert (day_dir / "RJOB_Z_PDF.png").exists()
+    assert run_render("20090825", basic_config) == (0, 0)
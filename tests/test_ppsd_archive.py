@@ -0,0 +1,102 @@
+# tests/test_ppsd_archive.py
+import numpy as np
+import pytest
+from obspy import Stream, Trace, UTCDateTime, read_inventory
+
+from sqes.core.ppsd_archive import (
+    PPSDAccumulator, accumulate_daily_ppsd, archive_path, load_accumulator
+)
+from sqes.core.psd_engine import PSDHistogram, calculate_psd_histogram
+from sqes.core.ppsd_metrics import _create_ppsd_object, process_ppsd_metrics
+
+
+def _rjob_day(day, seed, hours=6, sampling_rate=20.0):
+    """A few hours of noise on BW.RJOB..EHZ (ObsPy's bundled example inventory)."""
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * sampling_rate)
+    tr = Trace(data=(np.cumsum(rng.normal(0, 50, n)) + rng.normal(0, 1000 * (seed + 1), n)).astype(np.int32))
+    tr.stats.network, tr.stats.station, tr.stats.channel = "BW", "RJOB", "EHZ"
+    tr.stats.sampling_rate = sampling_rate
+    tr.stats.starttime = UTCDateTime(day)
+    return Stream([tr])
+
+
+@pytest.fixture(scope="module")
+def days():
+    inv = read_inventory()
+    return [(day, calculate_psd_histogram(_rjob_day(day, i), inv))
+            for i, day in enumerate(["2009-08-24", "2009-08-25", "2009-09-01"])]
+
+
+# --- Accumulation ---
+
+def test_monthly_and_yearly_accumulators(tmp_path, days):
+    root = str(tmp_path)
+    for day, hist in days:
+        updated = accumulate_daily_ppsd(root, hist, day)
+        assert updated == [archive_path(root, day[:7], hist.id), archive_path(root, day[:4], hist.id)]
+
+    august = load_accumulator(archive_path(root, "2009-08", "BW.RJOB..EHZ"))
+    year = load_accumulator(archive_path(root, "2009", "BW.RJOB..EHZ"))
+    assert august.days == ["2009-08-24", "2009-08-25"]
+    assert year.days == ["2009-08-24", "2009-08-25", "2009-09-01"]
+    assert year.psd_segments == sum(h.psd_segments for _, h in days)
+
+    # same statistics as one histogram over all the segments of the year
+    combined = PSDHistogram(id="BW.RJOB..EHZ", setup=days[0][1].setup,
+                            psds=np.concatenate([h.psds for _, h in days]))
+    np.testing.assert_array_equal(year.hist, combined.histogram)
+    for percentile in (10, 50, 90):
+        np.testing.assert_array_equal(year.get_percentile(percentile)[1], combined.get_percentile(percentile)[1])
+    np.testing.assert_allclose(year.get_mean()[1], combined.get_mean()[1])
+    np.testing.assert_array_equal(year.get_mode()[1], combined.get_mode()[1])
+
+
+def test_rerun_day_is_not_counted_twice(tmp_path, days):
+    root = str(tmp_path)
+    day, hist = days[0]
+    accumulate_daily_ppsd(root, hist, day)
+    assert accumulate_daily_ppsd(root, hist, day) == []
+    assert load_accumulator(archive_path(root, "2009", hist.id)).psd_segments == hist.psd_segments
+
+
+def test_other_grid_is_not_added(tmp_path, days):
+    root = str(tmp_path)
+    day, hist = days[0]
+    accumulate_daily_ppsd(root, hist, day)
+    other_rate = calculate_psd_histogram(_rjob_day("2009-08-26", 0, sampling_rate=40.0), read_inventory())
+    assert accumulate_daily_ppsd(root, other_rate, "2009-08-26") == []
+    assert load_accumulator(archive_path(root, "2009-08", hist.id)).days == [day]
+
+
+def test_obspy_ppsd_days_match_native(tmp_path, days):
+    day, hist = days[0]
+    ppsd = _create_ppsd_object(_rjob_day(day, 0), read_inventory())
+    accumulate_daily_ppsd(str(tmp_path / "obspy"), ppsd, day)
+    accumulate_daily_ppsd(str(tmp_path / "native"), hist, day)
+
+    a = load_accumulator(archive_path(str(tmp_path / "obspy"), "2009", hist.id))
+    b = load_accumulator(archive_path(str(tmp_path / "native"), "2009", hist.id))
+    np.testing.assert_array_equal(a.hist, b.hist)
+    np.testing.assert_allclose(a.period_xedges, b.period_xedges)
+
+
+# --- Pipeline integration ---
+
+def test_process_ppsd_metrics_updates_archive(tmp_path):
+    st = _rjob_day("2009-08-24", 0)
+    metrics = process_ppsd_metrics(st, read_inventory(), plot_filename='', npz_output_path='',
+                                   engine='native', archive_root=str(tmp_path), archive_day="2009-08-24")
+    assert metrics is not None
+    acc = load_accumulator(archive_path(str(tmp_path), "2009-08", "BW.RJOB..EHZ"))
+    assert acc.psd_segments == int(metrics['psd_segments'])
+
+    acc.plot(str(tmp_path / "month.png"))
+    assert (tmp_path / "month.png").stat().st_size > 0
+
+
+def test_empty_accumulator():
+    acc = PPSDAccumulator.empty("BW.RJOB..EHZ", "2009", np.arange(3.0), np.arange(4.0), np.linspace(-200, -50, 151))
+    assert acc.hist.shape == (3, 150) and acc.psd_segments == 0
+    assert acc.add("2009-01-01", np.ones((3, 150)), 1)
+    assert acc.hist.sum() == 450
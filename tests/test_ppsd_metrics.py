@@ -7,7 +7,8 @@ from sqes.core.ppsd_metrics import (
     _dead_channel_gsn, 
     _percentage_outside_model, 
     _percentage_inside_model_by_period, 
-    _dead_channel_lin
+    _dead_channel_lin,
+    _model_percentages
 )
 
 # --- Tests for _dead_channel_gsn ---
@@ -108,6 +109,53 @@ def test_percentage_inside_model_by_period_empty():
     perc = _percentage_inside_model_by_period(psd, nlnm, nhnm, t, t0=5, t1=10)
     assert perc == 0.0
 
+# --- Tests for _model_percentages (parity with the per-index loops) ---
+
+def _loop_outside_model(psd, AHNM, ALNM):
+    percH, percL, total_len = 0, 0, len(psd)
+    if total_len == 0: return 0.0, 0.0
+    for i in range(total_len):
+        if psd[i] > AHNM[i]: percH += 1
+        if psd[i] < ALNM[i]: percL += 1
+    return round(float(percH * 100 / total_len), 2), round(float(percL * 100 / total_len), 2)
+
+def _loop_inside_model_by_period(psd, LNM, HNM, t, t0, t1):
+    percH, mask = 0, (t > t0) & (t < t1)
+    psd_slice, LNM_slice, HNM_slice = psd[mask], LNM[mask], HNM[mask]
+    total_len = len(psd_slice)
+    if total_len == 0: return 0.0
+    for i in range(total_len):
+        if (psd_slice[i] <= HNM_slice[i]) and (psd_slice[i] >= LNM_slice[i]):
+            percH += 1
+    return round(float(percH * 100 / total_len), 2)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_model_percentages_match_loops(seed):
+    """The vectorized metrics equal the original loops, ties included."""
+    from sqes.core import models
+    rng = np.random.default_rng(seed)
+    t = np.logspace(-1.5, 2, rng.integers(50, 200))
+    nhnm, nlnm, idx = models.get_models(t, None)
+    t = t[idx]
+    # PPSD percentiles are dB bin centres; snap some values onto the models
+    psd = np.round(rng.uniform(nlnm - 20, nhnm + 20))
+    ties = rng.random(len(psd)) < 0.1
+    psd[ties] = np.where(rng.random(ties.sum()) < 0.5, nhnm[ties], nlnm[ties])
+
+    result = _model_percentages(psd, nhnm, nlnm, t)
+
+    assert (result['pctH'], result['pctL']) == _loop_outside_model(psd, nhnm, nlnm)
+    assert (result['pctH'], result['pctL']) == _percentage_outside_model(psd, nhnm, nlnm)
+    for name, (t0, t1) in [('long_period', (20, 900)), ('microseism', (2, 25)), ('short_period', (0.1, 1))]:
+        expected = _loop_inside_model_by_period(psd, nlnm, nhnm, t, t0, t1)
+        assert result[name] == expected
+        assert _percentage_inside_model_by_period(psd, nlnm, nhnm, t, t0, t1) == expected
+
+def test_model_percentages_empty():
+    empty = np.array([])
+    result = _model_percentages(empty, empty, empty, empty)
+    assert set(result.values()) == {0.0}
+
 # --- Tests for _dead_channel_lin ---
 
 def test_dead_channel_lin_perfect_fit():
@@ -177,4 +225,82 @@ def test_dead_channel_lin_period_trim():
     # The fit for these two points is a perfect line (y=2x+10)
     # The RMSE should be 0.0
     dcl = _dead_channel_lin(psd, t, fs)
-    assert dcl == pytest.approx(0.0)
\ No newline at end of file
+    assert dcl == pytest.approx(0.0)
+
+# --- Tests for _merge_for_ppsd ---
+
+def test_merge_for_ppsd_single_segment_is_not_copied():
+    from obspy import Stream, Trace
+    from sqes.core.ppsd_metrics import _merge_for_ppsd
+    data = np.arange(100, dtype=np.float64)
+    st = Stream(traces=[Trace(data=data)])
+
+    merged = _merge_for_ppsd(st)
+
+    assert len(merged) == 1
+    assert np.shares_memory(merged[0].data, data)
+
+
+def test_merge_for_ppsd_leaves_input_untouched():
+    from obspy import Stream, Trace, UTCDateTime
+    from sqes.core.ppsd_metrics import _merge_for_ppsd
+    tr1 = Trace(data=np.ones(10), header={'starttime': UTCDateTime(0)})
+    tr2 = Trace(data=np.ones(10) * 2, header={'starttime': UTCDateTime(20)})
+    st = Stream(traces=[tr1, tr2])
+
+    merged = _merge_for_ppsd(st)
+
+    assert len(merged) == 1
+    assert len(st) == 2
+    assert st[0] is tr1 and st[1] is tr2
+    assert len(tr1.data) == 10 and len(tr2.data) == 10
+
+
+def test_merge_for_ppsd_keeps_misaligned_starttime():
+    from obspy import Stream, Trace, UTCDateTime
+    from sqes.core.ppsd_metrics import _merge_for_ppsd
+    # 5 ms (0.5 % of a sample) late: merge() realigns it to 00:00:05
+    tr1 = Trace(data=np.ones(5), header={'starttime': UTCDateTime(0)})
+    tr2 = Trace(data=np.ones(5) * 2, header={'starttime': UTCDateTime(5.005)})
+    st = Stream(traces=[tr1, tr2])
+
+    merged = _merge_for_ppsd(st)
+
+    assert len(merged) == 1 and merged[0].stats.npts == 10
+    assert st[1] is tr2
+    assert tr2.stats.starttime == UTCDateTime(5.005)
+    assert tr1.stats.npts == 5 and tr2.stats.npts == 5
+
+
+# --- Tests for _create_ppsd_object (one PPSD per channel) ---
+
+def _rjob_trace(start, seconds, seed, location=""):
+    """Noise on BW.RJOB..EHZ, a channel of ObsPy's bundled example inventory."""
+    from obspy import Trace
+    rng = np.random.default_rng(seed)
+    tr = Trace(data=rng.normal(0, 1000, int(seconds * 20)).astype(np.int32))
+    tr.stats.network, tr.stats.station, tr.stats.location, tr.stats.channel = "BW", "RJOB", location, "EHZ"
+    tr.stats.sampling_rate = 20.0
+    tr.stats.starttime = start
+    return tr
+
+def test_create_ppsd_object_accumulates_all_segments():
+    from obspy import Stream, UTCDateTime, read_inventory
+    from sqes.core.ppsd_metrics import _create_ppsd_object
+    t0 = UTCDateTime("2009-08-24T00:00:00")
+    # two gappy segments of the channel plus a stray segment of another location code
+    st = Stream([
+        _rjob_trace(t0, 3 * 3600 + 100, 0),
+        _rjob_trace(t0 + 3 * 3600 + 400, 4 * 3600, 1),
+        _rjob_trace(t0, 2 * 3600, 2, location="10"),
+    ])
+
+    ppsd = _create_ppsd_object(st, read_inventory())
+
+    assert ppsd.id == "BW.RJOB..EHZ"
+    assert ppsd.trace_segments == 1          # the gappy segments merge into one trace
+    assert ppsd.psd_segments == len(ppsd._times_processed) == 13
+    # hourly windows from both sides of the gap are in the histogram
+    times = [t.timestamp for t in ppsd.times_processed]
+    assert min(times) < (t0 + 3 * 3600).timestamp < max(times)
+    assert len(st) == 3
@@ -0,0 +1,219 @@
+# tests/test_psd_engine.py
+import warnings
+
+import numpy as np
+import pytest
+from obspy import Stream, Trace, UTCDateTime, read_inventory
+from obspy.signal import PPSD
+
+from sqes.core.psd_engine import (
+    psd_setup, calculate_psd_histogram, _segment_offsets, decimation_factor, decimate_trace, decimate_for_psd,
+    _decimation_filter, ppsd_summary, histogram_percentile
+)
+from sqes.core.ppsd_metrics import process_ppsd_metrics
+
+T0 = UTCDateTime("2009-08-24T00:00:00")
+
+
+def _rjob_trace(start, seconds, seed, sampling_rate=20.0):
+    """Red + white noise on BW.RJOB..EHZ, a channel of ObsPy's bundled example inventory."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sampling_rate)
+    data = np.cumsum(rng.normal(0, 50, n)) + rng.normal(0, 1000, n)
+    tr = Trace(data=data.astype(np.int32))
+    tr.stats.network, tr.stats.station, tr.stats.channel = "BW", "RJOB", "EHZ"
+    tr.stats.sampling_rate = sampling_rate
+    tr.stats.starttime = start
+    return tr
+
+
+def _obspy_ppsd(st, inv):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ppsd = PPSD(st[0].stats, inv)
+        ppsd.add(st)
+    return ppsd
+
+
+@pytest.fixture(scope="module")
+def gappy_day():
+    st = Stream([_rjob_trace(T0, 3 * 3600 + 100, 0), _rjob_trace(T0 + 3 * 3600 + 400, 21 * 3600, 1)])
+    return st, read_inventory()
+
+
+# --- Setup ---
+
+@pytest.mark.parametrize("sampling_rate", [1.0, 20.0, 40.0, 100.0])
+def test_setup_matches_ppsd_binning(sampling_rate):
+    tr = _rjob_trace(T0, 10, 0, sampling_rate)
+    ppsd = PPSD(tr.stats, read_inventory())
+    setup = psd_setup(sampling_rate)
+
+    assert (setup.nfft, setup.nlap, setup.seg_len) == (ppsd.nfft, ppsd.nlap, ppsd.len)
+    np.testing.assert_array_equal(setup.psd_periods, ppsd.psd_periods)
+    np.testing.assert_array_equal(setup.period_bin_left_edges, ppsd.period_bin_left_edges)
+    np.testing.assert_array_equal(setup.period_bin_right_edges, ppsd.period_bin_right_edges)
+    np.testing.assert_array_equal(setup.period_bin_centers, ppsd.period_bin_centers)
+    np.testing.assert_array_equal(setup.period_xedges, ppsd.period_xedges)
+    np.testing.assert_array_equal(setup.db_bin_edges, ppsd.db_bin_edges)
+
+
+def test_segment_offsets():
+    setup = psd_setup(20.0)
+    # 3 h of data: segments start at 0, 0.5 h, ..., 2 h
+    np.testing.assert_array_equal(_segment_offsets(3 * 72000, setup), np.arange(5) * 36000)
+    assert len(_segment_offsets(72000 - 1, setup)) == 0
+
+
+# --- Parity with obspy.signal.PPSD ---
+
+def test_psds_and_statistics_match_ppsd(gappy_day):
+    st, inv = gappy_day
+    ppsd = _obspy_ppsd(st, inv)
+    hist = calculate_psd_histogram(st, inv)
+
+    assert hist.id == ppsd.id
+    assert hist.psd_segments == len(ppsd._times_processed) == 47
+    np.testing.assert_allclose(hist.times, np.array(ppsd._times_processed) / 1e9)
+    np.testing.assert_allclose(hist.psds, np.array(ppsd._binned_psds), rtol=1e-6, atol=1e-4)
+    np.testing.assert_array_equal(hist.histogram, ppsd.current_histogram)
+
+    for percentile in (0, 10, 50, 90, 100):
+        np.testing.assert_array_equal(hist.get_percentile(percentile)[1], ppsd.get_percentile(percentile)[1])
+    np.testing.assert_allclose(hist.get_mean()[1], ppsd.get_mean()[1], rtol=1e-12)
+    np.testing.assert_array_equal(hist.get_mode()[1], ppsd.get_mode()[1])
+
+
+def test_block_size_does_not_change_psds(gappy_day):
+    st, inv = gappy_day
+    whole = calculate_psd_histogram(st, inv)
+    blocked = calculate_psd_histogram(st, inv, max_block_mb=1)
+    np.testing.assert_array_equal(whole.psds, blocked.psds)
+
+
+@pytest.mark.parametrize("threads, max_block_mb", [(2, 256), (4, 256), (3, 2)])
+def test_threaded_blocks_match_serial(gappy_day, threads, max_block_mb):
+    st, inv = gappy_day
+    serial = calculate_psd_histogram(st, inv)
+    threaded = calculate_psd_histogram(st, inv, max_block_mb=max_block_mb, threads=threads)
+    np.testing.assert_array_equal(threaded.psds, serial.psds)
+    np.testing.assert_array_equal(threaded.times, serial.times)
+    np.testing.assert_array_equal(threaded.get_percentile()[1], serial.get_percentile()[1])
+
+
+def test_ppsd_metrics_match_obspy_engine(gappy_day):
+    st, inv = gappy_day
+    obspy_metrics = process_ppsd_metrics(st, inv, plot_filename='', npz_output_path='')
+    native_metrics = process_ppsd_metrics(st, inv, plot_filename='', npz_output_path='', engine='native')
+    threaded_metrics = process_ppsd_metrics(st, inv, plot_filename='', npz_output_path='', engine='native', threads=4)
+
+    assert native_metrics is not None
+    assert native_metrics == obspy_metrics == threaded_metrics
+    for key in ('pctH', 'pctL', 'dcl', 'dcg', 'long_period', 'microseism', 'short_period'):
+        assert key in native_metrics
+
+
+def test_native_plot(gappy_day, tmp_path):
+    st, inv = gappy_day
+    plot_filename = str(tmp_path / "RJOB_Z_PDF.png")
+    metrics = process_ppsd_metrics(st, inv, plot_filename=plot_filename, npz_output_path='', engine='native')
+    assert metrics is not None
+    assert (tmp_path / "RJOB_Z_PDF.png").stat().st_size > 0
+
+
+def test_native_engine_without_inventory_or_data():
+    st = Stream([_rjob_trace(T0, 1800, 0)])
+    assert calculate_psd_histogram(st, None) is None
+    hist = calculate_psd_histogram(st, read_inventory())
+    assert hist.psd_segments == 0
+    assert process_ppsd_metrics(st, read_inventory(), '', '', engine='native') is None
+
+
+# --- Pre-decimation ---
+
+@pytest.mark.parametrize("sampling_rate, min_period, factor", [
+    (20.0, 0.1, 1), (40.0, 0.1, 1), (100.0, 0.1, 2), (200.0, 0.1, 4), (200.0, 0.03, 1), (500.0, 0.03, 4),
+    (100.0, 0.0, 1),
+])
+def test_decimation_factor(sampling_rate, min_period, factor):
+    assert decimation_factor(sampling_rate, min_period) == factor
+
+
+def test_decimate_trace_in_blocks():
+    from scipy.signal import upfirdn
+    tr = _rjob_trace(T0, 1000.3, 0, sampling_rate=100.0)
+    taps = _decimation_filter(4)
+    delay = (len(taps) - 1) // 2 // 4
+    expected = upfirdn(taps, tr.data.astype(np.float64), down=4)[delay:delay + -(-tr.stats.npts // 4)]
+
+    out = decimate_trace(tr, 4, block_seconds=61.7)
+    np.testing.assert_array_equal(out.data, expected)
+    assert out.stats.sampling_rate == 25.0
+    assert out.stats.starttime == tr.stats.starttime
+    assert out.stats.npts == len(expected)
+
+
+def test_decimate_for_psd_splits_gaps():
+    st = Stream([_rjob_trace(T0, 600, 0, 100.0), _rjob_trace(T0 + 900, 600, 1, 100.0), _rjob_trace(T0, 600, 2)])
+    st[2].stats.channel = "BHZ"
+    st.merge()
+    out = decimate_for_psd(st, 0.1)
+    assert sorted((tr.stats.channel, tr.stats.sampling_rate, tr.stats.starttime) for tr in out) == \
+        [("BHZ", 20.0, T0), ("EHZ", 50.0, T0), ("EHZ", 50.0, T0 + 900)]
+
+
+def test_decimated_band_metrics_unchanged():
+    """200 Hz -> 50 Hz for periods >= 0.1 s: same PSDs there, same band metrics."""
+    st, inv = Stream([_rjob_trace(T0, 8 * 3600, 3, sampling_rate=200.0)]), read_inventory()
+    full = calculate_psd_histogram(st, inv)
+    decimated = calculate_psd_histogram(decimate_for_psd(st, 0.1), inv)
+
+    assert decimated.setup.nfft == full.setup.nfft // 4
+    shift = len(full.period_bin_centers) - len(decimated.period_bin_centers)
+    np.testing.assert_allclose(decimated.period_bin_centers, full.period_bin_centers[shift:])
+    covered = decimated.period_bin_centers >= 0.1 / 2 ** 0.5
+    np.testing.assert_allclose(decimated.psds[:, covered], full.psds[:, shift:][:, covered], atol=0.01)
+
+    full_metrics = process_ppsd_metrics(st, inv, '', '')
+    decimated_metrics = process_ppsd_metrics(st, inv, '', '', min_period=0.1)
+    assert decimated_metrics == full_metrics
+    # the native engine computes the full-rate spectra for DCL anyway
+    native_metrics = process_ppsd_metrics(st, inv, '', '', engine='native', min_period=0.1)
+    assert native_metrics == full_metrics
+
+
+def test_dcl_unchanged_by_min_period():
+    """DCL is fitted from 4/fs of the channel's own rate, above the decimated passband."""
+    st, inv = Stream([_rjob_trace(T0, 8 * 3600, 4, sampling_rate=100.0)]), read_inventory()
+    full = process_ppsd_metrics(st, inv, '', '')
+    for min_period in (0.1, 1.0):
+        assert process_ppsd_metrics(st, inv, '', '', min_period=min_period)['dcl'] == full['dcl']
+
+
+# --- Summary ---
+
+@pytest.mark.parametrize("engine", ["obspy", "native"])
+def test_summary_matches_ppsd_statistics(gappy_day, engine):
+    st, inv = gappy_day
+    ppsds = _obspy_ppsd(st, inv) if engine == "obspy" else calculate_psd_histogram(st, inv)
+    summary = ppsd_summary(ppsds, max_period=100)
+
+    keep = ppsds.period_bin_centers <= 100
+    np.testing.assert_array_equal(summary.periods, ppsds.period_bin_centers[keep])
+    np.testing.assert_array_equal(summary.percentile, ppsds.get_percentile()[1][keep])
+    np.testing.assert_array_equal(summary.mean, ppsds.get_mean()[1][keep])
+    np.testing.assert_array_equal(summary.mode, ppsds.get_mode()[1][keep])
+    assert summary.psd_segments == 47
+
+    for percentile in (0, 10, 90, 100):
+        np.testing.assert_array_equal(ppsd_summary(ppsds, percentile).percentile, ppsds.get_percentile(percentile)[1])
+
+
+def test_percentile_of_empty_period_bins():
+    """Same indices as searchsorted on every row (empty bins give the top edge)."""
+    hist = np.zeros((3, 4), dtype=np.uint64)
+    hist[1, 2] = 5
+    edges = np.arange(5.0)
+    np.testing.assert_array_equal(histogram_percentile(hist, edges, 0), [4.0, 2.0, 4.0])
+    np.testing.assert_array_equal(histogram_percentile(hist, edges, 50), [4.0, 2.0, 4.0])
+    np.testing.assert_array_equal(histogram_percentile(hist, edges, 100), [4.0, 2.0, 4.0])
@@ -0,0 +1,131 @@
+# tests/test_quantile_sketch.py
+from datetime import date
+
+import numpy as np
+from obspy import Stream, Trace, UTCDateTime
+
+from sqes.core.quantile_sketch import (
+    QuantileSketch, merge_sketches, save_sketch, load_sketch,
+    sketch_path, merge_daily_sketches
+)
+from sqes.core.basic_metrics import process_basic_metrics, process_station_basic_metrics
+
+
+def _samples(n=400_000, seed=0, scale=4000.0):
+    rng = np.random.default_rng(seed)
+    return np.round(rng.normal(0, scale, n)).astype(np.int32)
+
+
+def _exact_mad(data):
+    data = data.astype(np.float64)
+    return np.median(np.abs(data - np.median(data)))
+
+
+def _sketch_of(data, block=65536):
+    sketch = QuantileSketch()
+    for b0 in range(0, len(data), block):
+        sketch.update(data[b0:b0 + block])
+    return sketch
+
+
+# --- Accuracy ---
+
+def test_sketch_quantiles_and_mad():
+    data = _samples()
+    sketch = _sketch_of(data)
+
+    assert sketch.count == len(data)
+    assert sketch.min == data.min() and sketch.max == data.max()
+    assert len(sketch.means) <= 2 * sketch.compression
+    # tolerance: a small fraction of the spread (sigma = 4000)
+    for q in (0.01, 0.5, 0.99):
+        assert abs(sketch.quantile(q) - np.quantile(data, q)) < 40
+    assert abs(sketch.mad() - _exact_mad(data)) < 40
+
+
+def test_sketch_ignores_nan_and_masked():
+    sketch = QuantileSketch()
+    sketch.update(np.array([1.0, np.nan, 2.0, 3.0]))
+    sketch.update(np.ma.masked_array([100.0, 4.0], mask=[True, False]))
+    assert sketch.count == 4
+    assert sketch.quantile(0.0) == 1.0 and sketch.quantile(1.0) == 4.0
+
+
+def test_empty_sketch():
+    sketch = QuantileSketch()
+    assert sketch.count == 0
+    assert np.isnan(sketch.quantile(0.5)) and np.isnan(sketch.mad())
+
+
+# --- Merging and persistence ---
+
+def test_merged_halves_match_whole():
+    data = _samples(seed=1)
+    half = len(data) // 2
+    merged = merge_sketches([_sketch_of(data[:half]), _sketch_of(data[half:])])
+
+    assert merged.count == len(data)
+    for q in (0.01, 0.5, 0.99):
+        assert abs(merged.quantile(q) - np.quantile(data, q)) < 80
+
+
+def test_save_load_roundtrip(tmp_path):
+    sketch = _sketch_of(_samples(seed=2))
+    path = str(tmp_path / "IA.ABC..BHZ.npz")
+    save_sketch(path, sketch)
+    loaded = load_sketch(path)
+
+    assert loaded.count == sketch.count
+    assert loaded.compression == sketch.compression
+    for q in (0.01, 0.5, 0.99):
+        assert abs(loaded.quantile(q) - sketch.quantile(q)) < 1e-3 * 4000
+
+
+def test_merge_daily_sketches(tmp_path):
+    root = str(tmp_path)
+    days = [_samples(100_000, seed=s) for s in range(3)]
+    for i, data in enumerate(days):
+        path = sketch_path(root, f"2024-01-0{i + 1}", "IA.ABC..BHZ")
+        (tmp_path / f"2024-01-0{i + 1}").mkdir()
+        save_sketch(path, _sketch_of(data))
+
+    # 2024-01-04 has no sketch and is skipped
+    merged = merge_daily_sketches(root, "IA.ABC..BHZ", date(2024, 1, 1), date(2024, 1, 4))
+    whole = np.concatenate(days)
+    assert merged.count == len(whole)
+    assert abs(merged.quantile(0.5) - np.median(whole)) < 80
+    assert merge_daily_sketches(root, "IA.XYZ..BHZ", date(2024, 1, 1), date(2024, 1, 4)) is None
+
+
+# --- Basic metrics integration ---
+
+def test_process_basic_metrics_amplitude_sketch():
+    t0 = UTCDateTime("2024-01-01")
+    data = _samples(200_000, seed=3)
+    tr = Trace(data=data)
+    tr.stats.sampling_rate = 20.0
+    tr.stats.starttime = t0
+    metrics = process_basic_metrics(Stream([tr]), t0, t0 + 86400, amplitude_sketch=True)
+
+    assert metrics['sketch'].count == len(data)
+    assert abs(metrics['amp_p50'] - np.median(data)) < 40
+    assert abs(metrics['amp_p99'] - np.quantile(data, 0.99)) < 40
+    assert abs(metrics['amp_mad'] - _exact_mad(data)) < 40
+    assert 'sketch' not in process_basic_metrics(Stream([tr]), t0, t0 + 86400)
+
+
+def test_station_sketches_match_per_component():
+    t0 = UTCDateTime("2024-01-01")
+    streams = {}
+    for i, comp in enumerate("ENZ"):
+        tr = Trace(data=_samples(100_000, seed=10 + i))
+        tr.stats.sampling_rate = 20.0
+        tr.stats.starttime = t0
+        tr.stats.channel = f"BH{comp}"
+        streams[comp] = Stream([tr])
+
+    batched = process_station_basic_metrics(streams, t0, t0 + 86400, amplitude_sketch=True)
+    for comp, st in streams.items():
+        single = process_basic_metrics(st, t0, t0 + 86400, amplitude_sketch=True)
+        for key in ('amp_p01', 'amp_p50', 'amp_p99', 'amp_mad'):
+            assert batched[comp][key] == single[key]
@@ -0,0 +1,162 @@
+# tests/test_response_cache.py
+import os
+import warnings
+
+import numpy as np
+import pytest
+from obspy import Stream, Trace, UTCDateTime, read_inventory
+from obspy.signal import PPSD
+
+from sqes.core import response_cache
+from sqes.core.response_cache import (
+    configure_response_cache, clear_response_cache, response_cache_info, evaluate_response
+)
+from sqes.core.ppsd_metrics import _create_ppsd_object
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    clear_response_cache()
+    configure_response_cache(None)
+    yield
+    clear_response_cache()
+    configure_response_cache(None)
+
+
+def _channels(inv, seed_id):
+    net, sta, loc, cha = seed_id.split(".")
+    return [c for c in inv.select(network=net, station=sta, location=loc, channel=cha)[0][0]]
+
+
+# --- Lookup ---
+
+def test_cached_response_equals_evalresp():
+    inv = read_inventory()
+    channel = _channels(inv, "BW.RJOB..EHZ")[0]
+    expected = inv.get_response("BW.RJOB..EHZ", channel.start_date + 10).get_evalresp_response(
+        t_samp=0.05, nfft=4096, output="VEL")[0]
+
+    first = evaluate_response(inv, "BW.RJOB..EHZ", channel, 20.0, 4096)
+    second = evaluate_response(inv, "BW.RJOB..EHZ", channel, 20.0, 4096)
+
+    np.testing.assert_array_equal(first, expected)
+    assert second is first
+    assert not first.flags.writeable
+    assert response_cache_info()['misses'] == 1 and response_cache_info()['hits'] == 1
+
+
+def test_key_includes_sampling_rate_and_nfft():
+    inv = read_inventory()
+    channel = _channels(inv, "BW.RJOB..EHZ")[0]
+    a = evaluate_response(inv, "BW.RJOB..EHZ", channel, 20.0, 4096)
+    b = evaluate_response(inv, "BW.RJOB..EHZ", channel, 20.0, 8192)
+    c = evaluate_response(inv, "BW.RJOB..EHZ", channel, 40.0, 4096)
+    assert len(a) != len(b)
+    assert not np.array_equal(a, c)
+    assert response_cache_info()['misses'] == 3
+
+
+def test_components_sharing_a_response_evaluate_once():
+    inv = read_inventory()
+    # E/N/Z of one epoch have the same response stages in the example inventory
+    channels = [(f"BW.RJOB..EH{c}", _channels(inv, f"BW.RJOB..EH{c}")[-1]) for c in "ZNE"]
+    responses = [evaluate_response(inv, seed_id, ch, 20.0, 4096) for seed_id, ch in channels]
+    assert response_cache_info()['misses'] == 1
+    assert all(r is responses[0] for r in responses)
+
+
+def test_corrected_response_of_same_epoch_is_evaluated_again():
+    inv = read_inventory()
+    channel = _channels(inv, "BW.RJOB..EHZ")[0]
+    before = evaluate_response(inv, "BW.RJOB..EHZ", channel, 20.0, 4096)
+
+    corrected = read_inventory()   # e.g. a fixed gain, same epoch start
+    channel = _channels(corrected, "BW.RJOB..EHZ")[0]
+    corrected.get_response("BW.RJOB..EHZ", channel.start_date + 10).response_stages[0].stage_gain *= 2
+    after = evaluate_response(corrected, "BW.RJOB..EHZ", channel, 20.0, 4096)
+
+    assert response_cache_info()['misses'] == 2
+    np.testing.assert_allclose(np.abs(after), 2 * np.abs(before))
+
+
+def test_disk_cache_survives_a_new_worker(tmp_path):
+    inv = read_inventory()
+    channel = _channels(inv, "BW.RJOB..EHZ")[0]
+    configure_response_cache(str(tmp_path))
+    first = evaluate_response(inv, "BW.RJOB..EHZ", channel, 20.0, 4096)
+    assert len(os.listdir(tmp_path)) == 1
+
+    clear_response_cache()   # e.g. the next day's worker pool
+    second = evaluate_response(inv, "BW.RJOB..EHZ", channel, 20.0, 4096)
+    np.testing.assert_array_equal(first, second)
+    assert response_cache_info()['disk_hits'] == 1 and response_cache_info()['misses'] == 0
+
+
+def test_memory_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(response_cache, 'RESPONSE_CACHE_SIZE', 2)
+    inv = read_inventory()
+    channel = _channels(inv, "BW.RJOB..EHZ")[0]
+    for nfft in (256, 512, 1024):
+        evaluate_response(inv, "BW.RJOB..EHZ", channel, 20.0, nfft)
+    assert response_cache_info()['size'] == 2
+
+
+# --- PPSD integration ---
+
+def _rjob_trace():
+    rng = np.random.default_rng(0)
+    tr = Trace(data=rng.normal(0, 1000, 3 * 3600 * 20).astype(np.int32))
+    tr.stats.network, tr.stats.station, tr.stats.channel = "BW", "RJOB", "EHZ"
+    tr.stats.sampling_rate = 20.0
+    tr.stats.starttime = UTCDateTime("2009-08-24")
+    return tr
+
+
+def _skip_without_responses(stats):
+    if not hasattr(PPSD(stats, metadata=None), 'responses'):
+        pytest.skip("ObsPy < 1.5 evaluates the response per segment (cache not used)")
+
+
+def test_obspy_ppsd_uses_attached_responses():
+    """
+    Guards the ObsPy behaviour the cache relies on: a PPSD built without
+    metadata evaluates nothing, and add() takes its responses from the
+    public `responses` list. Fails if a new ObsPy release changes that.
+    """
+    tr = _rjob_trace()
+    _skip_without_responses(tr.stats)
+    assert PPSD(tr.stats, metadata=None).responses is None
+
+    inv = read_inventory()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        reference = PPSD(tr.stats, inv)
+        reference.add(Stream([tr]))
+        scaled = PPSD(tr.stats, metadata=None)
+        scaled.metadata = inv
+        scaled.responses = [dict(epoch, response=epoch['response'] * 10) for epoch in reference.responses]
+        scaled.add(Stream([tr]))
+    # a 10x response must lower every PSD by 20 dB
+    np.testing.assert_allclose(np.array(scaled.psd_values), np.array(reference.psd_values) - 20, atol=1e-3)
+
+
+def test_ppsd_with_cached_responses_matches_obspy():
+    inv = read_inventory()
+    tr = _rjob_trace()
+    _skip_without_responses(tr.stats)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        reference = PPSD(tr.stats, inv)
+        reference.add(Stream([tr]))
+
+    cached = _create_ppsd_object(Stream([tr]), inv)
+    again = _create_ppsd_object(Stream([tr]), inv)
+
+    assert len(cached.responses) == len(reference.responses)
+    for got, expected in zip(cached.responses, reference.responses):
+        assert (got['start_time'], got['end_time']) == (expected['start_time'], expected['end_time'])
+        np.testing.assert_array_equal(got['response'], expected['response'])
+    np.testing.assert_array_equal(cached.get_percentile()[1], reference.get_percentile()[1])
+    np.testing.assert_array_equal(again.get_mean()[1], reference.get_mean()[1])
+    # the second channel-day evaluated nothing
+    assert response_cache_info()['misses'] == len(reference.responses)
@@ -0,0 +1,63 @@
+# tests/test_sds.py
+import os
+import numpy as np
+from obspy import Stream, Trace, UTCDateTime
+from obspy.clients.filesystem.sds import Client as SDSClient
+
+from sqes.clients import sds
+from sqes.core.basic_metrics import GapSummary
+
+
+def _write_sds_day(root, st, day):
+    """Writes a stream into the SDS day file of `day` (STEIM2, 512-byte records)."""
+    tr = st[0]
+    path = os.path.join(
+        root, str(day.year), tr.stats.network, tr.stats.station,
+        f"{tr.stats.channel}.D",
+        f"{tr.stats.network}.{tr.stats.station}.{tr.stats.location}.{tr.stats.channel}.D."
+        f"{day.year}.{day.julday:03d}"
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    st.write(path, format="MSEED", encoding="STEIM2", reclen=512)
+
+
+def _trace(start, npts, seed):
+    rng = np.random.default_rng(seed)
+    tr = Trace(data=rng.integers(-5000, 5000, npts).astype(np.int32))
+    tr.stats.network, tr.stats.station, tr.stats.channel = "IA", "ABC", "BHZ"
+    tr.stats.sampling_rate = 20.0
+    tr.stats.starttime = start
+    return tr
+
+
+def test_get_segments_matches_decoded_data(tmp_path):
+    day = UTCDateTime("2024-01-02")
+    # previous day file runs past midnight, then a gap, an overlap and the day end
+    prev = Stream([_trace(day - 600, 20 * 1200, 0)])
+    today = Stream([
+        _trace(day + 3600, 20 * 7200, 1),
+        _trace(day + 3600 + 7000, 20 * 600, 2),
+        _trace(day + 20000.02, 20 * 70000, 3),
+    ])
+    _write_sds_day(str(tmp_path), prev, day - 86400)
+    _write_sds_day(str(tmp_path), today, day)
+
+    client = SDSClient(sds_root=str(tmp_path))
+    segments = sds.get_segments(client, "IA", "ABC", "", ["SH", "BH"], day, day + 86400, "Z")
+    decoded = sds.get_waveforms(client, "IA", "ABC", "", ["SH", "BH"], day, day + 86400, "Z")
+
+    from_headers = GapSummary.from_segments(segments)
+    from_data = GapSummary.from_stream(decoded)
+
+    assert len(from_headers.gaps) == len(from_data.gaps)
+    assert (from_headers.gap_count, from_headers.overlap_count) == (2, 1)
+    assert (from_headers.gap_count, from_headers.overlap_count) == \
+        (from_data.gap_count, from_data.overlap_count)
+    assert from_headers.availability(day, day + 86400) == \
+        from_data.availability(day, day + 86400)
+
+
+def test_get_segments_no_data(tmp_path):
+    client = SDSClient(sds_root=str(tmp_path))
+    t0 = UTCDateTime("2024-01-02")
+    assert sds.get_segments(client, "IA", "ABC", "", ["BH"], t0, t0 + 86400, "Z") is None